@@ -0,0 +1,317 @@
+# Local stand-ins for the services that the script talks to, for the offline benchmark
+# - Discourse: login, category and tag topic lists (JSON, paginated like Discourse) and topics with links to outbound pages
+# - Outbound pages: synthetic job pages with configurable latency and failure rate (and a robots.txt with an optional Crawl-delay)
+# - Google APIs: Sheets values().get/append/update and Drive files().list/create/update (kept in memory)
+# Each service is a ThreadingHTTPServer on a free local port, running in a background thread.
+
+##################################### Importing libraries #####################################
+import hashlib
+import json
+import re
+import threading
+import time
+import zlib
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+##################################### Setting parameters #####################################
+
+# Number of topics per page of a topic list (same as Discourse)
+TOPIC_LIST_PAGE_SIZE = 30
+
+# First ID of the synthetic topics
+FIRST_TOPIC_ID = 1000
+
+# Every TAG_EVERY-th topic is also in the jobs tag (the category and the tag overlap, like in CESNET-D)
+TAG_EVERY = 3
+
+##################################### Define classes and functions #####################################
+class QuietHandler(BaseHTTPRequestHandler):
+    """
+    Base class for the handlers: no access logs, helpers to send JSON and HTML.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data, headers=None):
+        self.send_body(status, json.dumps(data).encode("utf-8"), "application/json; charset=utf-8", headers)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+def make_discourse_handler(services):
+    """
+    Function to make the handler of the Discourse stand-in.
+    """
+    class DiscourseHandler(QuietHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            query = parse_qs(parts.query)
+            if parts.path == "/session/csrf.json":
+                return self.send_json(200, {"csrf": "benchmark-csrf"})
+            if parts.path == "/session/current.json":
+                if "_t=benchmark" in self.headers.get("Cookie", ""):
+                    return self.send_json(200, {"current_user": {"id": 1, "username": "benchmark"}})
+                return self.send_json(404, {"errors": ["not logged in"]})
+            if parts.path in ("/c/job-posting/5.json", "/tag/jobs.json"):
+                page = int(query.get("page", ["0"])[0])
+                return self.send_json(200, services.topic_list(parts.path.startswith("/tag"), page))
+            match = re.fullmatch(r"/t/(\d+)\.json", parts.path)
+            if match:
+                return self.send_json(200, services.topic(int(match.group(1))))
+            return self.send_json(404, {"errors": ["not found"]})
+
+        def do_POST(self):
+            self.read_body()
+            if urlsplit(self.path).path == "/session":
+                services.count("logins")
+                return self.send_json(200, {"user": {"id": 1}}, {"Set-Cookie": "_t=benchmark; Path=/; HttpOnly"})
+            return self.send_json(404, {"errors": ["not found"]})
+
+    return DiscourseHandler
+
+def make_outbound_handler(services):
+    """
+    Function to make the handler of the outbound pages.
+    """
+    class OutboundHandler(QuietHandler):
+        def do_GET(self):
+            if self.path == "/robots.txt":
+                if services.crawl_delay is None:
+                    return self.send_body(404, b"", "text/plain")
+                return self.send_body(200, f"User-agent: *\nCrawl-delay: {services.crawl_delay}\n".encode("utf-8"), "text/plain")
+            services.count("outbound_requests")
+            time.sleep(services.latency)
+            outcome = services.outbound_outcome(self.path)
+            if outcome == "dead":
+                return self.send_body(404, b"<html><body>Not found</body></html>", "text/html; charset=utf-8")
+            if outcome == "busy":
+                return self.send_body(503, b"", "text/html; charset=utf-8", {"Retry-After": "1"})
+            return self.send_body(200, services.outbound_page(self.path), "text/html; charset=utf-8")
+
+    return OutboundHandler
+
+def read_upload(headers, body):
+    """
+    Function to get the metadata and the content of a Drive upload (multipart/related, or just the content).
+
+    Outputs: tuple (dict with the metadata, content as bytes)
+    """
+    content_type = headers.get("Content-Type", "")
+    if not content_type.startswith("multipart/"):
+        return {}, body
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+    metadata, media = list(message.iter_parts())[:2]
+    return json.loads(metadata.get_content()), media.get_payload(decode=True)
+
+def make_google_handler(services):
+    """
+    Function to make the handler of the Google APIs (Sheets v4 and Drive v3 paths).
+    """
+    class GoogleHandler(QuietHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            match = re.fullmatch(r"/v4/spreadsheets/([^/]+)/values/([^/?]+)", parts.path)
+            if match:
+                return self.send_json(200, services.sheet_get(match.group(1), unquote(match.group(2))))
+            if parts.path == "/drive/v3/files":
+                query = parse_qs(parts.query)
+                return self.send_json(200, services.drive_list(query.get("q", [""])[0], int(query.get("pageSize", ["100"])[0]),
+                                                               int(query.get("pageToken", ["0"])[0])))
+            return self.send_json(404, {"error": {"code": 404, "message": "not found"}})
+
+        def do_POST(self):
+            path = urlsplit(self.path).path
+            body = self.read_body()
+            match = re.fullmatch(r"/v4/spreadsheets/([^/]+)/values/([^/?]+):append", path)
+            if match:
+                return self.send_json(200, services.sheet_append(match.group(1), json.loads(body)["values"]))
+            if path in ("/upload/drive/v3/files", "/drive/v3/files"):
+                return self.send_json(200, services.drive_create(*read_upload(self.headers, body)))
+            return self.send_json(404, {"error": {"code": 404, "message": "not found"}})
+
+        def do_PATCH(self):
+            body = self.read_body()
+            match = re.fullmatch(r"(?:/upload)?/drive/v3/files/([^/]+)", urlsplit(self.path).path)
+            if match:
+                return self.send_json(200, services.drive_update(match.group(1), read_upload(self.headers, body)[1]))
+            return self.send_json(404, {"error": {"code": 404, "message": "not found"}})
+
+        def do_PUT(self):
+            match = re.fullmatch(r"/v4/spreadsheets/([^/]+)/values/([^/?]+)", urlsplit(self.path).path)
+            body = self.read_body()
+            if match:
+                return self.send_json(200, services.sheet_update(match.group(1), unquote(match.group(2)), json.loads(body)["values"]))
+            return self.send_json(404, {"error": {"code": 404, "message": "not found"}})
+
+    return GoogleHandler
+
+class FakeServices:
+    """
+    Class for the local stand-ins, with the synthetic data for one benchmark scale.
+
+    Usage: services = FakeServices(n_topics=100); services.start(); ...; services.stop()
+    (services.discourse_url, services.outbound_url and services.google_url are the base URLs)
+    """
+
+    def __init__(self, n_topics, links_per_topic=3, latency=0.05, failure_rate=0.1, page_bytes=20000, crawl_delay=None):
+        self.n_topics = n_topics
+        self.links_per_topic = links_per_topic
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.page_bytes = page_bytes
+        self.crawl_delay = crawl_delay
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.sheets = {}
+        self.drive_files = {}
+        self.busy_paths = set()
+        self.servers = []
+
+    def start(self):
+        self.discourse_url = self.serve(make_discourse_handler(self))
+        self.outbound_url = self.serve(make_outbound_handler(self))
+        self.google_url = self.serve(make_google_handler(self))
+
+    def serve(self, handler):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    ############ Discourse ############
+    def topic_list(self, is_tag, page):
+        """
+        Function to get a page of the category (all the topics) or the tag (every TAG_EVERY-th topic), newest first.
+        """
+        ids = [FIRST_TOPIC_ID + i for i in range(self.n_topics)][::-1]
+        if is_tag:
+            ids = [topic_id for topic_id in ids if topic_id % TAG_EVERY == 0]
+        page_ids = ids[page * TOPIC_LIST_PAGE_SIZE:(page + 1) * TOPIC_LIST_PAGE_SIZE]
+        topic_list = {"topics": [{"id": topic_id, "slug": f"synthetic-job-{topic_id}"} for topic_id in page_ids]}
+        if (page + 1) * TOPIC_LIST_PAGE_SIZE < len(ids):
+            topic_list["more_topics_url"] = f"?page={page + 1}"
+        return {"topic_list": topic_list}
+
+    def topic(self, topic_id):
+        """
+        Function to get a topic: its main post links to links_per_topic outbound pages (one of them shared by all the topics).
+        """
+        links = [f"{self.outbound_url}/jobs/{topic_id}-{k}" for k in range(self.links_per_topic - 1)]
+        if self.links_per_topic > 0:
+            links.append(f"{self.outbound_url}/jobs/shared")
+        salary = f"<p>Salary: ${50000 + topic_id}</p>" if topic_id % 2 == 0 else ""
+        cooked = (f"<p>Assistant professor position number {topic_id}. " + "Counselor education faculty job. " * 20 + "</p>"
+                  + salary + "".join(f'<p>Apply: <a href="{link}">{link}</a></p>' for link in links))
+        return {"id": topic_id, "post_stream": {"posts": [{"cooked": cooked}]}}
+
+    ############ Outbound pages ############
+    def outbound_outcome(self, path):
+        """
+        Function to decide what an outbound page answers: "ok", "dead" (404) or "busy" (503 with Retry-After the first time).
+        Deterministic: the same path always gets the same outcome.
+        """
+        if path.endswith("/shared"):
+            return "ok"
+        draw = (zlib.crc32(path.encode("utf-8")) % 10000) / 10000
+        if draw >= self.failure_rate:
+            return "ok"
+        if draw < self.failure_rate / 2:
+            return "dead"
+        with self.lock:
+            if path in self.busy_paths:
+                return "ok"
+            self.busy_paths.add(path)
+        return "busy"
+
+    def outbound_page(self, path):
+        """
+        Function to build a synthetic job page of about page_bytes bytes.
+        """
+        paragraph = f"<p>Job description for {path}. The position requires a doctorate in counselor education. </p>"
+        repeats = max(1, self.page_bytes // len(paragraph))
+        salary = "<p>The salary range is $60,000 - $75,000.</p>" if zlib.crc32(path.encode("utf-8")) % 3 == 0 else ""
+        return f"<html><head><title>{path}</title></head><body>{paragraph * repeats}{salary}</body></html>".encode("utf-8")
+
+    ############ Google Sheets and Drive ############
+    def sheet_get(self, spreadsheet_id, range_sheet):
+        """
+        Function to get the values of column A in a range like "A:A" or "A5:A".
+        """
+        with self.lock:
+            rows = self.sheets.get(spreadsheet_id, [])
+            match = re.match(r"(?:.*!)?A(\d*)", range_sheet)
+            start = int(match.group(1)) - 1 if match and match.group(1) else 0
+            values = [row[:1] for row in rows[start:]]
+        return {"range": range_sheet, "majorDimension": "ROWS", "values": values} if values else {"range": range_sheet}
+
+    def sheet_append(self, spreadsheet_id, values):
+        with self.lock:
+            rows = self.sheets.setdefault(spreadsheet_id, [])
+            rows.extend(values)
+        self.count("sheets_rows", len(values))
+        return {"spreadsheetId": spreadsheet_id, "updates": {"updatedRows": len(values)}}
+
+    def sheet_update(self, spreadsheet_id, range_sheet, values):
+        match = re.match(r"(?:.*!)?[A-Z]+(\d+)", range_sheet)
+        start = int(match.group(1)) - 1 if match else 0
+        with self.lock:
+            rows = self.sheets.setdefault(spreadsheet_id, [])
+            rows.extend([[] for _ in range(start + len(values) - len(rows))])
+            rows[start:start + len(values)] = values
+        self.count("sheets_rows", len(values))
+        return {"spreadsheetId": spreadsheet_id, "updatedRows": len(values)}
+
+    def drive_list(self, query, page_size, offset):
+        """
+        Function to list the files in a folder (query like "'<folder ID>' in parents ...").
+        The page token is the offset of the page.
+        """
+        match = re.search(r"'([^']+)' in parents", query)
+        with self.lock:
+            files = [{"id": file_id, "name": file["name"], "md5Checksum": file["md5"]} for file_id, file in self.drive_files.items()
+                     if match and match.group(1) in file["parents"]]
+        response = {"files": files[offset:offset + page_size]}
+        if offset + page_size < len(files):
+            response["nextPageToken"] = str(offset + page_size)
+        return response
+
+    def drive_create(self, metadata, content):
+        self.count("drive_files")
+        self.count("drive_bytes", len(content))
+        with self.lock:
+            file_id = f"benchmark-file-{self.counters['drive_files']}"
+            self.drive_files[file_id] = {"name": metadata.get("name"), "parents": metadata.get("parents", []),
+                                         "md5": hashlib.md5(content).hexdigest()}
+        return {"id": file_id}
+
+    def drive_update(self, file_id, content):
+        self.count("drive_updates")
+        self.count("drive_bytes", len(content))
+        with self.lock:
+            if file_id in self.drive_files:
+                self.drive_files[file_id]["md5"] = hashlib.md5(content).hexdigest()
+        return {"id": file_id}
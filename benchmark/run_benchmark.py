@@ -0,0 +1,194 @@
+# Offline end-to-end benchmark of scrape_cesnetd.py
+# For each scale (number of new topics), it starts the local stand-ins (see fake_services), runs the whole script
+# against them in a separate process (fresh state directory, Discourse JSON API path) and reports throughput,
+# latency per stage (from the run report, see metrics) and peak memory.
+# All the outbound pages are on one host (127.0.0.1), so the per-host limits of OutboundFetcher (concurrency and crawl delay)
+# apply to all of them. The crawl delay is 0 by default (--crawl-delay), so the benchmark measures the pipeline, not the politeness.
+#
+# Usage (from the root of the repo, with shared_scripts checked out like in the workflow):
+#   python benchmark/run_benchmark.py --scales 10 100 1000 --latency 0.05 --failure-rate 0.1
+
+##################################### Importing libraries #####################################
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+from fake_services import FakeServices
+
+##################################### Setting parameters #####################################
+
+# Scales (number of new topics) to run by default
+SCALES = [10, 100, 1000]
+
+# Stages shown in the summary table (see metrics)
+SUMMARY_STAGES = ["listing", "topic_fetch", "outbound_fetch", "extract_text", "check_salary", "sheets_write", "drive_upload", "dataset_write"]
+
+# Hosts of the Google APIs that the child process sends to the stand-in
+GOOGLE_HOSTS = {"sheets.googleapis.com", "www.googleapis.com"}
+
+##################################### Define functions #####################################
+def run_child():
+    """
+    Function to run the full pipeline of scrape_cesnetd inside the benchmark process (child mode).
+    The Google API client is pointed at the stand-in (anonymous credentials, requests rewritten to BENCHMARK_GOOGLE_URL)
+    and the politeness delay of the Discourse API is set to BENCHMARK_MIN_REQUEST_INTERVAL.
+    """
+    import httplib2
+    import googleapiclient.discovery
+    from google.oauth2 import service_account
+    sys.path.insert(0, REPO_DIR)
+    import discourse_api
+
+    google_url = urlsplit(os.environ["BENCHMARK_GOOGLE_URL"])
+
+    class StandInHttp(httplib2.Http):
+        def request(self, uri, *args, **kwargs):
+            parts = urlsplit(uri)
+            if parts.hostname in GOOGLE_HOSTS:
+                uri = urlunsplit((google_url.scheme, google_url.netloc, parts.path, parts.query, parts.fragment))
+            return super().request(uri, *args, **kwargs)
+
+    build = googleapiclient.discovery.build
+
+    def build_with_stand_in(*args, **kwargs):
+        kwargs.pop("credentials", None)
+        kwargs["http"] = StandInHttp()
+        return build(*args, **kwargs)
+
+    googleapiclient.discovery.build = build_with_stand_in
+    service_account.Credentials.from_service_account_info = classmethod(lambda cls, info, **kwargs: None)
+    discourse_api.rate_limiter.min_interval = float(os.environ.get("BENCHMARK_MIN_REQUEST_INTERVAL", "0"))
+
+    try:
+        os.chdir(REPO_DIR)
+        import scrape_cesnetd
+        scrape_cesnetd.main(["full"])
+    finally:
+        # Peak memory of the process (ru_maxrss is in KB on Linux)
+        with open(os.environ["BENCHMARK_CHILD_STATS"], "w") as file:
+            json.dump({"peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}, file)
+
+def run_scale(n_topics, args):
+    """
+    Function to run the benchmark for one scale.
+
+    Outputs: dict with the results (wall time, throughput, peak memory, stages, checks)
+    """
+    services = FakeServices(n_topics, links_per_topic=args.links_per_topic, latency=args.latency,
+                            failure_rate=args.failure_rate, page_bytes=args.page_bytes)
+    services.start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="cesnetd-benchmark-") as directory:
+            report_path = os.path.join(directory, "run_report.json")
+            stats_path = os.path.join(directory, "child_stats.json")
+            env = dict(os.environ,
+                       CESNETD_BASE_URL=services.discourse_url,
+                       CESNETD_STATE_DIR=os.path.join(directory, "state"),
+                       CESNETD_DATASET_DIR=os.path.join(directory, "dataset"),
+                       RUN_REPORT_PATH=report_path,
+                       BENCHMARK_GOOGLE_URL=services.google_url,
+                       BENCHMARK_MIN_REQUEST_INTERVAL=str(args.min_request_interval),
+                       BENCHMARK_CHILD_STATS=stats_path,
+                       GOOGLE_APPLICATION_CREDENTIALS="{}",
+                       USERNAME="benchmark",
+                       PASSWORD="benchmark",
+                       OUTBOUND_CRAWL_DELAY=str(args.crawl_delay),
+                       FULL_RESCAN="false")
+            if args.topic_workers is not None:
+                env["TOPIC_WORKERS"] = str(args.topic_workers)
+
+            start = time.perf_counter()
+            process = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], cwd=REPO_DIR, env=env,
+                                     stdout=subprocess.DEVNULL if not args.verbose else None,
+                                     stderr=subprocess.DEVNULL if not args.verbose else None)
+            wall_time = time.perf_counter() - start
+
+            report = json.load(open(report_path)) if os.path.exists(report_path) else {}
+            child_stats = json.load(open(stats_path)) if os.path.exists(stats_path) else {}
+    finally:
+        services.stop()
+
+    # Check the output against what the stand-ins served
+    n_urls = n_topics * args.links_per_topic
+    rows = services.counters.get("sheets_rows", 0)
+    return {
+        "topics": n_topics,
+        "outbound_urls": n_urls,
+        "exit_code": process.returncode,
+        "wall_time_s": round(wall_time, 2),
+        "topics_per_s": round(n_topics / wall_time, 2),
+        "urls_per_s": round(n_urls / wall_time, 2),
+        "peak_rss_mb": child_stats.get("peak_rss_mb"),
+        "sheets_rows": rows,
+        "sheets_rows_expected": n_topics + n_urls,
+        "drive_files": services.counters.get("drive_files", 0),
+        "outbound_requests": services.counters.get("outbound_requests", 0),
+        "logins": services.counters.get("logins", 0),
+        "stages": {stage: summary for stage, summary in report.get("stages", {}).items()},
+        "counters": report.get("counters", {}),
+    }
+
+def print_summary(results):
+    """
+    Function to print a table with the results of each scale.
+    """
+    print(f"{'topics':>7} {'exit':>4} {'wall s':>8} {'topics/s':>9} {'urls/s':>8} {'peak MB':>8} {'rows':>11} {'files':>6}")
+    for result in results:
+        print(f"{result['topics']:>7} {result['exit_code']:>4} {result['wall_time_s']:>8} {result['topics_per_s']:>9} "
+              f"{result['urls_per_s']:>8} {str(result['peak_rss_mb']):>8} "
+              f"{str(result['sheets_rows']) + '/' + str(result['sheets_rows_expected']):>11} {result['drive_files']:>6}")
+    print()
+    print(f"{'topics':>7} {'stage':<15} {'count':>6} {'p50 s':>8} {'p90 s':>8} {'p99 s':>8} {'errors':>6}")
+    for result in results:
+        for stage in SUMMARY_STAGES:
+            summary = result["stages"].get(stage)
+            if summary is not None:
+                print(f"{result['topics']:>7} {stage:<15} {summary['count']:>6} {str(summary['p50_s']):>8} "
+                      f"{str(summary['p90_s']):>8} {str(summary['p99_s']):>8} {summary['errors']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of scrape_cesnetd.py")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES, help="numbers of new topics to run")
+    parser.add_argument("--links-per-topic", type=int, default=3, help="outbound links in each topic")
+    parser.add_argument("--latency", type=float, default=0.05, help="latency (s) of each outbound page")
+    parser.add_argument("--failure-rate", type=float, default=0.1,
+                        help="fraction of outbound pages that fail (half dead, half busy once with Retry-After)")
+    parser.add_argument("--page-bytes", type=int, default=20000, help="size of each outbound page")
+    parser.add_argument("--min-request-interval", type=float, default=0,
+                        help="politeness delay (s) between Discourse requests (production: discourse_api.MIN_REQUEST_INTERVAL)")
+    parser.add_argument("--crawl-delay", type=float, default=0,
+                        help="crawl delay (s) between outbound requests to the same host (production: host_scheduler.CRAWL_DELAY)")
+    parser.add_argument("--topic-workers", type=int, default=None, help="TOPIC_WORKERS for the script")
+    parser.add_argument("--output", default="benchmark_results.json", help="path of the JSON results")
+    parser.add_argument("--verbose", action="store_true", help="show the output of the script")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child()
+
+    results = []
+    for n_topics in args.scales:
+        print(f"Running the benchmark with {n_topics} new topics...", flush=True)
+        results.append(run_scale(n_topics, args))
+
+    with open(args.output, "w") as file:
+        json.dump({"parameters": {key: value for key, value in vars(args).items() if key != "child"}, "results": results}, file, indent=2)
+    print_summary(results)
+    print(f"\nResults written to {args.output}.")
+
+    # Fail if a run failed or didn't write every row (to use it as a guard)
+    if any(result["exit_code"] != 0 or result["sheets_rows"] != result["sheets_rows_expected"] for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
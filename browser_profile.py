@@ -0,0 +1,176 @@
+# Lean headless Chrome profile for the Discourse driver and the outbound pages that need a browser
+# We only need the DOM text and the hrefs, so images, media, fonts and known third-party trackers are blocked
+# (through the DevTools protocol, before each page load) and extensions, GPU and full page loads are turned off.
+# The blocking rules can be changed per domain (BLOCKING_RULES, or a JSON file in BROWSER_BLOCKING_RULES).
+
+##################################### Importing libraries #####################################
+import json
+import logging
+import os
+import threading
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from retry_policy import get_host
+from waits import wait_for_network_idle
+
+##################################### Setting parameters #####################################
+
+# URL patterns of the resources that are blocked, by kind (wildcards as in DevTools' Network.setBlockedURLs)
+RESOURCE_PATTERNS = {
+    "images": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp"],
+    "media": ["*.mp4", "*.webm", "*.ogg", "*.mp3", "*.wav", "*.m4a", "*.mov", "*.m3u8"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*fonts.googleapis.com*", "*fonts.gstatic.com*", "*use.typekit.net*"],
+    "trackers": ["*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+                 "*connect.facebook.net*", "*hotjar.com*", "*segment.com*", "*segment.io*", "*mixpanel.com*", "*hubspot.com*",
+                 "*hs-analytics.net*", "*newrelic.com*", "*nr-data.net*", "*clarity.ms*", "*quantserve.com*", "*scorecardresearch.com*",
+                 "*adsrvr.org*", "*linkedin.com/px*", "*snap.licdn.com*", "*bat.bing.com*"],
+}
+
+# Kinds of resources blocked on each domain ("default" for the domains that aren't listed)
+# A domain also matches its subdomains (e.g., "example.edu" applies to "jobs.example.edu")
+BLOCKING_RULES = {
+    "default": ["images", "media", "fonts", "trackers"],
+}
+
+# Path of a JSON file with blocking rules that replace or add to BLOCKING_RULES (same format)
+BLOCKING_RULES_PATH = os.getenv('BROWSER_BLOCKING_RULES')
+
+# Page load strategy: "eager" returns as soon as the DOM is ready, without waiting for the rest of the resources
+PAGE_LOAD_STRATEGY = "eager"
+
+# Maximum time (in seconds) for a page load
+PAGE_LOAD_TIMEOUT = 60
+
+# Arguments of Chrome
+CHROME_ARGUMENTS = ["--headless=new", "--disable-extensions", "--disable-gpu", "--disable-dev-shm-usage", "--no-first-run",
+                    "--mute-audio", "--window-size=1280,1024"]
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes and functions #####################################
+def load_blocking_rules(path=BLOCKING_RULES_PATH):
+    """
+    Function to get the blocking rules: BLOCKING_RULES updated with the ones in the JSON file at path (if there's one).
+    """
+    rules = dict(BLOCKING_RULES)
+    if path:
+        with open(path) as file:
+            rules.update(json.load(file))
+        logger.info(f"Inside load_blocking_rules: loaded the blocking rules in {path}.")
+    return rules
+
+def get_blocked_patterns(url, rules):
+    """
+    Function to get the URL patterns to block on the page of a URL (from the rule of its domain or the default one).
+
+    Outputs: list of URL patterns
+    """
+    host = get_host(url)
+    kinds = rules.get("default", [])
+    for domain, domain_kinds in rules.items():
+        if domain != "default" and (host == domain or host.endswith(f".{domain}")):
+            kinds = domain_kinds
+            break
+    return [pattern for kind in kinds for pattern in RESOURCE_PATTERNS.get(kind, [kind])]
+
+def apply_blocking(driver, url, rules):
+    """
+    Function to set the resources blocked by the driver for the page of a URL (call it before going to the URL).
+    """
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": get_blocked_patterns(url, rules)})
+
+def create_driver(url=None, rules=None):
+    """
+    Function to create a Chrome driver with the lean profile.
+
+    Inputs:
+    - url: URL whose blocking rules are applied from the start (None: the default rule)
+    - rules: blocking rules (None: load_blocking_rules())
+
+    Outputs: Selenium driver
+    """
+    rules = rules if rules is not None else load_blocking_rules()
+
+    chrome_options = Options()
+    for argument in CHROME_ARGUMENTS:
+        chrome_options.add_argument(argument)
+    chrome_options.page_load_strategy = PAGE_LOAD_STRATEGY
+    chrome_options.add_experimental_option("prefs", {"profile.default_content_setting_values.notifications": 2})
+
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+
+    # Resource blocking (DevTools protocol)
+    driver.execute_cdp_cmd("Network.enable", {})
+    apply_blocking(driver, url or "", rules)
+    logger.info("Inside create_driver: driver created with the lean profile.")
+    return driver
+
+class LeanBrowser:
+    """
+    Class to get pages with the lean profile, reusing one driver per thread (instead of starting a browser per page).
+    The blocking rules of each page's domain are applied before going to it.
+
+    Usage: browser = LeanBrowser(); source_code = browser.fetch(url); ...; browser.close()
+    (fetch can be given to outbound_fetcher.OutboundFetcher as browser_fetch)
+    """
+
+    def __init__(self, rules=None):
+        self.rules = rules if rules is not None else load_blocking_rules()
+        self.thread_data = threading.local()
+        self.lock = threading.Lock()
+        self.drivers = []
+
+    def get_driver(self):
+        """
+        Function to get the driver of the current thread (created the first time).
+        """
+        if getattr(self.thread_data, "driver", None) is None:
+            self.thread_data.driver = create_driver(rules=self.rules)
+            with self.lock:
+                self.drivers.append(self.thread_data.driver)
+        return self.thread_data.driver
+
+    def discard_driver(self):
+        """
+        Function to quit the driver of the current thread (e.g., after it crashed), so that the next fetch creates a new one.
+        """
+        driver = self.thread_data.driver
+        self.thread_data.driver = None
+        with self.lock:
+            self.drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def fetch(self, url):
+        """
+        Function to get the source code of a page once the DOM is ready and the network is idle (for pages rendered with JavaScript).
+        """
+        driver = self.get_driver()
+        try:
+            apply_blocking(driver, url, self.rules)
+            driver.get(url)
+            wait_for_network_idle(driver)
+            return driver.page_source
+        except Exception:
+            # Keep the driver only if it still responds
+            try:
+                driver.current_url
+            except Exception:
+                self.discard_driver()
+            raise
+
+    def close(self):
+        """
+        Function to quit all the drivers.
+        """
+        with self.lock:
+            drivers, self.drivers = self.drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.info(f"Inside LeanBrowser.close: couldn't quit a driver. Error: {e}.")
+        logger.info(f"Inside LeanBrowser.close: closed {len(drivers)} drivers.")
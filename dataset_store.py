@@ -0,0 +1,169 @@
+# Local dataset of the postings and the URLs in postings (rows, text and source code), for analysis without the Google APIs
+# Column-oriented, gzipped JSON lines, partitioned by run date:
+#   {DATASET_DIR}/{table}/run_date=YYYY-MM-DD/{part}/{column}.jsonl.gz  (one JSON value per line, the same row order in every column)
+# Each run appends one part per table (written in a temporary directory and then renamed, so a part is either complete or missing);
+# writing the same part again (e.g., a resumed run) replaces it. A scan only decompresses the columns it asks for,
+# so going through the salary flags or the URLs doesn't touch the source code.
+# The dataset is NOT kept with the files kept between runs (STATE_DIR): that cache can be evicted at any time.
+# On GitHub Actions, the directory starts empty and the parts that a run writes are uploaded as a workflow artifact
+# (dataset-{run ID}, see .github/workflows/run_script.yml); the full dataset is the union of those artifacts, and an
+# artifact is deleted after its retention period. A local directory isn't backed up either: both copies can be lost,
+# so the Google Sheets and Google Drive stay the archive of record.
+
+##################################### Importing libraries #####################################
+import gzip
+import json
+import logging
+import os
+import shutil
+import time
+
+##################################### Setting parameters #####################################
+
+# Directory of the dataset (outside the files kept between runs, see above)
+DATASET_DIR = os.getenv('CESNETD_DATASET_DIR', 'cesnetd_dataset')
+
+# Columns of each table (same order as the rows built by scrape_cesnetd)
+TABLES = {
+    "postings": ["id", "url", "ts", "salary_flag", "urls_in_post", "duplicate_of", "text"],
+    "urls_in_postings": ["id", "posting_id", "posting_url", "url", "ts", "salary_flag", "source_code", "text"],
+}
+
+# Compression level of the column files (1-9; 6 is a good tradeoff between speed and size for text and HTML)
+COMPRESS_LEVEL = 6
+
+# Name of the file that marks a part as complete (number of rows, columns, time written)
+MANIFEST_NAME = "_manifest.json"
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes #####################################
+class DatasetStore:
+    """
+    Class for the local dataset (see the top of the module for the layout).
+
+    Usage:
+    - store = DatasetStore(); store.write_part("postings", "2026-10-17", "run-000012", rows)
+    - for row in store.scan("urls_in_postings", columns=["url", "salary_flag"], since="2026-01-01"): ...
+    """
+
+    def __init__(self, path=DATASET_DIR):
+        self.path = path
+
+    def get_columns(self, table):
+        if table not in TABLES:
+            raise ValueError(f"Unknown table {table}. Tables: {', '.join(TABLES)}.")
+        return TABLES[table]
+
+    def write_part(self, table, run_date, part, rows):
+        """
+        Function to write a part of a table (replacing it if it already exists).
+        The rows are streamed to the column files, so they don't have to be in memory at the same time.
+
+        Inputs:
+        - table: name of the table (see TABLES)
+        - run_date: date of the run (YYYY-MM-DD), the partition of the part
+        - part: name of the part (e.g., "run-000012")
+        - rows: iterable of lists (values in the order of the columns of the table) or dicts (column -> value)
+
+        Outputs: number of rows written
+        """
+        columns = self.get_columns(table)
+        partition = os.path.join(self.path, table, f"run_date={run_date}")
+        final_path = os.path.join(partition, part)
+        temporary_path = os.path.join(partition, f".{part}.tmp")
+        if os.path.exists(temporary_path):
+            shutil.rmtree(temporary_path)
+        os.makedirs(temporary_path)
+
+        # One gzip stream per column
+        files = [gzip.open(os.path.join(temporary_path, f"{column}.jsonl.gz"), "wt", encoding="utf-8", compresslevel=COMPRESS_LEVEL)
+                 for column in columns]
+        n_rows = 0
+        try:
+            for row in rows:
+                values = [row.get(column) for column in columns] if isinstance(row, dict) else list(row) + [None] * (len(columns) - len(row))
+                for file, value in zip(files, values):
+                    file.write(json.dumps(value, ensure_ascii=False))
+                    file.write("\n")
+                n_rows += 1
+        finally:
+            for file in files:
+                file.close()
+
+        with open(os.path.join(temporary_path, MANIFEST_NAME), "w") as file:
+            json.dump({"table": table, "run_date": run_date, "part": part, "rows": n_rows, "columns": columns, "written_at": time.time()}, file)
+
+        # Swap the new part in (the old one, if any, is removed after)
+        old_path = os.path.join(partition, f".{part}.old")
+        if os.path.exists(final_path):
+            os.replace(final_path, old_path)
+        os.replace(temporary_path, final_path)
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path)
+
+        logger.info(f"Inside DatasetStore.write_part: wrote {n_rows} rows to {final_path}.")
+        return n_rows
+
+    def list_parts(self, table, since=None, until=None):
+        """
+        Function to list the complete parts of a table, oldest run date first.
+
+        Inputs:
+        - table: name of the table
+        - since, until: first and last run dates (YYYY-MM-DD, inclusive) to include (None: no limit)
+
+        Outputs: list of dicts (manifests of the parts, with their path)
+        """
+        self.get_columns(table)
+        table_path = os.path.join(self.path, table)
+        if not os.path.isdir(table_path):
+            return []
+
+        parts = []
+        for partition in sorted(os.listdir(table_path)):
+            if not partition.startswith("run_date="):
+                continue
+            run_date = partition[len("run_date="):]
+            if (since is not None and run_date < since) or (until is not None and run_date > until):
+                continue
+            for part in sorted(os.listdir(os.path.join(table_path, partition))):
+                manifest_path = os.path.join(table_path, partition, part, MANIFEST_NAME)
+                if part.startswith(".") or not os.path.exists(manifest_path):
+                    continue
+                with open(manifest_path) as file:
+                    manifest = json.load(file)
+                manifest["path"] = os.path.dirname(manifest_path)
+                parts.append(manifest)
+        return parts
+
+    def scan(self, table, columns=None, since=None, until=None):
+        """
+        Function to go through the rows of a table, reading only the given columns.
+
+        Inputs:
+        - table: name of the table
+        - columns: list of columns (None: all of them)
+        - since, until: first and last run dates (YYYY-MM-DD, inclusive) to include (None: no limit)
+
+        Outputs: generator of dicts (column -> value), plus "run_date"
+        (None for the columns that a part doesn't have, e.g., columns added after it was written)
+        """
+        table_columns = self.get_columns(table)
+        columns = columns if columns is not None else table_columns
+        unknown = [column for column in columns if column not in table_columns]
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown columns for table {table}: {', '.join(unknown)}.")
+
+        for part in self.list_parts(table, since, until):
+            part_columns = [column for column in columns if column in part["columns"]]
+            files = [gzip.open(os.path.join(part["path"], f"{column}.jsonl.gz"), "rt", encoding="utf-8") for column in part_columns]
+            try:
+                for lines in zip(*files) if len(files) > 0 else ([] for _ in range(part["rows"])):
+                    row = dict.fromkeys(columns)
+                    row.update((column, json.loads(line)) for column, line in zip(part_columns, lines))
+                    row["run_date"] = part["run_date"]
+                    yield row
+            finally:
+                for file in files:
+                    file.close()
@@ -0,0 +1,355 @@
+# Functions to get CESNET-D's job postings through Discourse's JSON API
+# Discourse serves the same data as the rendered pages as JSON (e.g., /c/job-posting/5.json, /tag/jobs.json, /t/{id}.json)
+# so there's no need to start a browser, scroll and render every page
+
+##################################### Importing libraries #####################################
+import logging
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from queue import Queue
+import requests
+from bs4 import BeautifulSoup
+from metrics import metrics
+from retry_policy import PermanentError
+from rate_limiter import RateLimiter
+from session_store import cookies_from_requests
+from url_extraction import extract_urls_from_html
+
+##################################### Setting parameters #####################################
+
+# Base URL of CESNET-D (can be changed with CESNETD_BASE_URL, e.g., to run against the local stand-in of the benchmark)
+BASE_URL = os.getenv('CESNETD_BASE_URL', "https://cesnet.discourse.group").rstrip('/')
+
+# Timeout (in seconds) for each request
+REQUEST_TIMEOUT = 30
+
+# Maximum number of pages to request from a topic list (safety net in case the pagination never ends)
+MAX_LIST_PAGES = 1000
+
+# Minimum time (in seconds) between two requests to Discourse, across all the sessions and threads (politeness)
+MIN_REQUEST_INTERVAL = 0.5
+
+# HTML tags after which the rendered text of a post has a line break
+BLOCK_TAGS = ["p", "div", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6", "tr", "table", "blockquote", "pre", "aside", "hr"]
+
+logger = logging.getLogger(__name__)
+
+##################################### Define functions #####################################
+# Rate limiter for all the requests to Discourse
+rate_limiter = RateLimiter(MIN_REQUEST_INTERVAL)
+
+def new_session():
+    """
+    Function to create a session with the headers that Discourse expects
+    (it only answers with JSON to requests that look like they come from its own front end).
+    """
+    session = requests.Session()
+    session.headers.update({"Accept": "application/json", "X-Requested-With": "XMLHttpRequest"})
+    return session
+
+def create_session(username, password, base_url=BASE_URL):
+    """
+    Function to log in to Discourse and get an authenticated session.
+
+    Inputs:
+    - username: CESNET-D's username
+    - password: CESNET-D's password
+    - base_url: base URL of the Discourse forum
+
+    Outputs: requests.Session with the login cookies
+
+    Dependencies: new_session
+    """
+
+    # Create the session
+    session = new_session()
+    logger.info("Inside create_session: created the session.")
+
+    with metrics.span("login"):
+        # Get the CSRF token (Discourse requires it to log in)
+        rate_limiter.wait()
+        response = session.get(f"{base_url}/session/csrf.json", timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        csrf_token = response.json()["csrf"]
+        logger.info("Inside create_session: got the CSRF token.")
+
+        # Log in
+        rate_limiter.wait()
+        response = session.post(f"{base_url}/session",
+                                data={"login": username, "password": password},
+                                headers={"X-CSRF-Token": csrf_token},
+                                timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        logger.info("Inside create_session: sent the login request.")
+
+    # Discourse answers a failed login with a 200 and an error message (retrying won't help)
+    login_result = response.json()
+    if "error" in login_result:
+        raise PermanentError(f"Login to Discourse failed: {login_result['error']}")
+    logger.info("Inside create_session: logged in.")
+
+    return session
+
+def session_from_cookies(cookies):
+    """
+    Function to create a session with stored login cookies (see session_store).
+    """
+    session = new_session()
+    for cookie in cookies:
+        session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/"),
+                            secure=cookie.get("secure", False), expires=cookie.get("expiry"))
+    return session
+
+def is_logged_in(session, base_url=BASE_URL):
+    """
+    Function to check whether a session is still logged in, with one cheap request (the current user).
+
+    Outputs: True or False
+    """
+    rate_limiter.wait()
+    with metrics.span("session_check"):
+        response = session.get(f"{base_url}/session/current.json", timeout=REQUEST_TIMEOUT)
+
+    # Discourse answers 404 when nobody is logged in
+    if response.status_code in (401, 403, 404):
+        return False
+    response.raise_for_status()
+    return "current_user" in response.json()
+
+def get_session(username, password, store=None, base_url=BASE_URL):
+    """
+    Function to get an authenticated session, reusing the stored login cookies if they're still valid.
+    Only logs in (create_session) if there are no stored cookies or they expired; the new cookies are then stored.
+
+    Inputs:
+    - username: CESNET-D's username
+    - password: CESNET-D's password
+    - store: session_store.SessionStore (None to always log in)
+    - base_url: base URL of the Discourse forum
+
+    Outputs: requests.Session with the login cookies
+
+    Dependencies: create_session, session_from_cookies, is_logged_in, from session_store import cookies_from_requests
+    """
+
+    # Reuse the stored session
+    cookies = store.load() if store is not None else None
+    if cookies is not None:
+        session = session_from_cookies(cookies)
+        if is_logged_in(session, base_url):
+            logger.info("Inside get_session: reusing the stored session.")
+            # Discourse rotates the auth token from time to time, so store the cookies again
+            store.save(cookies_from_requests(session.cookies))
+            return session
+        logger.info("Inside get_session: the stored session expired.")
+        store.clear()
+
+    # Log in
+    session = create_session(username, password, base_url)
+    if store is not None:
+        store.save(cookies_from_requests(session.cookies))
+    return session
+
+def clone_session(session):
+    """
+    Function to create a new session with the same headers and login cookies as an authenticated one.
+    requests.Session isn't thread-safe, so each thread gets its own.
+    """
+    new_session = requests.Session()
+    new_session.headers.update(session.headers)
+    new_session.cookies.update(session.cookies)
+    return new_session
+
+def imap_with_session_pool(session, function, items, workers, max_pending=None):
+    """
+    Function to apply function(worker_session, item) to every item with a pool of sessions working in parallel.
+    Generator: yields the results in the same order as items, as soon as each one (and the ones before it) is ready.
+    At most max_pending items are submitted ahead of the result being consumed, so the work (and the results waiting
+    to be consumed) is bounded by the speed of the consumer.
+
+    Inputs:
+    - session: authenticated session (cloned once per worker)
+    - function: function that takes a session and an item
+    - items: iterable of items (e.g., URLs of the topics)
+    - workers: number of sessions/threads
+    - max_pending: maximum number of items submitted but not consumed yet (None: twice the number of workers)
+
+    Outputs: generator of results, in the same order as items
+
+    Dependencies: clone_session, from collections import deque, from concurrent.futures import ThreadPoolExecutor,
+    from itertools import islice, from queue import Queue
+    """
+    workers = max(1, workers)
+    max_pending = max(workers, max_pending if max_pending is not None else 2 * workers)
+
+    # Pool of sessions: each task borrows one and gives it back when it's done
+    sessions = Queue()
+    for _ in range(workers):
+        sessions.put(clone_session(session))
+    logger.info(f"Inside imap_with_session_pool: created {workers} sessions. Maximum pending items: {max_pending}.")
+
+    def run(item):
+        worker_session = sessions.get()
+        try:
+            return function(worker_session, item)
+        finally:
+            sessions.put(worker_session)
+
+    # Window of futures in the same order as the items: the first one is yielded before another item is submitted
+    items = iter(items)
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending.extend(executor.submit(run, item) for item in islice(items, max_pending))
+        while len(pending) > 0:
+            result = pending.popleft().result()
+            pending.extend(executor.submit(run, item) for item in islice(items, 1))
+            yield result
+    finally:
+        # If the consumer stops early (or an item failed), the items not started yet are dropped
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def get_json(session, url, params=None):
+    """
+    Function to get a JSON response from Discourse.
+
+    Inputs:
+    - session: authenticated session
+    - url: URL of the JSON endpoint
+    - params: query parameters
+
+    Outputs: parsed JSON (dict)
+
+    Dependencies: requests, rate_limiter, from metrics import metrics
+    """
+    rate_limiter.wait()
+    with metrics.span("discourse_api"):
+        response = session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+    metrics.add_bytes("discourse_api", len(response.content))
+    response.raise_for_status()
+    return response.json()
+
+def get_topic_url(topic, base_url=BASE_URL):
+    """
+    Function to build the URL of a topic from its entry in a topic list.
+    Same format as the URLs that get_main_post_url returns: https://cesnet.discourse.group/t/{slug}/{id}
+    """
+    return f"{base_url}/t/{topic['slug']}/{topic['id']}"
+
+def get_topic_urls(session, listing_url, excluded=(), known_ids=None, order="created"):
+    """
+    Function to get the URLs of the topics in a topic list (category or tag).
+    Requests {listing_url}.json page by page, newest topics first, until Discourse stops returning topics.
+    If known_ids is given, it also stops at the first page where all the topics are already known (incremental crawl).
+
+    Inputs:
+    - session: authenticated session
+    - listing_url: URL of the category or tag (e.g., https://cesnet.discourse.group/c/job-posting/5)
+    - excluded: strings; topics whose URL contains any of them are left out
+    - known_ids: set of topic IDs (strings) already scraped; None to get all the pages (full rescan)
+    - order: order of the topic list ("created" or "activity", i.e., bump time)
+
+    Outputs: list of topic URLs (without duplicates)
+
+    Dependencies: get_json, get_topic_url
+    """
+
+    # List to store the URLs of the topics
+    urls = []
+
+    # Iterate over the pages of the topic list
+    for page in range(MAX_LIST_PAGES):
+        data = get_json(session, f"{listing_url.rstrip('/')}.json", params={"page": page, "order": order, "ascending": "false"})
+        topic_list = data.get("topic_list", {})
+        topics = topic_list.get("topics", [])
+        logger.info(f"Inside get_topic_urls: got page {page} of {listing_url} with {len(topics)} topics.")
+
+        # Get the URLs of the topics in the page
+        page_ids = []
+        for topic in topics:
+            url = get_topic_url(topic)
+            if not any(string in url for string in excluded):
+                urls.append(url)
+                page_ids.append(str(topic["id"]))
+
+        # Stop when there are no more pages
+        if len(topics) == 0 or "more_topics_url" not in topic_list:
+            logger.info(f"Inside get_topic_urls: no more pages for {listing_url}.")
+            break
+
+        # Stop when all the topics in the page were already scraped (the rest of the pages are older)
+        if known_ids is not None and len(page_ids) > 0 and all(topic_id in known_ids for topic_id in page_ids):
+            logger.info(f"Inside get_topic_urls: all the topics in page {page} of {listing_url} were already scraped. Stopping.")
+            break
+
+    # Remove duplicates (a topic can move between pages while paginating), keeping the order
+    urls = list(dict.fromkeys(urls))
+    logger.info(f"Inside get_topic_urls: number of URLs found for {listing_url}: {len(urls)}.")
+
+    return urls
+
+def get_topic_id(url):
+    """
+    Function to get the ID of a topic from its URL (the last numeric segment of the URL).
+    """
+    parts = url.rstrip('/').split('/')
+    if len(parts) > 1 and parts[-1].isdigit() and parts[-2].isdigit():
+        return parts[-2]
+    return parts[-1]
+
+def parse_cooked(cooked):
+    """
+    Function to get the text from the cooked HTML of a post.
+    The text mimics what Selenium returns for the "cooked" element: one line per block element.
+
+    Inputs:
+    - cooked: cooked HTML of the post
+
+    Outputs: text of the post
+
+    Dependencies: from bs4 import BeautifulSoup, re
+    """
+    soup = BeautifulSoup(cooked, "html.parser")
+
+    # Add line breaks where the browser would render them
+    for line_break in soup.find_all("br"):
+        line_break.replace_with("\n")
+    for tag in soup.find_all(BLOCK_TAGS):
+        tag.append("\n")
+
+    # Get the text, without blank lines
+    text = re.sub(r"[ \t]*\n\s*", "\n", soup.get_text()).strip()
+
+    return text
+
+def get_post(session, url, base_url=BASE_URL):
+    """
+    Function to get the URLs and the text of the main post of a topic.
+    Equivalent to finding the "cooked" element of the topic page with Selenium.
+
+    Inputs:
+    - session: authenticated session
+    - url: URL of the topic
+    - base_url: base URL of the Discourse forum
+
+    Outputs: tuple (list of URLs in the post, text of the post)
+
+    Dependencies: get_json, get_topic_id, parse_cooked, from url_extraction import extract_urls_from_html
+    """
+
+    # Get the topic
+    data = get_json(session, f"{base_url}/t/{get_topic_id(url)}.json")
+    logger.info(f"Inside get_post: got the topic {url}.")
+
+    # Get the main post (the first one in the stream)
+    cooked = data["post_stream"]["posts"][0]["cooked"]
+    text_post = parse_cooked(cooked)
+
+    # Get the URLs in the post (hyperlinks and URLs in the text, in one pass), canonicalized and without duplicates
+    urls_in_post = extract_urls_from_html(cooked, base_url)
+    logger.info(f"Inside get_post: number of URLs in the post: {len(urls_in_post)}.")
+
+    return urls_in_post, text_post
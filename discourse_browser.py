@@ -0,0 +1,359 @@
+# Selenium fallback for the Discourse JSON API
+# Logs in to CESNET-D (reusing the stored session when it's still valid), lists the job postings by scrolling the topic lists
+# and gets the posts, with one driver (lean profile, see browser_profile) and a politeness policy (see waits).
+# scrape_cesnetd only imports this module when the API fails, so the other stages don't load Selenium.
+
+##################################### Importing libraries #####################################
+import logging
+import os
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException
+from browser_profile import create_driver
+from discourse_api import BASE_URL
+from metrics import metrics
+from retry_policy import get_host
+from session_store import cookies_from_selenium
+from url_extraction import extract_urls_from_html
+from waits import NavigationPolicy, wait_for_element, wait_for_clickable, wait_for_count_increase, wait_for_network_idle
+
+##################################### Setting parameters #####################################
+
+# Minimum time (in seconds) between two page loads of the driver (politeness)
+# Waiting for the pages to be ready is handled separately (see waits)
+DRIVER_MIN_INTERVAL = float(os.getenv('DRIVER_MIN_INTERVAL', '1'))
+
+# Locator of the rows of Discourse's topic lists
+TOPIC_LIST_ROW = (By.CSS_SELECTOR, 'tr.topic-list-item')
+
+# CSS selector of the current user in Discourse's header (only there when logged in)
+CURRENT_USER_SELECTOR = '#current-user, .header-dropdown-toggle.current-user'
+
+# Maximum time (in seconds) to wait for the page to show the logged-in user after loading stored cookies in the driver
+STORED_SESSION_TIMEOUT = 5
+
+# Number of topics that Discourse loads per page (and per scroll) in topic lists
+TOPIC_LIST_PAGE_SIZE = 30
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes and functions #####################################
+def get_main_post_url(url):
+    """
+    Function to extract the main post URL from a Discourse thread URL.
+    Otherwise I would get URLs to responses in the thread, which I don't want.
+
+    Draft taken from ChatGPT.
+    """
+    try:
+        # Split the URL by slashes to check the last segment
+        parts = url.rstrip('/').split('/')
+        # If the last two segments are numeric, remove the last one
+        if len(parts) > 1 and parts[-1].isdigit() and parts[-2].isdigit():
+            return '/'.join(parts[:-1])
+        # Otherwise, return the URL as is
+        return url
+    except Exception as e:
+        print(f"Error in get_main_post_url: {e}. Returning the URL as is.")
+        return url
+
+# Code to test the get_main_post_url function
+# def test_get_main_post_url():
+#     assert get_main_post_url("https://cesnet.discourse.group/t/now-hiring-fgcu-assistant-professor-school-counseling/2148") == "https://cesnet.discourse.group/t/now-hiring-fgcu-assistant-professor-school-counseling/2148"
+#     assert get_main_post_url("https://cesnet.discourse.group/t/now-hiring-fgcu-assistant-professor-school-counseling/2148/1") == "https://cesnet.discourse.group/t/now-hiring-fgcu-assistant-professor-school-counseling/2148"
+#     assert get_main_post_url("https://cesnet.discourse.group/t/lecturer-in-higher-education-student-affairs-at-butler-univ-indianapolis/727") == "https://cesnet.discourse.group/t/lecturer-in-higher-education-student-affairs-at-butler-univ-indianapolis/727"
+#     assert get_main_post_url("https://cesnet.discourse.group/t/lecturer-in-higher-education-student-affairs-at-butler-univ-indianapolis/727/1") == "https://cesnet.discourse.group/t/lecturer-in-higher-education-student-affairs-at-butler-univ-indianapolis/727"
+#     assert get_main_post_url("https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/91") == "https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/91"
+#     assert get_main_post_url("https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/91/2") == "https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/91"
+#     # The ones below are hypothetical cases
+#     assert get_main_post_url("https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/9") == "https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/9"
+#     assert get_main_post_url("https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/9/2") == "https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/9"
+#     assert get_main_post_url("https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/999999999999999") == "https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/999999999999999"
+#     assert get_main_post_url("https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/999999999999999/2") == "https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/999999999999999"
+#     print("All tests passed.")
+
+# test_get_main_post_url()
+
+def last_topics_already_scraped(driver, existing_postings):
+    """
+    Function to check whether the last batch of topics loaded in a topic list were all already scraped.
+    With the topic list ordered by creation time (newest first), that means that there's nothing new further down.
+
+    Inputs:
+    - driver: Selenium driver (on a topic list page)
+    - existing_postings: IDs of the postings already scraped (set or posting_index.SheetIDIndex)
+
+    Outputs: True or False
+    """
+    topic_ids = [row.get_attribute('data-topic-id') for row in driver.find_elements(*TOPIC_LIST_ROW)]
+    topic_ids = [topic_id for topic_id in topic_ids if topic_id is not None]
+    last_topic_ids = topic_ids[-TOPIC_LIST_PAGE_SIZE:]
+    return len(last_topic_ids) > 0 and all(topic_id in existing_postings for topic_id in last_topic_ids)
+
+class DiscourseBrowser:
+    """
+    Class to log in to CESNET-D, list the job postings and get the posts with Selenium (fallback for the Discourse JSON API).
+
+    Usage: browser = DiscourseBrowser(category_url, tag_url, username, password, store, retry_policy); browser.start();
+    urls = browser.get_job_posting_urls(known_ids) (or browser.open() to only log in); browser.get_post(url); ...; browser.quit()
+    """
+
+    def __init__(self, category_url, tag_url, username, password, store, retry_policy, min_interval=DRIVER_MIN_INTERVAL):
+        self.category_url = category_url
+        self.tag_url = tag_url
+        self.username = username
+        self.password = password
+        self.store = store
+        self.retry_policy = retry_policy
+        self.host = get_host(category_url)
+        self.driver = None
+        self.logged_in = False
+
+        # Politeness policy of the driver (spacing out its page loads)
+        self.navigation = NavigationPolicy(min_interval)
+
+    def start(self):
+        """
+        Function to initialize the driver (headless, lean profile: no images, media, fonts or trackers; see browser_profile).
+        Raises the last error if all the attempts fail.
+        """
+        logger.info("Re-try block in initializing the driver about to start.")
+
+        for attempt in self.retry_policy.attempts("initializing the driver"):
+            with attempt:
+                self.driver = create_driver(self.category_url)
+                logger.info("Driver initialized.")
+
+        logger.info("Re-try block successful.")
+
+    def scroll_to_bottom(self, is_done=None, item_locator=TOPIC_LIST_ROW):
+        """
+        Function to scroll to the bottom of the page.
+        Draft taken from: https://chatgpt.com/share/671a8ab4-a1bc-8004-8567-3be2d472dc49
+
+        After each scroll, it waits until more items (item_locator, by default the rows of a topic list) are loaded.
+        If nothing new loads within waits.SCROLL_WAIT_TIMEOUT seconds, it's the bottom of the page.
+
+        If is_done is given (function that takes the driver and returns True or False),
+        it stops scrolling as soon as is_done(driver) is True, even if there's more content to load.
+        """
+        driver = self.driver
+
+        # Re-try block
+        logger.info("Re-try block in scroll_to_bottom function about to start.")
+
+        try:
+            for attempt in self.retry_policy.attempts("scroll_to_bottom", self.host):
+                with attempt, metrics.span("listing_scroll"):
+                    last_count = len(driver.find_elements(*item_locator))
+
+                    while True:
+                        # Scroll down to the bottom
+                        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+
+                        # Wait for the page to load more content
+                        new_count = wait_for_count_increase(driver, *item_locator, last_count)
+
+                        # Check if more items were loaded
+                        if new_count == last_count:
+                            # If nothing new loaded, break the loop
+                            break
+
+                        # Check if there's no need to keep scrolling
+                        if is_done is not None and is_done(driver):
+                            logger.info("No need to keep scrolling. Stopping.")
+                            break
+
+                        # Update last_count to new count
+                        last_count = new_count
+
+            logger.info("Re-try block successful.")
+
+        except Exception as e:
+            logger.error(f"Couldn't scroll to the bottom. Exiting the function. Error: {e}.")
+
+    def login(self):
+        """
+        Function to log in to CESNET-D.
+        The driver has to be on a page with the login button (e.g., the job category postings page).
+
+        It tries the stored login cookies first (see session_store) and only goes through the login form if they expired.
+        After logging in with the form, it stores the new cookies.
+        """
+        driver = self.driver
+
+        with metrics.span("login"):
+            # Reuse the stored session
+            cookies = self.store.load()
+            if cookies is not None:
+                for cookie in cookies:
+                    try:
+                        driver.add_cookie(cookie)
+                    except Exception as e:
+                        logger.info(f"Driver couldn't add the stored cookie {cookie['name']}. Error: {e}.")
+                self.navigation.get(driver, driver.current_url)
+                try:
+                    wait_for_element(driver, By.CSS_SELECTOR, CURRENT_USER_SELECTOR, timeout=STORED_SESSION_TIMEOUT)
+                    logger.info("Driver reused the stored session.")
+                    self.logged_in = True
+                    return
+                except TimeoutException:
+                    logger.info("The stored session expired. Driver logging in with the login form.")
+                    driver.delete_all_cookies()
+                    self.navigation.get(driver, driver.current_url)
+
+            # Find the login button
+            login_button = wait_for_clickable(driver, By.CLASS_NAME, 'body-page-button-container')
+            logger.info("Driver found the login button.")
+
+            # Click the login button
+            login_button.click()
+            logger.info("Driver clicked the login button.")
+
+            # Find the username and password fields (wait for the login form to show up)
+            username_field = wait_for_clickable(driver, By.ID, "login-account-name")
+            password_field = wait_for_clickable(driver, By.ID, "login-account-password")
+            logger.info("Driver found the username and password fields.")
+
+            # Enter the username and password
+            username_field.send_keys(self.username)
+            password_field.send_keys(self.password)
+            logger.info("Driver entered the username and password.")
+
+            # Find the login button
+            login_button = driver.find_element(By.ID, "login-button")
+            logger.info("Driver found the login button.")
+
+            # Click the login button
+            login_button.click()
+            logger.info("Driver clicked the login button.")
+
+            # Wait until the user is logged in (the current user shows up in the header)
+            wait_for_element(driver, By.CSS_SELECTOR, CURRENT_USER_SELECTOR)
+            logger.info("Driver logged in.")
+            self.logged_in = True
+
+        # Store the session for the next runs
+        self.store.save(cookies_from_selenium(driver.get_cookies()))
+
+    def open(self):
+        """
+        Function to go to the job category postings page and log in (to scrape postings without listing them first).
+        """
+        self.navigation.get(self.driver, self.category_url)
+        self.login()
+
+    def get_job_posting_urls(self, known_ids=None):
+        """
+        Function to get the URLs of the job category and jobs tag postings.
+
+        Inputs:
+        - known_ids: set of IDs of the postings already scraped; None to scroll through all the postings (full rescan)
+
+        Outputs: list of URLs of the postings (without duplicates)
+
+        Dependencies: login, scroll_to_bottom, last_topics_already_scraped, get_main_post_url
+        """
+        driver = self.driver
+
+        # Stop scrolling at the first batch of postings already scraped (incremental crawl)
+        if known_ids is not None:
+            is_done = lambda driver: last_topics_already_scraped(driver, known_ids)
+        else:
+            is_done = None
+
+        ################# Job category #################
+
+        # Go to the job category postings page and log in
+        self.open()
+        logger.info(f"Driver went to URL: {self.category_url}.")
+
+        # Order the postings by creation time (newest first)
+        self.navigation.get(driver, self.category_url + "?order=created")
+        logger.info(f"Driver went to URL: {self.category_url}?order=created.")
+
+        # Wait for the list of postings
+        wait_for_element(driver, *TOPIC_LIST_ROW)
+        logger.info("Driver found the list of postings.")
+
+        # Scroll to the bottom of the page
+        self.scroll_to_bottom(is_done)
+        logger.info("Driver scrolled to the bottom of the page.")
+
+        # Get the URLs of the job postings
+        urls = [get_main_post_url(url) for url in [hyperlink.get_attribute('href') for hyperlink in driver.find_elements(By.TAG_NAME, 'a')] if url is not None and f'{BASE_URL}/t/' in url and 'about-the-job-posting-category' not in url]
+        logger.info("Driver got the URLs of the job postings for the job category.")
+        logger.info(f"Number of URLs found: {len(urls)}.")
+        urls = list(set(urls))
+        logger.info(f"Number of URLs after removing duplicates: {len(urls)}.")
+
+        ################# jobs tag postings #################
+
+        # Go to the jobs tag postings page (newest first)
+        self.navigation.get(driver, self.tag_url + "?order=created")
+
+        # Wait for the list of postings
+        wait_for_element(driver, *TOPIC_LIST_ROW)
+
+        # Scroll to the bottom of the page
+        self.scroll_to_bottom(is_done)
+        logger.info("Driver scrolled to the bottom of the page.")
+
+        # Get the URLs of the job postings
+        urls_jobs_tags = [get_main_post_url(url) for url in [hyperlink.get_attribute('href') for hyperlink in driver.find_elements(By.TAG_NAME, 'a')] if url is not None and f'{BASE_URL}/t/' in url]
+        logger.info("Driver got the URLs of the job postings for the jobs tags.")
+        logger.info(f"Number of URLs found: {len(urls_jobs_tags)}.")
+        urls_jobs_tags = list(set(urls_jobs_tags))
+        logger.info(f"Number of URLs after removing duplicates: {len(urls_jobs_tags)}.")
+
+        # Putting the two lists together
+        # Although it's inefficient what I'm doing with duplicates,
+        # it makes it easier to check that the script is working correctly
+        # And there's not a major efficiency problem with the number of URLs
+        urls += urls_jobs_tags
+        logger.info("Merged the URLs of the job postings for the job category and the jobs tags.")
+        logger.info(f"Total number of URLs: {len(urls)}.")
+        urls = list(set(urls))
+        logger.info(f"Total number of URLs after removing duplicates: {len(urls)}.")
+
+        return urls
+
+    def get_post(self, url):
+        """
+        Function to get the URLs and the text of a posting (the driver has to be logged in).
+
+        Outputs: tuple (list of URLs in the post, text of the post)
+
+        Dependencies: from url_extraction import extract_urls_from_html
+        """
+        driver = self.driver
+
+        # Go to the URL of the posting
+        self.navigation.get(driver, url)
+        logger.info(f"Driver went to URL: {url}.")
+
+        # Get the post (wait until it's rendered and its images, embeds, etc. stop loading)
+        post = wait_for_element(driver, By.CLASS_NAME, 'cooked')
+        wait_for_network_idle(driver)
+        logger.info("Driver got the posting.")
+
+        # Get the URLs in the post (hyperlinks and URLs in the text, in one pass over its HTML: one call to the driver
+        # instead of several per link), canonicalized and without duplicates
+        urls_in_post = extract_urls_from_html(post.get_attribute('innerHTML'), url)
+        logger.info(f"Driver got the URLs in the posting: {len(urls_in_post)}.")
+        logger.info(f"urls_in_post: {urls_in_post}")
+
+        # Get the text of the posting
+        text_post = post.text
+        logger.info("Driver got the text of the posting.")
+
+        return urls_in_post, text_post
+
+    def quit(self):
+        """
+        Function to quit the driver.
+        """
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+            self.logged_in = False
+            logger.info("Driver quit.")
@@ -0,0 +1,211 @@
+# Functions to upload the text and source code files to Google Drive
+# The files are streamed from memory (no temporary files) and uploaded by a bounded pool of threads
+# Note: Drive's batch HTTP endpoint doesn't accept media uploads, so parallel requests are used instead of batches
+# Each target folder is listed once into a name -> (ID, MD5 checksum) index, so a file that is already there with the same
+# content is skipped and a file that changed is updated in place (instead of adding another file with the same name)
+
+##################################### Importing libraries #####################################
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.discovery import build
+from googleapiclient.http import MediaIoBaseUpload
+from metrics import metrics
+from retry_policy import RetryPolicy
+
+##################################### Setting parameters #####################################
+
+# Number of uploads at the same time
+DRIVE_UPLOAD_WORKERS = 8
+
+# Maximum number of files waiting or uploading (their contents are in memory)
+DRIVE_MAX_PENDING = 32
+
+# Host of the Google Drive API (for the circuit breaker of the retry policy)
+DRIVE_HOST = "www.googleapis.com"
+
+# Number of files per page when listing a folder (maximum allowed by the API)
+DRIVE_LIST_PAGE_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes and functions #####################################
+def upload_content(service, file_name, content, folder_id):
+    """
+    Function to upload a string as a text file to Google Drive, without writing it to disk.
+
+    Inputs:
+    - service: service for Google Drive
+    - file_name: name of the file
+    - content: content of the file
+    - folder_id: ID of the folder in Google Drive
+
+    Outputs: ID of the file in Google Drive
+
+    Dependencies: io, from googleapiclient.http import MediaIoBaseUpload
+    """
+
+    # Prepare the file metadata
+    file_metadata = {
+        'name': file_name,
+        'parents': [folder_id]
+    }
+
+    # Prepare the file media from memory
+    media = MediaIoBaseUpload(io.BytesIO(str(content).encode('utf-8')), mimetype='text/plain', resumable=False)
+
+    # Upload the file to the Drive folder
+    result = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
+
+    return result['id']
+
+def update_content(service, file_id, content):
+    """
+    Function to replace the content of a file in Google Drive with a string (same ID, name and folder).
+
+    Outputs: ID of the file in Google Drive
+
+    Dependencies: io, from googleapiclient.http import MediaIoBaseUpload
+    """
+    media = MediaIoBaseUpload(io.BytesIO(str(content).encode('utf-8')), mimetype='text/plain', resumable=False)
+    result = service.files().update(fileId=file_id, media_body=media, fields='id').execute()
+    return result['id']
+
+def list_folder(service, folder_id):
+    """
+    Function to list the files in a Google Drive folder.
+    If several files have the same name (e.g., uploaded twice by older versions of the script), the most recently modified one is kept.
+
+    Outputs: dict with the name of each file -> tuple (ID, MD5 checksum)
+    """
+    files = {}
+    page_token = None
+    while True:
+        response = service.files().list(q=f"'{folder_id}' in parents and trashed = false",
+                                        fields="nextPageToken, files(id, name, md5Checksum)", orderBy="modifiedTime desc",
+                                        pageSize=DRIVE_LIST_PAGE_SIZE, pageToken=page_token,
+                                        supportsAllDrives=True, includeItemsFromAllDrives=True).execute()
+        for file in response.get("files", []):
+            files.setdefault(file["name"], (file["id"], file.get("md5Checksum")))
+        page_token = response.get("nextPageToken")
+        if page_token is None:
+            return files
+
+class DriveUploader:
+    """
+    Class to upload files to Google Drive in the background with a bounded pool of threads.
+    submit() waits when max_pending files are already waiting or uploading, so the contents in memory are bounded
+    and the stages that produce the files slow down if the uploads can't keep up.
+    Each file is retried on its own, so a failure doesn't make the others be uploaded again.
+    Each folder is listed the first time a file goes to it (see list_folder): files with the same name and content are skipped,
+    and files with the same name and a different content are updated in place.
+
+    Usage: uploader = DriveUploader(credentials); uploader.submit(file_name, content, folder_id); ...; results = uploader.close()
+    """
+
+    def __init__(self, credentials, workers=DRIVE_UPLOAD_WORKERS, max_pending=DRIVE_MAX_PENDING, retry_policy=None,
+                 on_uploaded=None):
+        self.credentials = credentials
+        self.workers = max(1, workers)
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.on_uploaded = on_uploaded
+
+        # The Google API client isn't thread-safe, so each thread builds its own service
+        self.thread_data = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.slots = threading.BoundedSemaphore(max(1, max_pending))
+        self.futures = []
+
+        # Index of each folder (name -> (ID, MD5 checksum)), listed once
+        self.folders = {}
+        self.folders_lock = threading.Lock()
+
+    def get_service(self):
+        if not hasattr(self.thread_data, "service"):
+            self.thread_data.service = build('drive', 'v3', credentials=self.credentials, cache_discovery=False)
+        return self.thread_data.service
+
+    def get_folder(self, folder_id):
+        """
+        Function to get the index of a folder (listed the first time; the other threads wait for it).
+        """
+        with self.folders_lock:
+            if folder_id not in self.folders:
+                with metrics.span("drive_list"):
+                    self.folders[folder_id] = self.retry_policy.call(list_folder, self.get_service(), folder_id,
+                                                                     description=f"listing of folder {folder_id}", host=DRIVE_HOST)
+                logger.info(f"Inside DriveUploader.get_folder: folder {folder_id} has {len(self.folders[folder_id])} files.")
+            return self.folders[folder_id]
+
+    def upload(self, file_name, content, folder_id):
+        """
+        Function to upload a file with retries (runs in a worker thread): skipped if the folder already has it with the same content,
+        updated in place if the content changed, created otherwise.
+
+        Outputs: dict with the name of the file, the folder, the ID in Google Drive (None if it failed), the action
+        ("skipped", "updated" or "created") and the error (None if it succeeded)
+        """
+        content_bytes = str(content).encode('utf-8')
+        checksum = hashlib.md5(content_bytes).hexdigest()
+
+        try:
+            folder = self.get_folder(folder_id)
+            file_id, folder_checksum = folder.get(file_name, (None, None))
+            if file_id is not None and folder_checksum == checksum:
+                action = "skipped"
+            else:
+                with metrics.span("drive_upload"):
+                    if file_id is not None:
+                        action = "updated"
+                        file_id = self.retry_policy.call(update_content, self.get_service(), file_id, content,
+                                                         description=f"update of {file_name}", host=DRIVE_HOST)
+                    else:
+                        action = "created"
+                        file_id = self.retry_policy.call(upload_content, self.get_service(), file_name, content, folder_id,
+                                                         description=f"upload of {file_name}", host=DRIVE_HOST)
+                metrics.add_bytes("drive_upload", len(content_bytes))
+                with self.folders_lock:
+                    folder[file_name] = (file_id, checksum)
+            metrics.count(f"drive_{action}")
+            logger.info(f"Inside DriveUploader.upload: {file_name} {action}.")
+        except Exception as e:
+            return {"name": file_name, "folder_id": folder_id, "id": None, "action": None, "error": str(e)}
+
+        # Outside the re-try block, so that an error here doesn't make the file be uploaded twice
+        result = {"name": file_name, "folder_id": folder_id, "id": file_id, "action": action, "error": None}
+        if self.on_uploaded is not None:
+            self.on_uploaded(result)
+        return result
+
+    def submit(self, file_name, content, folder_id):
+        """
+        Function to add a file to the uploads (waits if there are too many pending uploads).
+
+        Outputs: concurrent.futures.Future with the result of upload
+        """
+        self.slots.acquire()
+        future = self.executor.submit(self.upload, file_name, content, folder_id)
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+        return future
+
+    def close(self):
+        """
+        Function to wait for all the uploads and report them.
+
+        Outputs: list of dicts (one per file, in the order they were submitted) like the ones returned by upload
+        """
+        self.executor.shutdown(wait=True)
+        results = [future.result() for future in self.futures]
+
+        # Report
+        failures = [result for result in results if result["error"] is not None]
+        actions = {action: sum(result["action"] == action for result in results) for action in ["created", "updated", "skipped"]}
+        logger.info(f"Inside DriveUploader.close: uploaded {len(results) - len(failures)} files "
+                    f"({actions['created']} created, {actions['updated']} updated, {actions['skipped']} skipped). {len(failures)} failed.")
+        for failure in failures:
+            logger.error(f"Inside DriveUploader.close: couldn't upload {failure['name']}. Error: {failure['error']}.")
+
+        return results
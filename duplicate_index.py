@@ -0,0 +1,178 @@
+# Near-duplicate index of the posting texts (MinHash + LSH), kept between runs
+# The same job is sometimes posted several times (different topics, so different URL IDs). Each new posting is compared
+# with all the postings seen before: its MinHash signature (over word shingles) is split into bands, and the postings that share
+# a band are the candidates; a candidate is a near-duplicate if the estimated Jaccard similarity is above SIMILARITY_THRESHOLD.
+# Near-duplicates point to the canonical posting (the first one seen), so the script can skip their URLs.
+
+##################################### Importing libraries #####################################
+import hashlib
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+from array import array
+from metrics import metrics
+from settings import STATE_DIR
+
+##################################### Setting parameters #####################################
+
+# Path of the index database
+INDEX_PATH = os.path.join(STATE_DIR, 'duplicate_index.sqlite')
+
+# Number of hash functions of the MinHash signatures
+# (changing it, BANDS, SHINGLE_SIZE or SEED makes the stored signatures useless: delete the database)
+NUM_PERM = 128
+
+# Number of LSH bands (NUM_PERM / BANDS rows each)
+# With 32 bands of 4 rows, postings with a similarity of 0.8 are candidates with a probability above 0.99
+# (the candidates are then checked against SIMILARITY_THRESHOLD with the whole signature)
+BANDS = 32
+
+# Number of words per shingle
+SHINGLE_SIZE = 5
+
+# Minimum estimated Jaccard similarity for a near-duplicate
+SIMILARITY_THRESHOLD = 0.8
+
+# Seed of the hash functions (fixed, so that the signatures are comparable between runs)
+SEED = 20241017
+
+# Prime for the hash functions ((a * x + b) mod MERSENNE_PRIME, truncated to 32 bits)
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+# Words (for the shingles)
+WORD_PATTERN = re.compile(r"\w+")
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes and functions #####################################
+def get_shingles(text, size=SHINGLE_SIZE):
+    """
+    Function to get the shingles (sequences of size words, lowercase) of a text as 32-bit hashes.
+
+    Outputs: set of integers (one shingle with all the words if the text has fewer than size words; empty if it has none)
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) == 0:
+        return set()
+    shingles = [" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))]
+    return {int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), "little") for shingle in shingles}
+
+def get_permutations(num_perm=NUM_PERM, seed=SEED):
+    """
+    Function to get the parameters (a, b) of the hash functions of the signatures.
+    """
+    generator = random.Random(seed)
+    return [(generator.randint(1, MERSENNE_PRIME - 1), generator.randint(0, MERSENNE_PRIME - 1)) for _ in range(num_perm)]
+
+def get_signature(shingles, permutations):
+    """
+    Function to get the MinHash signature of a set of shingles (one minimum per hash function).
+    """
+    return [min(((a * x + b) % MERSENNE_PRIME) & MAX_HASH for x in shingles) for a, b in permutations]
+
+def estimate_similarity(signature, other_signature):
+    """
+    Function to estimate the Jaccard similarity of two sets from their signatures (share of equal minimums).
+    """
+    return sum(x == y for x, y in zip(signature, other_signature)) / len(signature)
+
+def get_band_keys(signature, bands=BANDS):
+    """
+    Function to get the LSH bucket of each band of a signature.
+
+    Outputs: list of (band number, bucket) with the bucket as a signed 64-bit integer (for SQLite)
+    """
+    rows = len(signature) // bands
+    keys = []
+    for band in range(bands):
+        digest = hashlib.blake2b(array("I", signature[band * rows:(band + 1) * rows]).tobytes(), digest_size=8).digest()
+        keys.append((band, int.from_bytes(digest, "little", signed=True)))
+    return keys
+
+class DuplicateIndex:
+    """
+    Class for the near-duplicate index of the posting texts. Thread-safe (one connection guarded by a lock).
+    len(index) is the number of postings in the index.
+
+    Usage: index = DuplicateIndex(); canonical_id = index.check(posting_id, text); ...; index.close()
+    """
+
+    def __init__(self, path=INDEX_PATH, threshold=SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.permutations = get_permutations()
+        self.lock = threading.Lock()
+
+        # Open (or create) the database
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS postings (
+                                   posting_id TEXT PRIMARY KEY,
+                                   canonical_id TEXT,
+                                   signature BLOB NOT NULL)""")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS bands (
+                                   band INTEGER NOT NULL,
+                                   bucket INTEGER NOT NULL,
+                                   posting_id TEXT NOT NULL)""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS bands_bucket ON bands (band, bucket)")
+        self.connection.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM postings").fetchone()[0]
+
+    def check(self, posting_id, text):
+        """
+        Function to check whether a posting is a near-duplicate of one seen before, and add it to the index.
+        A posting already in the index keeps the answer it got the first time.
+
+        Outputs: ID of the canonical posting, or None if it isn't a near-duplicate (or the text has no words)
+        """
+        posting_id = str(posting_id)
+        shingles = get_shingles(text)
+        if len(shingles) == 0:
+            return None
+
+        with metrics.span("duplicate_check"):
+            signature = get_signature(shingles, self.permutations)
+            band_keys = get_band_keys(signature)
+
+            with self.lock:
+                row = self.connection.execute("SELECT canonical_id FROM postings WHERE posting_id = ?", (posting_id,)).fetchone()
+                if row is not None:
+                    return row[0]
+
+                # Candidates: postings in the same bucket of any band; the most similar one above the threshold wins
+                candidates = set()
+                for band, bucket in band_keys:
+                    candidates.update(candidate for (candidate,) in self.connection.execute(
+                        "SELECT posting_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket)))
+                canonical_id, best_similarity = None, self.threshold
+                for candidate in candidates:
+                    candidate_row = self.connection.execute("SELECT canonical_id, signature FROM postings WHERE posting_id = ?",
+                                                            (candidate,)).fetchone()
+                    similarity = estimate_similarity(signature, array("I", candidate_row[1]))
+                    if similarity >= best_similarity:
+                        canonical_id, best_similarity = candidate_row[0] or candidate, similarity
+
+                # Add the posting
+                self.connection.execute("INSERT INTO postings VALUES (?, ?, ?)", (posting_id, canonical_id, array("I", signature).tobytes()))
+                self.connection.executemany("INSERT INTO bands VALUES (?, ?, ?)", [(band, bucket, posting_id) for band, bucket in band_keys])
+                self.connection.commit()
+
+        if canonical_id is not None:
+            metrics.count("duplicate_postings")
+            logger.info(f"Inside DuplicateIndex.check: posting {posting_id} is a near-duplicate of posting {canonical_id} "
+                        f"(similarity {best_similarity:.2f}).")
+        return canonical_id
+
+    def close(self):
+        """
+        Function to close the database.
+        """
+        with self.lock:
+            self.connection.close()
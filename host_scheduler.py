@@ -0,0 +1,200 @@
+# Politeness scheduler for the outbound fetches
+# The pending URLs are grouped by host and handed out round-robin across the hosts, so a posting with many links to the same
+# portal doesn't hold up the other hosts: each host has at most max_per_host URLs in progress, and the rest of the global
+# budget goes to the other hosts. Each host also has a token bucket with its crawl delay (CRAWL_DELAY, or the Crawl-delay /
+# Request-rate of its robots.txt if it has one), so throughput grows with the number of distinct hosts, not with the slowest one.
+
+##################################### Importing libraries #####################################
+import asyncio
+import logging
+import os
+from collections import deque
+from time import monotonic
+from urllib.parse import urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+import requests
+from metrics import metrics
+from retry_policy import get_host
+
+##################################### Setting parameters #####################################
+
+# Minimum time (in seconds) between two requests to the same host, unless its robots.txt asks for more
+CRAWL_DELAY = float(os.getenv('OUTBOUND_CRAWL_DELAY', '1'))
+
+# Maximum crawl delay (in seconds) taken from a robots.txt (a host that asks for more gets this one)
+MAX_CRAWL_DELAY = 30
+
+# Number of requests a host can get back to back after being idle (size of its token bucket)
+CRAWL_BURST = 1
+
+# Whether to read the robots.txt of each host (for Crawl-delay and Request-rate)
+READ_ROBOTS = os.getenv('OUTBOUND_READ_ROBOTS', 'true').lower() == 'true'
+
+# Timeout (in seconds) for the robots.txt requests
+ROBOTS_TIMEOUT = 10
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes and functions #####################################
+def get_robots_delay(url, user_agent):
+    """
+    Function to get the crawl delay that the robots.txt of the host of a URL asks for (runs in a worker thread).
+    Request-rate (n requests per m seconds) is turned into a delay of m / n seconds; the longest of the two wins.
+
+    Outputs: crawl delay in seconds, or None if there's no robots.txt or it doesn't ask for one
+    """
+    parts = urlsplit(url)
+    robots_url = urlunsplit((parts.scheme, parts.netloc, "/robots.txt", "", ""))
+    try:
+        response = requests.get(robots_url, headers={"User-Agent": user_agent}, timeout=ROBOTS_TIMEOUT)
+    except requests.RequestException as e:
+        logger.info(f"Inside get_robots_delay: couldn't get {robots_url}. Error: {e}.")
+        return None
+    metrics.count("robots_txt", host=get_host(url))
+    if response.status_code != 200:
+        return None
+
+    parser = RobotFileParser(robots_url)
+    parser.parse(response.text.splitlines())
+    delays = []
+    if parser.crawl_delay("*") is not None:
+        delays.append(float(parser.crawl_delay("*")))
+    request_rate = parser.request_rate("*")
+    if request_rate is not None and request_rate.requests > 0:
+        delays.append(request_rate.seconds / request_rate.requests)
+    return max(delays) if len(delays) > 0 else None
+
+class TokenBucket:
+    """
+    Class for the token bucket of a host: one token every delay seconds, at most burst tokens.
+    The callers wait in order (FIFO), so the requests to a host are spread evenly.
+    """
+
+    def __init__(self, delay, burst=CRAWL_BURST):
+        self.delay = delay
+        self.burst = burst
+        self.tokens = burst
+        self.updated = monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Function to wait for a token.
+
+        Outputs: time waited (in seconds)
+        """
+        if self.delay <= 0:
+            return 0
+        waited = 0
+        async with self.lock:
+            while True:
+                now = monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) / self.delay)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) * self.delay
+                await asyncio.sleep(wait)
+                waited += wait
+
+class HostScheduler:
+    """
+    Class to schedule the outbound URLs by host (created inside the event loop; not thread-safe, it's only used from the loop).
+
+    Usage:
+    - scheduler.add(url, item) queues an item; scheduler.pop() gives the next (host, item) round-robin across the hosts
+      that have fewer than max_per_host items in progress (None if there's none), and scheduler.release(host) when it's done
+    - await scheduler.acquire(url) before each request to the host of the URL (waits for its crawl delay)
+    """
+
+    def __init__(self, max_per_host, executor=None, user_agent="*", crawl_delay=CRAWL_DELAY, max_crawl_delay=MAX_CRAWL_DELAY,
+                 burst=CRAWL_BURST, read_robots=READ_ROBOTS):
+        self.max_per_host = max_per_host
+        self.executor = executor
+        self.user_agent = user_agent
+        self.crawl_delay = crawl_delay
+        self.max_crawl_delay = max_crawl_delay
+        self.burst = burst
+        self.read_robots = read_robots
+
+        # Queued items of each host, hosts in round-robin order, items in progress of each host
+        self.queues = {}
+        self.hosts = deque()
+        self.in_progress = {}
+        self.n_queued = 0
+
+        # Token bucket of each host (a future while its robots.txt is being read)
+        self.buckets = {}
+
+    def add(self, url, item):
+        host = get_host(url)
+        if host not in self.queues:
+            self.queues[host] = deque()
+            self.hosts.append(host)
+        self.queues[host].append(item)
+        self.n_queued += 1
+
+    def has_ready(self):
+        """
+        Function to check whether a host has queued items and room for one more in progress.
+        """
+        return any(self.in_progress.get(host, 0) < self.max_per_host for host in self.hosts)
+
+    def pop(self):
+        """
+        Function to get the next item: from the first host in round-robin order with room for one more in progress
+        (that host then goes to the end of the order).
+
+        Outputs: tuple (host, item), or None if no host is ready
+        """
+        for _ in range(len(self.hosts)):
+            host = self.hosts[0]
+            self.hosts.rotate(-1)
+            if self.in_progress.get(host, 0) >= self.max_per_host:
+                continue
+            item = self.queues[host].popleft()
+            if len(self.queues[host]) == 0:
+                del self.queues[host]
+                self.hosts.remove(host)
+            self.n_queued -= 1
+            self.in_progress[host] = self.in_progress.get(host, 0) + 1
+            return host, item
+        return None
+
+    def release(self, host):
+        self.in_progress[host] -= 1
+
+    async def get_bucket(self, url):
+        """
+        Function to get the token bucket of the host of a URL (reading its robots.txt the first time).
+        """
+        host = get_host(url)
+        bucket = self.buckets.get(host)
+        if isinstance(bucket, TokenBucket):
+            return bucket
+        if bucket is not None:
+            return await asyncio.shield(bucket)
+
+        future = asyncio.get_running_loop().create_future()
+        self.buckets[host] = future
+        delay = self.crawl_delay
+        try:
+            if self.read_robots:
+                robots_delay = await asyncio.get_running_loop().run_in_executor(self.executor, get_robots_delay, url, self.user_agent)
+                if robots_delay is not None:
+                    delay = max(delay, min(robots_delay, self.max_crawl_delay))
+                    logger.info(f"Inside HostScheduler.get_bucket: {host} asks for a crawl delay of {robots_delay} s (using {delay} s).")
+        finally:
+            self.buckets[host] = TokenBucket(delay, self.burst)
+            future.set_result(self.buckets[host])
+        return self.buckets[host]
+
+    async def acquire(self, url):
+        """
+        Function to wait until a request can be sent to the host of a URL (crawl delay).
+        """
+        bucket = await self.get_bucket(url)
+        waited = await bucket.acquire()
+        if waited > 0:
+            metrics.record("politeness_wait", waited)
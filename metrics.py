@@ -0,0 +1,169 @@
+# Timing and throughput metrics of a run
+# Each stage (login, listing, topic fetch, outbound fetch, text extraction, salary check, Sheets, Drive) records spans
+# (durations, errors), counters (retries, cache hits, rows, etc.) and bytes, overall and per host.
+# At the end of the run, write_report() writes them as JSON (uploaded as an artifact by the workflow, to compare runs).
+
+##################################### Importing libraries #####################################
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+##################################### Setting parameters #####################################
+
+# Path of the JSON report of the run
+REPORT_PATH = os.getenv('RUN_REPORT_PATH', 'run_report.json')
+
+# Percentiles of the durations in the report
+PERCENTILES = [50, 90, 99]
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes and functions #####################################
+def percentile(sorted_values, p):
+    """
+    Function to get the p-th percentile (nearest rank) of a sorted list (None if it's empty).
+    """
+    if len(sorted_values) == 0:
+        return None
+    rank = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(durations):
+    """
+    Function to summarize a list of durations (in seconds): count, total, mean, percentiles and maximum.
+    """
+    durations = sorted(durations)
+    summary = {"count": len(durations), "total_s": round(sum(durations), 3),
+               "mean_s": round(sum(durations) / len(durations), 4) if len(durations) > 0 else None}
+    for p in PERCENTILES:
+        value = percentile(durations, p)
+        summary[f"p{p}_s"] = round(value, 4) if value is not None else None
+    summary["max_s"] = round(durations[-1], 4) if len(durations) > 0 else None
+    return summary
+
+class Metrics:
+    """
+    Class to record the metrics of a run. Thread-safe.
+
+    Usage:
+    - with metrics.span("topic_fetch"): ...  (duration of the block; an exception counts as an error of the stage)
+    - metrics.record("outbound_http", duration, host="example.com")
+    - metrics.count("retries", host="example.com"); metrics.add_bytes("outbound_http", n, host="example.com")
+    - metrics.write_report(path)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.durations = {}
+        self.errors = {}
+        self.bytes = {}
+        self.counters = {}
+        self.hosts = {}
+        self.info = {}
+
+    def get_host(self, host):
+        # Called with the lock held
+        if host not in self.hosts:
+            self.hosts[host] = {"durations": [], "bytes": 0, "counters": {}}
+        return self.hosts[host]
+
+    def record(self, stage, duration, host=None, error=False):
+        """
+        Function to record the duration (in seconds) of one operation of a stage.
+        """
+        with self.lock:
+            self.durations.setdefault(stage, []).append(duration)
+            if error:
+                self.errors[stage] = self.errors.get(stage, 0) + 1
+            if host:
+                self.get_host(host)["durations"].append(duration)
+
+    @contextmanager
+    def span(self, stage, host=None):
+        """
+        Function to time a block of code as one operation of a stage (context manager).
+        """
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, host, error)
+
+    def count(self, name, n=1, host=None):
+        """
+        Function to add n to a counter (overall and, if given, for the host).
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            if host:
+                host_counters = self.get_host(host)["counters"]
+                host_counters[name] = host_counters.get(name, 0) + n
+
+    def add_bytes(self, stage, n, host=None):
+        """
+        Function to add n bytes to the bytes transferred by a stage (and, if given, by the host).
+        """
+        with self.lock:
+            self.bytes[stage] = self.bytes.get(stage, 0) + n
+            if host:
+                self.get_host(host)["bytes"] += n
+
+    def set_info(self, **info):
+        """
+        Function to add information about the run to the report (e.g., run ID, number of new postings).
+        """
+        with self.lock:
+            self.info.update(info)
+
+    def report(self):
+        """
+        Function to build the report.
+
+        Outputs: dict with the run, the stages (durations, errors, bytes, throughput), the counters and the hosts
+        """
+        with self.lock:
+            finished_at = time.time()
+            stages = {}
+            for stage in sorted(set(self.durations) | set(self.bytes)):
+                summary = summarize(self.durations.get(stage, []))
+                summary["errors"] = self.errors.get(stage, 0)
+                summary["bytes"] = self.bytes.get(stage, 0)
+                summary["ops_per_s"] = round(summary["count"] / summary["total_s"], 3) if summary["total_s"] > 0 else None
+                stages[stage] = summary
+            hosts = {}
+            for host, data in self.hosts.items():
+                hosts[host] = dict(summarize(data["durations"]), bytes=data["bytes"], **data["counters"])
+            return {
+                "run": dict(self.info,
+                            started_at=datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+                            finished_at=datetime.fromtimestamp(finished_at).isoformat(timespec="seconds"),
+                            duration_s=round(finished_at - self.started_at, 3)),
+                "stages": stages,
+                "counters": dict(self.counters),
+                "hosts": dict(sorted(hosts.items(), key=lambda item: -item[1]["total_s"])),
+            }
+
+    def write_report(self, path=REPORT_PATH):
+        """
+        Function to write the report as JSON.
+        """
+        report = self.report()
+        with open(path, "w") as file:
+            json.dump(report, file, indent=2)
+        logger.info(f"Inside Metrics.write_report: wrote the report of the run to {path}. "
+                    f"Duration: {report['run']['duration_s']} s.")
+        for stage, summary in report["stages"].items():
+            logger.info(f"Inside Metrics.write_report: {stage}: {summary['count']} ops, {summary['total_s']} s, "
+                        f"p50 {summary['p50_s']} s, p90 {summary['p90_s']} s, {summary['errors']} errors, {summary['bytes']} bytes.")
+
+# Metrics of the run (shared by all the modules)
+metrics = Metrics()
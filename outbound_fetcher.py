@@ -0,0 +1,558 @@
+# Fetcher for the URLs found in the postings (outbound URLs)
+# Tries a plain HTTP GET first and only uses Selenium when the page seems to need JavaScript
+# Most job pages (HR pages, university sites) don't need a browser at all
+# The response is routed by Content-Type as soon as its headers arrive (the body is streamed): PDF and DOCX documents
+# (position descriptions) are streamed to a temporary file with a size cap and converted to text (see text_extraction),
+# HTML and other text goes to the HTML path, and anything else fails without going through the browser
+# The URLs are scheduled by host (see host_scheduler): interleaved across hosts, with a crawl delay per host
+
+##################################### Importing libraries #####################################
+import asyncio
+import itertools
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from bs4 import BeautifulSoup
+from metrics import metrics
+from retry_policy import PERMANENT_STATUS_CODES, PermanentError, RetryPolicy, get_host
+from host_scheduler import HostScheduler
+from text_extraction import extract_document_text
+from url_cache import normalize_url
+
+##################################### Setting parameters #####################################
+
+# Maximum number of outbound requests at the same time (overall and per host)
+MAX_CONCURRENCY = 16
+MAX_CONCURRENCY_PER_HOST = 2
+
+# Maximum number of browsers at the same time (for the pages that need JavaScript)
+MAX_BROWSER_CONCURRENCY = 1
+
+# Maximum number of URLs in progress (being fetched or processed) when streaming (bounds the memory used by the pages)
+MAX_PENDING = 64
+
+# Maximum number of URLs of the same host in progress when streaming (the rest of MAX_PENDING is left to the other hosts)
+# Above MAX_CONCURRENCY_PER_HOST, so that URLs waiting for a retry don't leave the host idle
+MAX_PENDING_PER_HOST = 8
+
+# Maximum number of URLs waiting for their host when streaming (only the URLs are in memory, so it can be much bigger than MAX_PENDING)
+MAX_QUEUED = 10000
+
+# Timeout (in seconds) for each HTTP request
+REQUEST_TIMEOUT = 30
+
+# Headers for the HTTP requests (some sites reject requests that don't look like they come from a browser)
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,application/pdf,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# Status codes after which it's worth trying with a browser (bot protection, rate limits, server errors)
+BROWSER_STATUS_CODES = {401, 403, 429, 500, 502, 503, 504}
+
+# Status codes after which the server is retried later (if it sends Retry-After) instead of trying with a browser
+RETRY_AFTER_STATUS_CODES = {429, 503}
+
+# Kinds of documents that are converted to text, by Content-Type
+DOCUMENT_TYPES = {
+    "application/pdf": "pdf",
+    "application/x-pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+}
+
+# Kinds of documents by extension, for servers that send a generic Content-Type (see GENERIC_TYPES)
+DOCUMENT_EXTENSIONS = {".pdf": "pdf", ".docx": "docx"}
+GENERIC_TYPES = {"", "application/octet-stream", "binary/octet-stream", "application/download", "application/force-download"}
+
+# Maximum size (in bytes) of a document download (bigger documents fail without retries)
+MAX_DOWNLOAD_BYTES = int(os.getenv('MAX_DOWNLOAD_BYTES', str(20 * 1024 * 1024)))
+
+# Size (in bytes) of the chunks in which documents are downloaded
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# A page with less visible text than this (in characters) is probably rendered with JavaScript
+MIN_TEXT_LENGTH = 200
+
+# Strings that show up in the HTML of pages that are just a shell for a JavaScript app
+# Only taken into account if the page also has little visible text (MAX_SHELL_TEXT_LENGTH)
+SPA_MARKERS = ["enable javascript", "javascript is required", "javascript must be enabled", '<div id="root"></div>', '<div id="app"></div>', "<app-root"]
+MAX_SHELL_TEXT_LENGTH = 2000
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes and functions #####################################
+def get_visible_text(html):
+    """
+    Function to get the visible text of an HTML page (without scripts and styles).
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript", "template"]):
+        tag.decompose()
+    return soup.get_text(" ", strip=True)
+
+def looks_js_rendered(html):
+    """
+    Function to check whether an HTML page seems to need JavaScript to show its content
+    (empty body text or a known single-page app shell).
+
+    Inputs:
+    - html: source code of the page
+
+    Outputs: True or False
+    """
+    text = get_visible_text(html)
+    if len(text) < MIN_TEXT_LENGTH:
+        return True
+    html_lower = html.lower()
+    return len(text) < MAX_SHELL_TEXT_LENGTH and any(marker in html_lower for marker in SPA_MARKERS)
+
+def get_content_type(response):
+    """
+    Function to get the media type of a response (lowercase, without parameters such as the charset).
+    """
+    return response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+
+def get_document_kind(response):
+    """
+    Function to get the kind of document ("pdf" or "docx") of a response from its Content-Type
+    (or from the extension of the URL if the Content-Type is generic).
+
+    Outputs: kind of document, or None if it isn't a document
+    """
+    content_type = get_content_type(response)
+    if content_type in DOCUMENT_TYPES:
+        return DOCUMENT_TYPES[content_type]
+    if content_type in GENERIC_TYPES:
+        return DOCUMENT_EXTENSIONS.get(os.path.splitext(urlsplit(response.url).path.lower())[1])
+    return None
+
+def is_text(response):
+    """
+    Function to check whether a response is HTML or other text (the responses without a Content-Type are taken as HTML).
+    """
+    content_type = get_content_type(response) or "text/html"
+    return content_type.startswith("text/") or "html" in content_type or "xml" in content_type
+
+def decode_response(response):
+    """
+    Function to get the text of an HTTP response.
+    requests assumes ISO-8859-1 when the server doesn't send a charset, which garbles most modern pages,
+    so try UTF-8 first in that case.
+    """
+    if "charset" not in response.headers.get("Content-Type", "").lower():
+        try:
+            return response.content.decode("utf-8")
+        except UnicodeDecodeError:
+            response.encoding = response.apparent_encoding
+    return response.text
+
+def needs_browser(response):
+    """
+    Function to check whether an HTTP response isn't good enough and the URL should go through the browser.
+
+    Inputs:
+    - response: requests.Response
+
+    Outputs: True or False
+
+    Dependencies: looks_js_rendered, decode_response
+    """
+
+    # Blocked, rate limited or server error
+    if response.status_code in BROWSER_STATUS_CODES:
+        return True
+
+    # Page rendered with JavaScript
+    return looks_js_rendered(decode_response(response))
+
+class OutboundFetcher:
+    """
+    Class to fetch the outbound URLs with asyncio: plain HTTP GET first, with limits on the number of requests
+    at the same time (overall and per host), and the browser only when needed: browser_fetch(url), or by default a
+    browser_profile.LeanBrowser that the fetcher starts the first time a page needs it and closes when it's done.
+
+    Usage: OutboundFetcher(retry_policy=policy).fetch_stream(items, on_result) fetches the URLs as they come and gives
+    on_result the source code of each one (or the exception raised in the last attempt) as soon as it arrives.
+    Each distinct URL (after normalizing it) is fetched once, even if it's in several postings, and a URL that failed
+    isn't fetched again for the rest of the run (negative cache).
+    With a cache (url_cache.URLCache), fresh pages aren't requested again and stale ones are revalidated
+    with a conditional request.
+    Dead URLs (e.g., 404, DNS failure) aren't retried and don't go through the browser, and hosts that keep failing
+    are skipped for a while (see retry_policy.RetryPolicy).
+    The requests to each host are spaced by its crawl delay, and when streaming, the URLs are interleaved across hosts
+    (see host_scheduler.HostScheduler).
+    PDF and DOCX documents are downloaded (up to max_download_bytes) and converted to text without the browser; their result
+    is a dict (see get_document) instead of the source code. They aren't cached.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, max_concurrency_per_host=MAX_CONCURRENCY_PER_HOST,
+                 max_browser_concurrency=MAX_BROWSER_CONCURRENCY, retry_policy=None, browser_fetch=None,
+                 cache=None, max_download_bytes=MAX_DOWNLOAD_BYTES):
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.max_browser_concurrency = max_browser_concurrency
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.browser_fetch = browser_fetch
+        self.cache = cache
+
+        # Browser with the lean profile, if browser_fetch isn't given (created in get_browser_fetch)
+        self.browser = None
+        self.browser_lock = threading.Lock()
+        self.max_download_bytes = max_download_bytes
+
+        # Threads for the blocking calls (requests and Selenium), one requests session per thread
+        # (the executor is created in fetch_stream)
+        self.executor = None
+        self.thread_data = threading.local()
+
+        # Semaphores and scheduler (created in fetch_stream, inside the event loop)
+        self.semaphore = None
+        self.browser_semaphore = None
+        self.host_semaphores = {}
+        self.scheduler = None
+
+        # URLs that failed in this run (normalized URL -> exception raised in the last attempt; reset in start_loop)
+        self.failed_urls = {}
+
+    def start_loop(self):
+        """
+        Function to create the semaphores and the scheduler (inside the event loop) and empty the negative cache.
+        """
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.browser_semaphore = asyncio.Semaphore(self.max_browser_concurrency)
+        self.host_semaphores = {}
+        self.failed_urls = {}
+        self.scheduler = HostScheduler(MAX_PENDING_PER_HOST, executor=self.executor, user_agent=HEADERS["User-Agent"])
+
+    def http_get(self, url, cached=None):
+        """
+        Function to send the GET request and check the response (runs in a worker thread, parsing is CPU-bound).
+        With the cached page (see fetch_once), stale pages are requested with If-None-Match / If-Modified-Since.
+        Raises requests.HTTPError if the URL is dead (e.g., 404) or the server asks to come back later (Retry-After),
+        and retry_policy.PermanentError if the response is neither text nor a document (e.g., an image or a ZIP file).
+
+        Outputs: tuple (status code or "cache", source code (a dict for documents, see get_document) or None if the URL needs the browser)
+        """
+        if not hasattr(self.thread_data, "session"):
+            self.thread_data.session = requests.Session()
+            self.thread_data.session.headers.update(HEADERS)
+
+        # Conditional request if the cached page has validators
+        headers = {}
+        if cached is not None and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached is not None and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        # The body is streamed, so that documents don't have to be in memory (see get_document)
+        with metrics.span("outbound_http"):
+            response = self.thread_data.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True)
+        document_kind = get_document_kind(response) if response.status_code == 200 else None
+        metrics.count(f"http_{response.status_code}")
+
+        # Documents: downloaded and converted to text, no browser
+        if document_kind is not None:
+            with response:
+                return response.status_code, self.get_document(url, response, document_kind, get_content_type(response))
+
+        # Not modified: use the cached page
+        if response.status_code == 304 and cached is not None:
+            metrics.count("cache_revalidated")
+            self.cache.touch(url)
+            return response.status_code, cached["body"]
+
+        # Dead URL, or the server asks to come back later: let the retry policy handle it (the body isn't downloaded)
+        if response.status_code in PERMANENT_STATUS_CODES or \
+                (response.status_code in RETRY_AFTER_STATUS_CODES and "Retry-After" in response.headers):
+            response.close()
+            response.raise_for_status()
+
+        # Only text goes to the HTML path (the body isn't downloaded otherwise)
+        if response.status_code not in BROWSER_STATUS_CODES and not is_text(response):
+            response.close()
+            metrics.count("unsupported_content_type", host=get_host(url))
+            raise PermanentError(f"Unsupported Content-Type {get_content_type(response)} for {url}.")
+
+        # A PDF served as text/html (it starts like one) is downloaded like the other documents, with the size cap
+        chunks = response.iter_content(DOWNLOAD_CHUNK_SIZE)
+        first_chunk = next(chunks, b"")
+        if first_chunk.startswith(b"%PDF-"):
+            with response:
+                return response.status_code, self.get_document(url, itertools.chain([first_chunk], chunks), "pdf", get_content_type(response))
+
+        # Rest of the body (kept in the response, so that response.content and response.text work as usual)
+        response._content = first_chunk + b"".join(chunks)
+        metrics.add_bytes("outbound_http", len(response.content), host=get_host(url))
+
+        if needs_browser(response):
+            return response.status_code, None
+        source_code = decode_response(response)
+
+        # Store the page in the cache
+        if self.cache is not None and response.status_code == 200:
+            self.cache.put(url, source_code, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+        return response.status_code, source_code
+
+    def get_document(self, url, source, kind, content_type):
+        """
+        Function to download a document (streamed to a temporary file, up to max_download_bytes) and extract its text.
+        Raises retry_policy.PermanentError if the document is too big or its text can't be extracted.
+
+        Inputs:
+        - url: URL of the document
+        - source: requests.Response (streamed), iterator of chunks (bytes) of the document or binary file object with the document
+        - kind: kind of document ("pdf" or "docx")
+        - content_type: Content-Type of the response
+
+        Outputs: dict with the kind of document, its Content-Type, its size (bytes), its text and the extraction info (see text_extraction)
+
+        Dependencies: from text_extraction import extract_document_text
+        """
+        host = get_host(url)
+        if isinstance(source, requests.Response) and int(source.headers.get("Content-Length") or 0) > self.max_download_bytes:
+            metrics.count("document_too_large", host=host)
+            raise PermanentError(f"Document {url} is bigger than {self.max_download_bytes} bytes.")
+        if isinstance(source, requests.Response):
+            source = source.iter_content(DOWNLOAD_CHUNK_SIZE)
+
+        with tempfile.TemporaryFile() as file:
+            # Download
+            if not hasattr(source, "read"):
+                with metrics.span("outbound_document", host=host):
+                    for chunk in source:
+                        file.write(chunk)
+                        if file.tell() > self.max_download_bytes:
+                            metrics.count("document_too_large", host=host)
+                            raise PermanentError(f"Document {url} is bigger than {self.max_download_bytes} bytes.")
+                metrics.add_bytes("outbound_http", file.tell(), host=host)
+                source = file
+            source.seek(0, os.SEEK_END)
+            n_bytes = source.tell()
+
+            # Text
+            try:
+                with metrics.span("extract_text"):
+                    text, extraction = extract_document_text(source, kind)
+            except Exception as e:
+                raise PermanentError(f"Couldn't extract the text of the {kind.upper()} document {url}. Error: {e}.") from e
+
+        metrics.count(f"documents_{kind}", host=host)
+        logger.info(f"Inside OutboundFetcher.get_document: {url} is a {kind.upper()} document ({n_bytes} bytes, {len(text)} characters of text).")
+        return {"kind": kind, "content_type": content_type, "bytes": n_bytes, "text": text, "extraction": extraction}
+
+    def get_browser_fetch(self):
+        """
+        Function to get the function that fetches a page with the browser: browser_fetch if it was given,
+        otherwise the fetch of a LeanBrowser (created the first time; Selenium is only imported then).
+        """
+        if self.browser_fetch is not None:
+            return self.browser_fetch
+        with self.browser_lock:
+            if self.browser is None:
+                from browser_profile import LeanBrowser
+                self.browser = LeanBrowser()
+            return self.browser.fetch
+
+    def close_browser(self):
+        """
+        Function to close the LeanBrowser that the fetcher created (if any).
+        """
+        with self.browser_lock:
+            browser, self.browser = self.browser, None
+        if browser is not None:
+            browser.close()
+
+    def browser_get(self, url):
+        """
+        Function to get a URL with the browser (runs in a worker thread) and store it in the cache.
+        Pages from the browser have no validators, so they're requested again once they're stale.
+        """
+        with metrics.span("outbound_browser"):
+            source_code = self.get_browser_fetch()(url)
+        if isinstance(source_code, str):
+            metrics.add_bytes("outbound_browser", len(source_code.encode('utf-8')), host=get_host(url))
+        if self.cache is not None and isinstance(source_code, str):
+            self.cache.put(url, source_code)
+        return source_code
+
+    def get_host_semaphore(self, url):
+        """
+        Function to get the semaphore that limits the number of requests to the host of the URL.
+        """
+        host = get_host(url)
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(self.max_concurrency_per_host)
+        return self.host_semaphores[host]
+
+    async def fetch_once(self, url):
+        """
+        Function to fetch a URL once: cache first (fresh pages aren't requested), then HTTP, then the browser
+        if the response isn't good enough. Each request waits for the crawl delay of the host.
+        """
+        loop = asyncio.get_running_loop()
+
+        # Check the cache
+        cached = await loop.run_in_executor(self.executor, self.cache.get, url) if self.cache is not None else None
+        if cached is not None and cached["fresh"]:
+            metrics.count("cache_hits")
+            logger.info(f"Inside OutboundFetcher.fetch_once: {url} from the cache.")
+            return cached["body"]
+
+        # Plain HTTP request
+        await self.scheduler.acquire(url)
+        async with self.semaphore, self.get_host_semaphore(url):
+            status_code, source_code = await loop.run_in_executor(self.executor, self.http_get, url, cached)
+        logger.info(f"Inside OutboundFetcher.fetch_once: HTTP {status_code} for {url}.")
+
+        if source_code is not None:
+            return source_code
+
+        # Browser
+        logger.info(f"Inside OutboundFetcher.fetch_once: {url} needs the browser.")
+        await self.scheduler.acquire(url)
+        async with self.browser_semaphore:
+            return await loop.run_in_executor(self.executor, self.browser_get, url)
+
+    async def fetch(self, url):
+        """
+        Function to fetch a URL with retries. Raises the last exception if the error is permanent or all the retries fail.
+        A URL that failed (after all its retries) isn't fetched again for the rest of the run: the same exception is raised.
+        """
+        normalized_url = normalize_url(url)
+        if normalized_url in self.failed_urls:
+            metrics.count("negative_cache_hits")
+            logger.info(f"Inside OutboundFetcher.fetch: {url} already failed in this run. Not fetching it again.")
+            raise self.failed_urls[normalized_url]
+
+        host = get_host(url)
+        try:
+            with metrics.span("outbound_fetch", host=host):
+                return await self.retry_policy.call_async(self.fetch_once, url, description=url, host=host)
+        except Exception as e:
+            self.failed_urls[normalized_url] = e
+            raise
+
+    async def fetch_stream_async(self, items, on_result, max_pending):
+        """
+        Function to fetch the URLs as they come from items, with at most max_pending in progress.
+        The items are read into the queues of the scheduler (up to MAX_QUEUED) and started round-robin across the hosts
+        (at most MAX_PENDING_PER_HOST in progress per host), so the other hosts don't wait for a busy one.
+        """
+        self.start_loop()
+        loop = asyncio.get_running_loop()
+
+        # Slots for the items in progress (fetching or processing)
+        slots = asyncio.Semaphore(max_pending)
+
+        # URLs being fetched (normalized URL -> task), so that the same URL isn't fetched twice at the same time
+        in_flight = {}
+        handlers = set()
+
+        # Changes in the queues (items added, items done, end of the items)
+        changed = asyncio.Condition()
+        items_done = False
+
+        async def read_items():
+            nonlocal items_done
+            # The iterator can block (e.g., waiting for the previous stage), so it runs in a worker thread
+            iterator = iter(items)
+            end = object()
+            try:
+                while True:
+                    async with changed:
+                        await changed.wait_for(lambda: self.scheduler.n_queued < MAX_QUEUED)
+                    item = await loop.run_in_executor(self.executor, next, iterator, end)
+                    if item is end:
+                        break
+                    async with changed:
+                        self.scheduler.add(item[1], item)
+                        changed.notify_all()
+            finally:
+                async with changed:
+                    items_done = True
+                    changed.notify_all()
+
+        async def fetch_and_release(url, host):
+            try:
+                return await self.fetch(url)
+            finally:
+                async with changed:
+                    self.scheduler.release(host)
+                    changed.notify_all()
+
+        async def handle(key, task):
+            try:
+                result = await task
+            except Exception as e:
+                result = e
+            try:
+                # on_result can block (e.g., parsing, waiting for a slot to upload), so it runs in a worker thread
+                await loop.run_in_executor(self.executor, on_result, key, result)
+            except Exception as e:
+                logger.error(f"Inside OutboundFetcher.fetch_stream_async: error processing a result. Error: {e}.")
+            finally:
+                slots.release()
+
+        reader = asyncio.ensure_future(read_items())
+        while True:
+            await slots.acquire()
+
+            # Next item, from the next host that has room (or the end, once all the items were read and started)
+            async with changed:
+                await changed.wait_for(lambda: self.scheduler.has_ready() or (items_done and self.scheduler.n_queued == 0))
+                popped = self.scheduler.pop()
+                if popped is None:
+                    slots.release()
+                    break
+                host, (key, url) = popped
+
+                # Fetch the URL (or wait for the fetch already in progress)
+                normalized_url = normalize_url(url)
+                task = in_flight.get(normalized_url)
+                if task is None:
+                    task = asyncio.ensure_future(fetch_and_release(url, host))
+                    in_flight[normalized_url] = task
+                    task.add_done_callback(lambda _, normalized_url=normalized_url: in_flight.pop(normalized_url, None))
+                else:
+                    self.scheduler.release(host)
+
+            handler = asyncio.ensure_future(handle(key, task))
+            handlers.add(handler)
+            handler.add_done_callback(handlers.discard)
+
+        # Wait for the items in progress
+        await reader
+        await asyncio.gather(*list(handlers))
+
+    def fetch_stream(self, items, on_result, max_pending=MAX_PENDING):
+        """
+        Function to fetch URLs as they come and process each page as soon as it arrives (producer/consumer).
+        Only max_pending items are in progress at the same time, so the memory doesn't grow with the number of URLs.
+        With a cache, a URL that shows up again after its page was processed comes from the cache.
+
+        Inputs:
+        - items: iterable of tuples (key, URL); it can be a generator that waits for the previous stage
+        - on_result: function called with the key and the source code (or the exception if all the retries failed);
+          it runs in a worker thread
+        - max_pending: maximum number of items in progress
+
+        Outputs: None
+        """
+        logger.info("Inside OutboundFetcher.fetch_stream: starting.")
+
+        # Threads for the requests, the browsers, the items iterator and the on_result calls
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency + self.max_browser_concurrency + max_pending + 1)
+        try:
+            asyncio.run(self.fetch_stream_async(items, on_result, max_pending))
+        finally:
+            self.executor.shutdown(wait=True)
+            self.close_browser()
+            if self.cache is not None:
+                self.cache.evict()
+        logger.info("Inside OutboundFetcher.fetch_stream: done.")
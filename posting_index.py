@@ -0,0 +1,119 @@
+# Local index of the IDs already in the Google Sheets (column A)
+# Instead of downloading the whole column A every run, the index is kept in SQLite between runs
+# and only the rows added since the last run are downloaded
+
+##################################### Importing libraries #####################################
+import logging
+import os
+import sqlite3
+import threading
+from metrics import metrics
+from settings import STATE_DIR
+
+##################################### Setting parameters #####################################
+
+# Path of the index database
+INDEX_PATH = os.path.join(STATE_DIR, 'posting_index.sqlite')
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes #####################################
+class SheetIDIndex:
+    """
+    Class for the local copy of column A of a Google Sheet (one row per row of the sheet).
+    Supports `value in index` (checked in SQLite, so the IDs don't have to be in memory) and len(index) (number of rows).
+
+    sync() checks that the last row known locally still has the same value in the sheet (cheap probe)
+    and then downloads only the rows after it. If the probe doesn't match (e.g., rows were deleted or edited),
+    it downloads the whole column again.
+    """
+
+    def __init__(self, name, path=INDEX_PATH):
+        self.name = name
+        self.lock = threading.Lock()
+
+        # Open (or create) the database
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS sheet_rows (
+                                   sheet TEXT NOT NULL,
+                                   row INTEGER NOT NULL,
+                                   value TEXT NOT NULL,
+                                   PRIMARY KEY (sheet, row))""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS sheet_rows_value ON sheet_rows (sheet, value)")
+        self.connection.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COALESCE(MAX(row), 0) FROM sheet_rows WHERE sheet = ?", (self.name,)).fetchone()[0]
+
+    def __contains__(self, value):
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM sheet_rows WHERE sheet = ? AND value = ? LIMIT 1",
+                                           (self.name, str(value))).fetchone() is not None
+
+    def last_value(self):
+        """
+        Function to get the value of the last row known locally (None if the index is empty).
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM sheet_rows WHERE sheet = ? ORDER BY row DESC LIMIT 1", (self.name,)).fetchone()
+        return None if row is None else row[0]
+
+    def store(self, first_row, values, replace=False):
+        """
+        Function to store rows downloaded from the sheet.
+
+        Inputs:
+        - first_row: number of the row of the first value (1-based, like in the sheet)
+        - values: values returned by the Sheets API (e.g., [['123'], [], ['456']])
+        - replace: if True, the rows that were in the index are deleted first
+        """
+        with self.lock:
+            if replace:
+                self.connection.execute("DELETE FROM sheet_rows WHERE sheet = ?", (self.name,))
+            self.connection.executemany("INSERT OR REPLACE INTO sheet_rows VALUES (?, ?, ?)",
+                                        [(self.name, first_row + i, row[0] if len(row) > 0 else "") for i, row in enumerate(values)])
+            self.connection.commit()
+
+    def sync(self, service, spreadsheet_id):
+        """
+        Function to bring the index up to date with column A of the sheet.
+
+        Inputs:
+        - service: service for Google Sheets
+        - spreadsheet_id: ID of the Google Sheet
+
+        Outputs: number of rows downloaded
+        """
+        n_rows = len(self)
+        last_value = self.last_value()
+
+        # Incremental sync: download from the last row known locally
+        if n_rows > 0:
+            with metrics.span("sheets_read"):
+                result = service.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=f'A{n_rows}:A').execute()
+            values = result.get("values", [])
+
+            # Check that the last row known locally didn't change
+            if len(values) > 0 and len(values[0]) > 0 and values[0][0] == last_value:
+                self.store(n_rows + 1, values[1:])
+                logger.info(f"Inside SheetIDIndex.sync: {self.name} in sync. {len(values) - 1} new rows, {len(self)} rows in total.")
+                return len(values) - 1
+
+            logger.info(f"Inside SheetIDIndex.sync: row {n_rows} of {self.name} changed in the sheet. Downloading the whole column.")
+
+        # Full sync
+        with metrics.span("sheets_read"):
+            result = service.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range='A:A').execute()
+        values = result.get("values", [])
+        self.store(1, values, replace=True)
+        logger.info(f"Inside SheetIDIndex.sync: downloaded the whole column for {self.name}. {len(values)} rows.")
+        return len(values)
+
+    def close(self):
+        """
+        Function to close the database.
+        """
+        with self.lock:
+            self.connection.close()
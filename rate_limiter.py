@@ -0,0 +1,28 @@
+# Rate limiter shared by the HTTP client (discourse_api) and the Selenium path (waits.NavigationPolicy)
+# Spaces out requests or page loads so that at most one starts every min_interval seconds, across all the threads.
+
+##################################### Importing libraries #####################################
+import threading
+from time import monotonic, sleep
+
+##################################### Define classes #####################################
+class RateLimiter:
+    """
+    Class to space out requests: at most one request every min_interval seconds, shared by all the threads.
+    """
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.next_time = 0
+
+    def wait(self):
+        """
+        Function to wait until the next request is allowed (and book the slot).
+        """
+        with self.lock:
+            now = monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.min_interval
+        if wait_time > 0:
+            sleep(wait_time)
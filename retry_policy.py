@@ -0,0 +1,361 @@
+# Retry policy shared by the driver, the Discourse API, the outbound fetches, Google Sheets and Google Drive
+# Errors are classified first: permanent errors (e.g., 404, DNS failure, invalid URL) aren't retried,
+# transient ones (e.g., timeouts, 429, 5xx) are retried with exponential backoff and jitter, honoring Retry-After.
+# Each host has a circuit breaker: after repeated failures, calls to the host fail fast for a while.
+
+##################################### Importing libraries #####################################
+import asyncio
+import logging
+import socket
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from random import uniform
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+import requests
+from metrics import metrics
+
+##################################### Setting parameters #####################################
+
+# Number of attempts per call
+RETRIES = 5
+
+# Backoff: the n-th retry waits a random time between half and all of min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** n) seconds
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 60
+
+# Maximum time (in seconds) to wait for a Retry-After; if the server asks for more, the call gives up
+MAX_RETRY_AFTER = 300
+
+# Circuit breakers: after this many failures in a row, calls to the host fail fast for CIRCUIT_RESET_TIMEOUT seconds
+# (then one call goes through as a trial: if it succeeds the circuit closes, if it fails it stays open)
+# The threshold is above the number of attempts of a single call, so one bad URL alone can't open the circuit of its host
+CIRCUIT_FAILURE_THRESHOLD = 8
+CIRCUIT_RESET_TIMEOUT = 300
+
+# HTTP status codes that won't change by retrying (the URL is dead, gone or invalid)
+PERMANENT_STATUS_CODES = {400, 404, 405, 406, 410, 411, 413, 414, 415, 422, 451, 501}
+
+# HTTP status codes worth retrying (timeouts, rate limits, server errors)
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# Parts of error messages that mean the error is permanent
+# (DNS failures and invalid certificates from requests and Chrome, invalid URLs from Selenium)
+PERMANENT_ERROR_MARKERS = ["nameresolutionerror", "name or service not known", "nodename nor servname", "getaddrinfo failed",
+                           "no address associated with hostname", "err_name_not_resolved", "err_name_resolution_failed",
+                           "err_cert_", "certificate verify failed", "invalid argument"]
+
+# Parts of error messages that mean the host is down or unreachable (connection errors and timeouts from Chrome and Selenium)
+HOST_FAILURE_ERROR_MARKERS = ["err_connection_refused", "err_connection_reset", "err_connection_closed", "err_connection_timed_out",
+                              "err_connection_failed", "err_timed_out", "err_address_unreachable", "err_empty_response", "timed out"]
+
+# Parts of error messages that mean a Google API 403 is a rate limit (transient), not a permission error
+RATE_LIMIT_MARKERS = ["ratelimitexceeded", "rate limit", "quota"]
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes and functions #####################################
+class PermanentError(Exception):
+    """
+    Error that won't go away by retrying (e.g., raised by a check on the result of a call).
+    """
+
+class CircuitOpenError(PermanentError):
+    """
+    Error raised instead of calling a host whose circuit breaker is open.
+    """
+
+def get_host(url):
+    """
+    Function to get the host of a URL (lower case, "" if there's none).
+    """
+    return (urlsplit(url).hostname or "").lower()
+
+def get_status_code(error):
+    """
+    Function to get the HTTP status code of an error (requests.HTTPError or googleapiclient.errors.HttpError).
+
+    Outputs: status code, or None if the error has no HTTP response
+    """
+    response = getattr(error, "response", None)
+    if response is not None and getattr(response, "status_code", None) is not None:
+        return response.status_code
+    resp = getattr(error, "resp", None)
+    if resp is not None and getattr(resp, "status", None) is not None:
+        return int(resp.status)
+    return None
+
+def get_retry_after(error):
+    """
+    Function to get the time (in seconds) that the server asked to wait in the Retry-After header of an error.
+    Retry-After can be a number of seconds or an HTTP date.
+
+    Outputs: seconds, or None if there's no (valid) Retry-After
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) if response is not None else getattr(error, "resp", None)
+    value = headers.get("Retry-After", headers.get("retry-after")) if headers is not None else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def is_permanent(error):
+    """
+    Function to classify an error: True if retrying won't help, False if it's worth retrying.
+    Errors that aren't recognized are treated as transient (retried).
+    """
+    if isinstance(error, PermanentError):
+        return True
+
+    # HTTP errors
+    status_code = get_status_code(error)
+    if status_code is not None:
+        if status_code == 403:
+            # Google APIs use 403 for rate limits too
+            return not any(marker in str(error).lower() for marker in RATE_LIMIT_MARKERS)
+        return status_code in PERMANENT_STATUS_CODES or (status_code < 500 and status_code not in TRANSIENT_STATUS_CODES)
+
+    # Invalid URLs and redirect loops
+    if isinstance(error, (requests.exceptions.InvalidURL, requests.exceptions.MissingSchema, requests.exceptions.InvalidSchema,
+                          requests.exceptions.TooManyRedirects)):
+        return True
+
+    # DNS failures (anywhere in the chain of errors), invalid certificates, invalid URLs given to the browser
+    cause = error
+    while cause is not None:
+        if isinstance(cause, socket.gaierror):
+            return True
+        cause = cause.__cause__ or cause.__context__
+    message = str(error).lower()
+    return any(marker in message for marker in PERMANENT_ERROR_MARKERS)
+
+def is_host_failure(error):
+    """
+    Function to check whether an error says something about the host (down, unreachable, overloaded)
+    and not only about one of its URLs (e.g., a 404), so that it counts for the circuit breaker of the host.
+    Only connection errors, timeouts and HTTP errors worth retrying (5xx, 429, ...) count; anything else
+    (e.g., a PermanentError raised by a check on the result, or a bug) doesn't.
+    """
+    # HTTP errors
+    status_code = get_status_code(error)
+    if status_code is not None:
+        return status_code in TRANSIENT_STATUS_CODES
+
+    # Connection errors and timeouts (requests, sockets, asyncio)
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+
+    # Connection errors and timeouts of the browser
+    if isinstance(error, PermanentError):
+        return False
+    message = str(error).lower()
+    return any(marker in message for marker in HOST_FAILURE_ERROR_MARKERS)
+
+class CircuitBreaker:
+    """
+    Class for the circuit breaker of a host. Thread-safe.
+    Opens after failure_threshold failures in a row. While it's open, allow() is False, except for one trial call
+    every reset_timeout seconds. A success closes it.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self):
+        """
+        Function to check whether a call can go through (and book the trial call if the circuit is open).
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if monotonic() - self.opened_at >= self.reset_timeout:
+                self.opened_at = monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """
+        Function to record a failure.
+
+        Outputs: True if the circuit is (now) open
+        """
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = monotonic()
+            return self.opened_at is not None
+
+class Attempt:
+    """
+    Class for one attempt of RetryPolicy.attempts (context manager).
+    Exiting with a transient error that can be retried sleeps and swallows the error, so the loop goes on with the next attempt;
+    otherwise the error is raised.
+    """
+
+    def __init__(self, policy, number, description, host):
+        self.policy = policy
+        self.number = number
+        self.description = description
+        self.host = host
+        self.succeeded = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, error, traceback):
+        if error is None:
+            self.policy.record_success(self.host)
+            self.succeeded = True
+            return False
+        if not isinstance(error, Exception):
+            return False
+        delay = self.policy.handle_failure(self.number, error, self.description, self.host)
+        if delay is None:
+            return False
+        sleep(delay)
+        return True
+
+class RetryPolicy:
+    """
+    Class for the retry policy: error classification, exponential backoff with jitter, Retry-After
+    and per-host circuit breakers (shared by all the calls that use the same policy).
+
+    Usage:
+    - result = policy.call(function, *args, description="...", host="example.com", **kwargs)
+    - result = await policy.call_async(coroutine_function, *args, description="...", host="example.com", **kwargs)
+    - for attempt in policy.attempts("...", host="example.com"):
+          with attempt:
+              ...
+    All of them raise the last error if it's permanent or there are no retries left.
+    """
+
+    def __init__(self, retries=RETRIES, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY, max_retry_after=MAX_RETRY_AFTER,
+                 failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.retries = max(1, retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.breakers = {}
+
+    def get_breaker(self, host):
+        """
+        Function to get the circuit breaker of a host (created the first time).
+        """
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self.breakers[host]
+
+    def check_circuit(self, host, description):
+        """
+        Function to raise CircuitOpenError if the circuit breaker of the host is open (no host: nothing to check).
+        """
+        if host and not self.get_breaker(host).allow():
+            metrics.count("circuit_open_skips", host=host)
+            raise CircuitOpenError(f"Circuit open for {host}. Skipping {description}.")
+
+    def record_success(self, host):
+        if host:
+            self.get_breaker(host).record_success()
+
+    def get_delay(self, number, error):
+        """
+        Function to get the time to wait before the next attempt after attempt number (0-based) failed with error.
+
+        Outputs: seconds, or None if the server asked to wait more than max_retry_after
+        """
+        ceiling = min(self.max_delay, self.base_delay * 2 ** number)
+        delay = uniform(ceiling / 2, ceiling)
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            delay = max(delay, retry_after)
+        return delay
+
+    def handle_failure(self, number, error, description, host):
+        """
+        Function to record a failed attempt and decide what to do next.
+
+        Outputs: time to wait before the next attempt, or None if the error has to be raised
+        """
+        if host and is_host_failure(error) and self.get_breaker(host).record_failure():
+            logger.info(f"Inside RetryPolicy: circuit open for {host}.")
+
+        if is_permanent(error):
+            metrics.count("permanent_errors", host=host)
+            logger.info(f"Inside RetryPolicy: attempt {number + 1} for {description} failed with a permanent error. Not retrying. Error: {error}.")
+            return None
+        if number >= self.retries - 1:
+            logger.info(f"Inside RetryPolicy: attempt {number + 1} for {description} failed. No more retries left. Error: {error}.")
+            return None
+        delay = self.get_delay(number, error)
+        if delay is None:
+            logger.info(f"Inside RetryPolicy: attempt {number + 1} for {description} failed and the server asked to wait "
+                        f"more than {self.max_retry_after} s. Not retrying. Error: {error}.")
+            return None
+        metrics.count("retries", host=host)
+        logger.info(f"Inside RetryPolicy: attempt {number + 1} for {description} failed. Retrying in {delay:.1f} s. Error: {error}.")
+        return delay
+
+    def attempts(self, description, host=None):
+        """
+        Function to iterate over the attempts of a block of code (see Attempt). Stops after the first attempt that succeeds.
+        """
+        for number in range(self.retries):
+            self.check_circuit(host, description)
+            attempt = Attempt(self, number, description, host)
+            yield attempt
+            if attempt.succeeded:
+                return
+
+    def call(self, function, *args, description=None, host=None, **kwargs):
+        """
+        Function to call function(*args, **kwargs) with retries.
+
+        Outputs: what function returns
+        """
+        description = description or getattr(function, "__name__", "call")
+        for attempt in self.attempts(description, host):
+            with attempt:
+                return function(*args, **kwargs)
+
+    async def call_async(self, function, *args, description=None, host=None, **kwargs):
+        """
+        Function to await function(*args, **kwargs) with retries (waits with asyncio.sleep, so the event loop isn't blocked).
+
+        Outputs: what function returns
+        """
+        description = description or getattr(function, "__name__", "call")
+        for number in range(self.retries):
+            self.check_circuit(host, description)
+            try:
+                result = await function(*args, **kwargs)
+            except Exception as e:
+                delay = self.handle_failure(number, e, description, host)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+            else:
+                self.record_success(host)
+                return result
@@ -0,0 +1,172 @@
+# Crash-safe journal of the work done in a run
+# Every completed unit of work (new postings found, posting scraped, URL scraped, rows written to Google Sheets,
+# file uploaded to Google Drive) is recorded in SQLite (WAL mode) as soon as it's done.
+# If a run crashes, the next one resumes it and skips what was already done.
+# Files that couldn't be uploaded to Google Drive are kept apart from the runs (with their content), so a run can finish
+# without them and the next publish retries them.
+
+##################################### Importing libraries #####################################
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from settings import STATE_DIR
+
+##################################### Setting parameters #####################################
+
+# Path of the journal database
+JOURNAL_PATH = os.path.join(STATE_DIR, 'run_journal.sqlite')
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes #####################################
+class RunJournal:
+    """
+    Class for the journal of a run. Thread-safe (one connection guarded by a lock).
+
+    When created, it resumes the last run that didn't finish (resumed is True) or starts a new one.
+    Work units are stored by stage and key (e.g., stage "topic", key the URL of the posting) with their data
+    (anything that can be converted to JSON). finish() marks the run as finished and deletes its work units.
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.lock = threading.Lock()
+
+        # Open (or create) the database
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS runs (
+                                   run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                   started_at REAL NOT NULL,
+                                   finished_at REAL)""")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS units (
+                                   run_id INTEGER NOT NULL,
+                                   stage TEXT NOT NULL,
+                                   key TEXT NOT NULL,
+                                   data BLOB,
+                                   PRIMARY KEY (run_id, stage, key))""")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS failed_uploads (
+                                   folder_id TEXT NOT NULL,
+                                   name TEXT NOT NULL,
+                                   content BLOB,
+                                   error TEXT,
+                                   attempts INTEGER NOT NULL,
+                                   PRIMARY KEY (folder_id, name))""")
+
+        # Resume the last unfinished run or start a new one
+        row = self.connection.execute("SELECT run_id FROM runs WHERE finished_at IS NULL ORDER BY run_id DESC LIMIT 1").fetchone()
+        if row is not None:
+            self.run_id = row[0]
+            self.resumed = True
+        else:
+            self.run_id = self.connection.execute("INSERT INTO runs (started_at) VALUES (?)", (time.time(),)).lastrowid
+            self.resumed = False
+        self.connection.commit()
+        logger.info(f"Inside RunJournal: {'resumed' if self.resumed else 'started'} run {self.run_id}.")
+
+    def set(self, stage, key, data=None):
+        """
+        Function to record that a unit of work is done.
+        """
+        self.set_many(stage, [(key, data)])
+
+    def set_many(self, stage, items):
+        """
+        Function to record several units of work of the same stage at once.
+
+        Inputs:
+        - stage: name of the stage
+        - items: list of tuples (key, data)
+        """
+        rows = [(self.run_id, stage, str(key), zlib.compress(json.dumps(data).encode('utf-8'))) for key, data in items]
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO units VALUES (?, ?, ?, ?)", rows)
+            self.connection.commit()
+
+    def get(self, stage, key, default=None):
+        """
+        Function to get the data of a unit of work (default if it isn't done).
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT data FROM units WHERE run_id = ? AND stage = ? AND key = ?",
+                                          (self.run_id, stage, str(key))).fetchone()
+        return default if row is None else json.loads(zlib.decompress(row[0]))
+
+    def get_all(self, stage):
+        """
+        Function to get all the units of work done for a stage.
+
+        Outputs: dict key -> data
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT key, data FROM units WHERE run_id = ? AND stage = ?", (self.run_id, stage)).fetchall()
+        return {key: json.loads(zlib.decompress(data)) for key, data in rows}
+
+    def get_or_set(self, stage, key, data):
+        """
+        Function to get the data of a unit of work, recording data first if it isn't done
+        (e.g., to keep a value from the first attempt of the run).
+        """
+        stored = self.get(stage, key)
+        if stored is None:
+            self.set(stage, key, data)
+            return data
+        return stored
+
+    def add_failed_uploads(self, items):
+        """
+        Function to record files that couldn't be uploaded to Google Drive (a file already recorded gets one more attempt).
+
+        Inputs:
+        - items: list of tuples (folder ID, file name, content, error)
+        """
+        rows = [(folder_id, name, zlib.compress(str(content).encode('utf-8')), error) for folder_id, name, content, error in items]
+        with self.lock:
+            self.connection.executemany("""INSERT INTO failed_uploads VALUES (?, ?, ?, ?, 1)
+                                           ON CONFLICT (folder_id, name) DO UPDATE SET
+                                           content = excluded.content, error = excluded.error, attempts = attempts + 1""", rows)
+            self.connection.commit()
+
+    def get_failed_uploads(self):
+        """
+        Function to get the files that couldn't be uploaded to Google Drive (by any run).
+
+        Outputs: list of dicts with folder_id, name, content, error and attempts
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT folder_id, name, content, error, attempts FROM failed_uploads").fetchall()
+        return [{"folder_id": folder_id, "name": name, "content": zlib.decompress(content).decode('utf-8'), "error": error, "attempts": attempts}
+                for folder_id, name, content, error, attempts in rows]
+
+    def remove_failed_uploads(self, keys):
+        """
+        Function to forget files that couldn't be uploaded to Google Drive (uploaded since, or given up on).
+
+        Inputs:
+        - keys: list of tuples (folder ID, file name)
+        """
+        with self.lock:
+            self.connection.executemany("DELETE FROM failed_uploads WHERE folder_id = ? AND name = ?", keys)
+            self.connection.commit()
+
+    def finish(self):
+        """
+        Function to mark the run as finished and delete its work units.
+        """
+        with self.lock:
+            self.connection.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+            self.connection.execute("DELETE FROM units WHERE run_id = ?", (self.run_id,))
+            self.connection.commit()
+        logger.info(f"Inside RunJournal.finish: run {self.run_id} finished.")
+
+    def close(self):
+        """
+        Function to close the database.
+        """
+        with self.lock:
+            self.connection.close()
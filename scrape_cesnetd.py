@@ -1,150 +1,126 @@
 # Script to scrape CESNET-D's job postings
 # Emilio Lehoucq
+#
+# The run is split into stages that can also be run on their own (they hand over their work through the run journal):
+# - discover: find the new postings (not in the Google Sheet yet)
+# - fetch-topics: scrape the new postings (Discourse JSON API, Selenium as a fallback)
+# - fetch-outbound: scrape the URLs in the new postings
+# - publish: upload the text and source code files to Google Drive, write them to the local dataset (see dataset_store)
+#   and append the new rows to the Google Sheets
+# - full (default): all of them, with the postings, the URLs in postings and the uploads running at the same time
+#
+# Usage: python scrape_cesnetd.py [discover | fetch-topics | fetch-outbound | publish | full] [--full-rescan]
+# Importing the module doesn't run anything. The Google API client and Selenium are only imported by the stages that use them.
 
 ##################################### Importing libraries #####################################
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from random import uniform
-from time import sleep
+import argparse
+import atexit
 import json
 import logging
 from datetime import datetime
 from dotenv import load_dotenv
 import os
-import re
 import random
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
-from googleapiclient.http import MediaFileUpload
-from shared_scripts.scraper import get_selenium_response
-from shared_scripts.text_extractor import extract_text
-from shared_scripts.url_extractor import extract_urls
+import requests
+from functools import partial
+from queue import Queue
+from threading import Thread
+from discourse_api import BASE_URL, get_session, get_post, get_topic_urls, imap_with_session_pool
+from posting_index import SheetIDIndex
+from dataset_store import DatasetStore
+from duplicate_index import DuplicateIndex
 from shared_scripts.salary_functions import check_salary
+from text_extraction import extract_text
+from run_journal import RunJournal
+from retry_policy import PermanentError, RetryPolicy, get_host
+from session_store import SessionStore
+from metrics import REPORT_PATH, metrics
 
 ##################################### Setting parameters #####################################
 
 # URL of the job category postings
-URL_CESNETD_JOB_CATEGORY = "https://cesnet.discourse.group/c/job-posting/5"
+URL_CESNETD_JOB_CATEGORY = f"{BASE_URL}/c/job-posting/5"
 
 # URL of the job tags postings
-URL_JOBS_TAGS = "https://cesnet.discourse.group/tag/jobs"
+URL_JOBS_TAGS = f"{BASE_URL}/tag/jobs"
 
 # Define CESNET-D's username and password
 load_dotenv()
 USERNAME = os.getenv('USERNAME')
 PASSWORD = os.getenv('PASSWORD')
 
-# Minimum and maximum time to sleep
-SLEEP_MIN_TIME = 2
-SLEEP_MAX_TIME = 5
-
 # Timestamp
 TS = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 # Number of retries
 RETRIES = 5
 
-##################################### Configure the logging settings #####################################
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-logger.info(f"Logging configured. Current timestamp: {TS}")
+# Retry policy for everything (driver, Discourse, outbound URLs, Google Sheets, Google Drive):
+# permanent errors aren't retried, transient ones are retried with exponential backoff, and hosts that keep failing are skipped for a while
+retry_policy = RetryPolicy(retries=RETRIES)
 
-# # TODO: comment for GitHub Actions
-# # Add a FileHandler to log to a file in the current working directory
-# file_handler = logging.FileHandler('scrape_cesnetd.log')
-# file_handler.setLevel(logging.INFO)
-# formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-# file_handler.setFormatter(formatter)
-# logger.addHandler(file_handler)
+# Host of CESNET-D (for the circuit breaker of the retry policy)
+DISCOURSE_HOST = get_host(URL_CESNETD_JOB_CATEGORY)
 
-##################################### Define functions for this script #####################################
-def scroll_to_bottom(driver, timeout_min, timeout_max):
-    """
-    Function to scroll to the bottom of the page.
-    Draft taken from: https://chatgpt.com/share/671a8ab4-a1bc-8004-8567-3be2d472dc49
-    """
+# Encrypted store of the login cookies, so that the API and the driver log in only when the session expired
+session_store = SessionStore(password=PASSWORD)
 
-    # Re-try block
-    logger.info("Re-try block in scroll_to_bottom function about to start.")
+# Whether to get the postings through Discourse's JSON API (True) or with Selenium (False)
+# Selenium is still used as a fallback if logging in or listing the postings through the API fails
+USE_DISCOURSE_API = True
 
-    # Iterate over the number of retries
-    for attempt in range(RETRIES):
-        logger.info(f"Attempt number: {attempt + 1}.")
-
-        try:
-            last_height = driver.execute_script("return document.body.scrollHeight")
+# Errors of the API after which Selenium is tried: network and HTTP errors, and errors that retrying won't fix
+# (e.g., a rejected login or an open circuit breaker). Anything else is a bug in the API path and is raised
+API_FALLBACK_ERRORS = (requests.RequestException, PermanentError)
 
-            while True:
-                # Scroll down to the bottom
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+# Whether to go through all the pages of the job category and jobs tag postings (True)
+# or to stop at the first page with only postings that I already scraped (False; incremental crawl)
+# The incremental crawl orders the postings by creation time, so a posting moved to the category or tag long after it was created
+# is only picked up by a full rescan
+FULL_RESCAN = os.getenv('FULL_RESCAN', 'false').lower() == 'true'
 
-                # Wait for the page to load more content
-                sleep(uniform(timeout_min, timeout_max))
+# Number of sessions scraping the postings in parallel (Discourse JSON API only)
+TOPIC_WORKERS = int(os.getenv('TOPIC_WORKERS', '4'))
 
-                # Get the new scroll height
-                new_height = driver.execute_script("return document.body.scrollHeight")
+# Maximum number of scraped postings waiting for their URLs to be scraped
+PIPELINE_QUEUE_SIZE = 16
 
-                # Check if the scroll height has changed
-                if new_height == last_height:
-                    # If heights are the same, break the loop
-                    break
+# Number of publishes that try to upload a file to Google Drive before it's given up on (e.g., a payload that is always rejected)
+# Failed uploads don't keep the run open: they're recorded in the journal and retried by the next publish
+MAX_UPLOAD_ATTEMPTS = 5
 
-                # Update last_height to new height
-                last_height = new_height
+# Whether to skip the URLs in postings that are near-duplicates of a posting scraped before (see duplicate_index)
+# The near-duplicates are always recorded, with the ID of the canonical posting
+# Off by default: the index only knows the postings scraped since it was created (it isn't seeded with the ones in the
+# Google Sheet), and it lives with the rest of the state, which the cache can evict, so whether the URLs of a posting are
+# skipped would depend on the state of the runner
+SKIP_DUPLICATE_OUTBOUND = os.getenv('SKIP_DUPLICATE_OUTBOUND', 'false').lower() == 'true'
 
-            # Break the loop if the re-try block was successful
-            logger.info("Re-try block successful. About to break the re-try loop.")
-            break
-
-        except Exception as e:
-            logger.info(f"Attempt {attempt + 1} failed. Error: {e}.")
-
-            # Check if we have retries left
-            if attempt < RETRIES - 1:
-                logger.info("Sleeping before retrying.")
-                sleep(uniform(SLEEP_MIN_TIME, SLEEP_MAX_TIME))
-            else:
-                logger.error("No more retries left. Exiting the function.")
-                break
+# Google Sheets with the postings and the URLs in the postings
+# https://docs.google.com/spreadsheets/d/1a3AH-zvYYca58CWWlszVEBi-AeyDDWKV_WhW90o9GK0/edit?gid=0#gid=0
+SPREADSHEET_POSTINGS_ID = "1a3AH-zvYYca58CWWlszVEBi-AeyDDWKV_WhW90o9GK0"
+# https://docs.google.com/spreadsheets/d/13Z3XZEDo2BsFb9kRdvbV-Qio7iB_acsbOf-6iDC7OzA/edit?gid=0#gid=0
+SPREADSHEET_URLS_IN_POSTINGS_ID = "13Z3XZEDo2BsFb9kRdvbV-Qio7iB_acsbOf-6iDC7OzA"
 
-def get_main_post_url(url):
-    """
-    Function to extract the main post URL from a Discourse thread URL.
-    Otherwise I would get URLs to responses in the thread, which I don't want.
+# Google Drive folders
+# https://drive.google.com/drive/u/4/folders/1zW3WhBG-bX4gYWfRR8d_vOoOmMGiC8mE
+FOLDER_ID_POSTINGS = "1zW3WhBG-bX4gYWfRR8d_vOoOmMGiC8mE"
+# https://drive.google.com/drive/u/4/folders/1pyhL4yqRnvGX3MkpsZAuQnlhqddvYXb7
+FOLDER_ID_URLS_IN_POSTINGS = "1pyhL4yqRnvGX3MkpsZAuQnlhqddvYXb7"
 
-    Draft taken from ChatGPT.
-    """
-    try:
-        # Split the URL by slashes to check the last segment
-        parts = url.rstrip('/').split('/')
-        # If the last two segments are numeric, remove the last one
-        if len(parts) > 1 and parts[-1].isdigit() and parts[-2].isdigit():
-            return '/'.join(parts[:-1])
-        # Otherwise, return the URL as is
-        return url
-    except Exception as e:
-        print(f"Error in get_main_post_url: {e}. Returning the URL as is.")
-        return url
-
-# Code to test the get_main_post_url function
-# def test_get_main_post_url():
-#     assert get_main_post_url("https://cesnet.discourse.group/t/now-hiring-fgcu-assistant-professor-school-counseling/2148") == "https://cesnet.discourse.group/t/now-hiring-fgcu-assistant-professor-school-counseling/2148"
-#     assert get_main_post_url("https://cesnet.discourse.group/t/now-hiring-fgcu-assistant-professor-school-counseling/2148/1") == "https://cesnet.discourse.group/t/now-hiring-fgcu-assistant-professor-school-counseling/2148"
-#     assert get_main_post_url("https://cesnet.discourse.group/t/lecturer-in-higher-education-student-affairs-at-butler-univ-indianapolis/727") == "https://cesnet.discourse.group/t/lecturer-in-higher-education-student-affairs-at-butler-univ-indianapolis/727"
-#     assert get_main_post_url("https://cesnet.discourse.group/t/lecturer-in-higher-education-student-affairs-at-butler-univ-indianapolis/727/1") == "https://cesnet.discourse.group/t/lecturer-in-higher-education-student-affairs-at-butler-univ-indianapolis/727"
-#     assert get_main_post_url("https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/91") == "https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/91"
-#     assert get_main_post_url("https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/91/2") == "https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/91"
-#     # The ones below are hypothetical cases
-#     assert get_main_post_url("https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/9") == "https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/9"
-#     assert get_main_post_url("https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/9/2") == "https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/9"
-#     assert get_main_post_url("https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/999999999999999") == "https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/999999999999999"
-#     assert get_main_post_url("https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/999999999999999/2") == "https://cesnet.discourse.group/t/visiting-assistant-professor-cmhc-valparaiso-university/999999999999999"
-#     print("All tests passed.")
+##################################### Configure the logging settings #####################################
+# The handlers are configured by main (importing the module doesn't change the logging of the caller)
+logger = logging.getLogger(__name__)
 
-# test_get_main_post_url()
+# # TODO: comment for GitHub Actions
+# # Add a FileHandler to log to a file in the current working directory
+# file_handler = logging.FileHandler('scrape_cesnetd.log')
+# file_handler.setLevel(logging.INFO)
+# formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+# file_handler.setFormatter(formatter)
+# logger.addHandler(file_handler)
 
+##################################### Define functions for this script #####################################
 def get_url_id(url):
     """
     Function to get the id of a post from its URL.
@@ -177,676 +153,809 @@ def get_url_id(url):
 
 # test_get_url_id()
 
-def upload_file(element_id, file_suffix, content, folder_id, service, logger):
+def get_job_posting_urls_with_api(session, known_ids=None):
     """
-    Function to upload a file to Google Drive.
+    Function to get the URLs of the job category and jobs tag postings through Discourse's JSON API.
 
     Inputs:
-    - element_id: ID of the job post
-    - file_suffix: suffix of the file name
-    - content: content of the file
-    - folder_id: ID of the folder in Google Drive
-    - service: service for Google Drive
-    - logger: logger
+    - session: authenticated session (from discourse_api.get_session)
+    - known_ids: set of IDs of the postings already scraped; None to get all the pages (full rescan)
 
-    Outputs: None
+    Outputs: list of URLs of the postings (without duplicates)
 
-    Dependencies: from googleapiclient.http import MediaFileUpload, os
+    Dependencies: from discourse_api import get_topic_urls
     """
-    
-    logger.info(f"Inside upload_file: uploading ID {element_id} to Google Drive.")
 
-    try:
-        # Prepare the file name
-        file_name = f"{element_id}_{file_suffix}.txt"
-        logger.info(f"Inside upload_file: prepared the name of the file for the {file_suffix}")
-
-        # Write the content to a temporary file
-        with open(file_name, 'w') as temp_file:
-            temp_file.write(content)
-        logger.info(f"Inside upload_file: wrote the {file_suffix} string to a temporary file")
-
-        # Prepare the file metadata
-        file_metadata = {
-            'name': file_name,
-            'parents': [folder_id]
-        }
-        logger.info(f"Inside upload_file: prepared the file metadata for the {file_suffix}")
-
-        # Prepare the file media
-        media = MediaFileUpload(file_name, mimetype='text/plain')
-        logger.info(f"Inside upload_file: prepared the file media for the {file_suffix}")
-
-        # Upload the file to the Drive folder
-        service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        logger.info(f"Inside upload_file: uploaded the file to the shared folder for the {file_suffix}")
-
-        # Remove the temporary file after uploading
-        os.remove(file_name)
-        logger.info(f"Inside upload_file: removed the temporary file after uploading for the {file_suffix}")
-    
-    except Exception as e:
-        logger.info(f"Inside upload_file: something went wrong. Error: {e}")
+    # Job category
+    with metrics.span("listing"):
+        urls = get_topic_urls(session, URL_CESNETD_JOB_CATEGORY, excluded=['about-the-job-posting-category'], known_ids=known_ids)
+    logger.info(f"Got the URLs of the job postings for the job category through the API. Number of URLs found: {len(urls)}.")
 
-    return None
+    # Jobs tag
+    with metrics.span("listing"):
+        urls_jobs_tags = get_topic_urls(session, URL_JOBS_TAGS, known_ids=known_ids)
+    logger.info(f"Got the URLs of the job postings for the jobs tags through the API. Number of URLs found: {len(urls_jobs_tags)}.")
 
-logger.info("Functions defined.")
+    # Putting the two lists together
+    urls = list(set(urls + urls_jobs_tags))
+    logger.info(f"Total number of URLs after removing duplicates: {len(urls)}.")
 
-##################################### SETTING UP GOOGLE APIS AND GET THE POSTINGS THAT I ALREADY SCRAPED #####################################
+    return urls
 
-# LOCAL MACHINE -- Set the environment variable for the service account credentials 
-#TODO: comment for GH Actions (and add to the secrets)
-# os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "credentials.json"
+def scrape_posting(url, fetch_post, duplicate_index=None):
+    """
+    Function to scrape a job posting and build its row of data.
 
-# Iterate over the number of retries
-logger.info("Re-try block for Google Sheets about to start.")
-for attempt in range(RETRIES):
-    logger.info(f"Attempt {attempt + 1}.")
+    Inputs:
+    - url: URL of the posting
+    - fetch_post: function that takes the URL and returns a tuple (list of URLs in the post, text of the post)
+      (e.g., get_post with a session or DiscourseBrowser.get_post)
+    - duplicate_index: duplicate_index.DuplicateIndex to check the text against (None: no check)
 
-    try:
-        # Authenticate using the service account
-        # LOCAL MACHINE
-        #TODO: comment for GH Actions
-        # credentials = service_account.Credentials.from_service_account_file(os.getenv('GOOGLE_APPLICATION_CREDENTIALS'))
-        # GITHUB ACTIONS
-        # TODO: uncomment for GH Actions
-        credentials = service_account.Credentials.from_service_account_info(json.loads(os.getenv('GOOGLE_APPLICATION_CREDENTIALS')))
-        logger.info("Authenticated with Google Sheets")
-
-        # Create service
-        service = build("sheets", "v4", credentials=credentials)
-        logger.info("Created service for Google Sheets")
-
-        # Get the values from the Google Sheet with the postings
-        # https://docs.google.com/spreadsheets/d/1a3AH-zvYYca58CWWlszVEBi-AeyDDWKV_WhW90o9GK0/edit?gid=0#gid=0
-        spreadsheet_postings_id = "1a3AH-zvYYca58CWWlszVEBi-AeyDDWKV_WhW90o9GK0"
-        result = service.spreadsheets().values().get(spreadsheetId=spreadsheet_postings_id, range='A:A').execute()
-        existing_postings = result.get("values", []) # Example output: [['test1'], ['abc'], ['123']]
-        logger.info("Got data from Google Sheets with the postings.")
-
-        # Get number of existing postings
-        n_postings = len(existing_postings)
-        logger.info(f"Number of existing postings obtained: {n_postings}.")
-
-        # Convert the list of lists to a set
-        existing_postings = set([posting for posting_list in existing_postings for posting in posting_list])
-        logger.info("Converted the list of lists to a set.")
-
-        # Get the values from the Google Sheets with the URLs in the postings
-        # https://docs.google.com/spreadsheets/d/13Z3XZEDo2BsFb9kRdvbV-Qio7iB_acsbOf-6iDC7OzA/edit?gid=0#gid=0
-        spreadsheet_urls_in_postings_id = "13Z3XZEDo2BsFb9kRdvbV-Qio7iB_acsbOf-6iDC7OzA"
-        result = service.spreadsheets().values().get(spreadsheetId=spreadsheet_urls_in_postings_id, range='A:A').execute()
-        existing_urls_in_postings = result.get("values", []) # Example output: [['test1'], ['abc'], ['123']]
-        logger.info("Got data from Google Sheets with the URLs in the postings.")
-
-        # Get number of existing URLs in postings
-        n_urls_in_postings = len(existing_urls_in_postings)
-        logger.info(f"Number of existing URLs in postings obtained: {n_urls_in_postings}.")
-
-        # Break the re-try loop if successful
-        logger.info("Re-try block successful. About to break the re-try loop.")
-        break
+    Outputs: list with the data of the posting: ID, URL, timestamp, salary flag, URLs in the post,
+    ID of the posting that it's a near-duplicate of (None if it isn't), text of the post
+    (salary flag, URLs and text are "FAILURE" if all the retries failed)
 
-    except Exception as e:
-        logger.info(f"Attempt {attempt + 1} failed. Error: {e}")
+    Dependencies: get_url_id, from shared_scripts.salary_functions import check_salary
+    """
 
-        # Check if we have retries left
-        if attempt < RETRIES - 1: 
-            logger.info("Sleeping before retry.")
-            sleep(uniform(SLEEP_MIN_TIME, SLEEP_MAX_TIME)) 
-        else:
-            logger.info("All retries exhausted.")
-            # Re-raise the last exception if all retries are exhausted
-            raise
+    # Create a list to store the data of the posting
+    data_given_posting = []
+    logger.info("List created to store the data of the posting.")
 
-##################################### Initialize the driver #####################################
-# Re-try block
-logger.info("Re-try block in initializing the driver about to start.")
+    # Get the URL unique ID of the posting and append it to the list of data for the posting
+    url_id = get_url_id(url)
+    data_given_posting.append(url_id)
+    logger.info(f"URL unique ID of the posting appended to the list of data for the posting: {url_id}.")
 
-# Iterate over the number of retries
-for attempt in range(RETRIES):
-    logger.info(f"Attempt number: {attempt + 1}.")
+    # Append the URL of the posting to the list of data for the posting
+    data_given_posting.append(url)
+    logger.info(f"URL of the posting appended to the list of data for the posting: {url}.")
 
-    try:
-        # Initialize the driver
-        # TODO: uncomment for GH Actions
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        driver = webdriver.Chrome(options=chrome_options)
-        # # TODO: comment for GH Actions
-        # driver = webdriver.Chrome()
-        logger.info("Driver initialized.")
-
-        # Break the loop if the re-try block was successful
-        logger.info("Re-try block successful. About to break the re-try loop.")
-        break
+    # Get current timestamp and append it to the list of data for the posting
+    data_given_posting.append(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    logger.info("Appended current timestamp to the list of data for the posting.")
 
+    # Re-try block (a deleted posting isn't retried)
+    logger.info("Re-try block in scraping individual job category postings about to start.")
+
+    try:
+        # Get the URLs and the text of the posting
+        with metrics.span("topic_fetch"):
+            urls_in_post, text_post = retry_policy.call(fetch_post, url, description=url, host=DISCOURSE_HOST)
+        logger.info("Got the URLs and the text of the posting.")
     except Exception as e:
-        logger.error(f"Error in initializing the driver: {e}.")
+        logger.info(f"Couldn't scrape {url}. Error: {e}.")
 
-        # Check if we have retries left
-        if attempt < RETRIES - 1:
-            logger.info("Sleeping before retrying.")
-            sleep(uniform(SLEEP_MIN_TIME, SLEEP_MAX_TIME))
-        else:
-            logger.error("No more retries left. Exiting the script.")
-            # Raise the last exception if all retries failed
-            raise
+        # Append FAILURE to the data of the posting
+        data_given_posting.append("FAILURE")
+        data_given_posting.append("FAILURE")
+        data_given_posting.append(None)
+        data_given_posting.append("FAILURE")
+        logger.info("FAILURE appended to the data of the posting.")
+        return data_given_posting
 
-##################################### Scrape all the job category postings #####################################
-# The Discourse Group has both a job category and a jobs tag. Although there's an overlap,
-# some posts are in the category, but not in the tag, and vice versa
-# I was planning to scrape the job category and the jobs tag postings separately, but it doesn't make sense
-# So, in general, all references to job category postings should also be understood to include jobs tags postings
+    # Check if the same job was posted before (as soon as the text is there, before anything else is done with it)
+    duplicate_of = duplicate_index.check(url_id, text_post) if duplicate_index is not None else None
 
-logger.info("Starting to scrape all the job category postings.")
+    # Check if there seems to be salary info
+    with metrics.span("check_salary"):
+        salary_flag = check_salary(text_post)
+    logger.info(f"salary_flag: {salary_flag}.")
 
-# Re-try block
-logger.info("Re-try block in scraping all the job category postings about to start.")
+    # Append salary flag to the list of data for the posting
+    data_given_posting.append(salary_flag)
+    logger.info("Salary flag appended to the list of data for the posting.")
 
-# Iterate over the number of retries
-for attempt in range(RETRIES):
-    logger.info(f"Attempt number: {attempt + 1}.")
+    # Append the URLs in the posting to the list of data for the posting
+    data_given_posting.append(urls_in_post)
+    logger.info("URLs in the posting appended to the list of data for the posting.")
 
-    try:
-        ################# Job category #################
-
-        # Go to the job category postings page
-        driver.get(URL_CESNETD_JOB_CATEGORY)
-        logger.info(f"Driver went to URL: {URL_CESNETD_JOB_CATEGORY}.")
-
-        # Sleep some time
-        sleep(uniform(SLEEP_MIN_TIME, SLEEP_MAX_TIME))
-        logger.info(f"Driver slept for a bit.")
-
-        # Find the login button
-        login_button = driver.find_element(By.CLASS_NAME, 'body-page-button-container')
-        logger.info("Driver found the login button.")
-
-        # Click the login button
-        login_button.click()
-        logger.info("Driver clicked the login button.")
-
-        # Sleep some time
-        sleep(uniform(SLEEP_MIN_TIME, SLEEP_MAX_TIME))
-        logger.info("Driver slept for a bit.")
-
-        # Find the username and password fields
-        username_field = driver.find_element(By.ID, "login-account-name") 
-        password_field = driver.find_element(By.ID, "login-account-password") 
-        logger.info("Driver found the username and password fields.")
-
-        # Enter the username and password
-        username_field.send_keys(USERNAME)  
-        password_field.send_keys(PASSWORD)  
-        logger.info("Driver entered the username and password.")
-
-        # Find the login button
-        login_button = driver.find_element(By.ID, "login-button")
-        logger.info("Driver found the login button.")
-
-        # Click the login button
-        login_button.click()
-        logger.info("Driver clicked the login button.")
-
-        # Sleep some time
-        sleep(uniform(SLEEP_MIN_TIME, SLEEP_MAX_TIME))
-        logger.info("Driver slept for a bit.")
-
-        # Scroll to the bottom of the page
-        scroll_to_bottom(driver, SLEEP_MIN_TIME, SLEEP_MAX_TIME)
-        logger.info("Driver scrolled to the bottom of the page.")
-
-        # Get the URLs of the job postings
-        urls = [get_main_post_url(url) for url in [hyperlink.get_attribute('href') for hyperlink in driver.find_elements(By.TAG_NAME, 'a')] if url is not None and 'https://cesnet.discourse.group/t/' in url and 'about-the-job-posting-category' not in url]
-        logger.info("Driver got the URLs of the job postings for the job category.")
-        logger.info(f"Number of URLs found: {len(urls)}.")
-        urls = list(set(urls))
-        logger.info(f"Number of URLs after removing duplicates: {len(urls)}.")
-
-        ################# jobs tag postings #################
-
-        # Go to the jobs tag postings page
-        driver.get(URL_JOBS_TAGS)
-
-        # Sleep some time
-        sleep(uniform(SLEEP_MIN_TIME, SLEEP_MAX_TIME))
-
-        # Scroll to the bottom of the page
-        scroll_to_bottom(driver, SLEEP_MIN_TIME, SLEEP_MAX_TIME) 
-        logger.info("Driver scrolled to the bottom of the page.")
-
-        # Get the URLs of the job postings
-        urls_jobs_tags = [get_main_post_url(url) for url in [hyperlink.get_attribute('href') for hyperlink in driver.find_elements(By.TAG_NAME, 'a')] if url is not None and 'https://cesnet.discourse.group/t/' in url]
-        logger.info("Driver got the URLs of the job postings for the jobs tags.")
-        logger.info(f"Number of URLs found: {len(urls_jobs_tags)}.")
-        urls_jobs_tags = list(set(urls_jobs_tags))
-        logger.info(f"Number of URLs after removing duplicates: {len(urls_jobs_tags)}.")
-
-        # Putting the two lists together
-        # Although it's inefficient what I'm doing with duplicates,
-        # it makes it easier to check that the script is working correctly
-        # And there's not a major efficiency problem with the number of URLs
-        urls += urls_jobs_tags
-        logger.info("Merged the URLs of the job postings for the job category and the jobs tags.")
-        logger.info(f"Total number of URLs: {len(urls)}.")
-        urls = list(set(urls))
-        logger.info(f"Total number of URLs after removing duplicates: {len(urls)}.")
-
-        # Break the loop if the re-try block was successful
-        logger.info("Re-try block successful. About to break the re-try loop.")
-        break
+    # Append the ID of the canonical posting (None if it's not a near-duplicate) to the list of data for the posting
+    data_given_posting.append(duplicate_of)
+    logger.info(f"Near-duplicate of: {duplicate_of}.")
 
-    except Exception as e:
-        logger.error(f"Error in scraping all the job category postings: {e}.")
+    # Append the text of the posting to the list of data for the posting
+    data_given_posting.append(text_post)
+    logger.info("Text of the posting appended to the list of data for the posting.")
 
-        # Check if we have retries left
-        if attempt < RETRIES - 1:
-            logger.info("Sleeping before retrying.")
-            sleep(uniform(SLEEP_MIN_TIME, SLEEP_MAX_TIME))
-        else:
-            logger.error("No more retries left. Exiting the script.")
-            # Raise the last exception if all retries failed
-            raise
+    return data_given_posting
 
-##################################### Scrape individual job category postings #####################################
+def iterate_urls_in_postings(postings, n_urls_in_postings):
+    """
+    Function to build the data of the URLs in the new postings, in order.
+    The IDs of the URLs are consecutive, after the URLs in postings that were in the Google Sheet when the run started.
+    The URLs of near-duplicate postings are skipped if SKIP_DUPLICATE_OUTBOUND is True.
 
-# Create a list to store the data of all the postings for the job category
-data_all_postings_job_category = []
-logger.info("List created to store the data of all the postings for the job category.")
+    Inputs:
+    - postings: iterable with the data of the new postings, in the same order as the new postings (see scrape_posting)
+    - n_urls_in_postings: number of URLs in postings when the run started
 
-# Loop over the URLs for the job postings for the job category
-logger.info("Starting to loop over the URLs for the job postings for the job category.")
-for url in urls:
+    Outputs: generator of lists with the data of each URL: ID, ID of the posting, URL of the posting, URL, timestamp
+    """
+    n_urls = 0
+    for data_posting in postings:
 
-    # Create a list to store the data of the posting
-    data_given_posting = []
-    logger.info("List created to store the data of the posting.")
+        # Get the URLs in the posting
+        urls_in_posting = data_posting[4]
 
-    # Get the URL unique ID of the posting and append it to the list of data for the posting
-    url_id = get_url_id(url)
-    data_given_posting.append(url_id)
-    logger.info(f"URL unique ID of the posting appended to the list of data for the posting: {url_id}.")
+        # Skip the near-duplicates (the canonical posting has the same URLs)
+        if SKIP_DUPLICATE_OUTBOUND and data_posting[5] is not None:
+            logger.info(f"Posting {data_posting[0]} is a near-duplicate of posting {data_posting[5]}. Skipping its URLs.")
+            continue
 
-    # TODO: think: can the same job be posted several times with different URL ids?
-    # Check whether I already have that posting
-    if url_id in existing_postings:
-        logger.info(f"Posting {url_id} already scraped. URL: {url} Skipping.")
-        # Skip to the next posting
-        continue
+        # If there are URLs in the posting ("FAILURE" if the posting couldn't be scraped)
+        if isinstance(urls_in_posting, list):
 
-    # Append the URL of the posting to the list of data for the posting
-    data_given_posting.append(url)
-    logger.info(f"URL of the posting appended to the list of data for the posting: {url}.")
+            # Iterate over the URLs in the posting
+            for url in urls_in_posting:
+                n_urls += 1
 
-    # Get current timestamp and append it to the list of data for the posting
-    data_given_posting.append(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-    logger.info("Appended current timestamp to the list of data for the posting.")
+                # ID for the URL, unique URL id and URL of the posting, URL, current timestamp
+                yield [n_urls_in_postings + n_urls, data_posting[0], data_posting[1], url, datetime.now().strftime("%Y-%m-%d %H:%M:%S")]
 
-    # Re-try block
-    logger.info("Re-try block in scraping individual job category postings about to start.")
+class ScrapeRun:
+    """
+    Class for what the stages of a run share: the run journal (see run_journal), the Google credentials,
+    the IDs already in the Google Sheets, the login to CESNET-D (Discourse JSON API session or Selenium driver) and the uploader to Google Drive.
+    Everything but the journal is created the first time a stage needs it, so a stage only loads and starts what it uses.
 
-    # Iterate over the number of retries
-    for attempt in range(RETRIES):
-        logger.info(f"Attempt number: {attempt + 1}.")
+    When created, it resumes the last run that didn't finish (if any): the stages skip what the run already did.
+
+    Usage: run = ScrapeRun(); discover(run); fetch_topics(run); ...; run.close()
+    """
+
+    def __init__(self, full_rescan=FULL_RESCAN):
+        self.full_rescan = full_rescan
+        self.journal = RunJournal()
+        logger.info(f"Run {self.journal.run_id}. Resumed: {self.journal.resumed}.")
+        metrics.set_info(run_id=self.journal.run_id, resumed=self.journal.resumed, full_rescan=full_rescan)
+
+        # Date of the run (partition of the local dataset; kept if the run is resumed on another day)
+        self.run_date = self.journal.get_or_set("run", "run_date", datetime.now().strftime("%Y-%m-%d"))
+
+        self.credentials = None
+        self.indexes = None
+        self.session = None
+        self.browser = None
+        self.uploader = None
+
+    def get_credentials(self):
+        """
+        Function to get the credentials of the service account for the Google APIs (created the first time).
+        """
+        if self.credentials is None:
+            from google.oauth2 import service_account
+
+            # LOCAL MACHINE -- Set the environment variable for the service account credentials
+            #TODO: comment for GH Actions (and add to the secrets)
+            # os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "credentials.json"
+            # self.credentials = service_account.Credentials.from_service_account_file(os.getenv('GOOGLE_APPLICATION_CREDENTIALS'))
+            # GITHUB ACTIONS
+            # TODO: uncomment for GH Actions
+            self.credentials = service_account.Credentials.from_service_account_info(json.loads(os.getenv('GOOGLE_APPLICATION_CREDENTIALS')))
+            logger.info("Authenticated with the Google APIs.")
+        return self.credentials
+
+    def get_indexes(self):
+        """
+        Function to get the IDs of the postings and of the URLs in postings already in the Google Sheets (synced the first time).
+        Only the rows added since the last run are downloaded (see posting_index).
+
+        Outputs: tuple of posting_index.SheetIDIndex (postings, URLs in postings); they support `url_id in index` like a set
+        """
+        if self.indexes is None:
+            from googleapiclient.discovery import build
+            from sheets_writer import SHEETS_HOST
+
+            existing_postings = SheetIDIndex("postings")
+            existing_urls_in_postings = SheetIDIndex("urls_in_postings")
+
+            # Iterate over the attempts (the last error is raised if all of them fail)
+            logger.info("Re-try block for Google Sheets about to start.")
+            for attempt in retry_policy.attempts("Google Sheets", SHEETS_HOST):
+                with attempt:
+                    # Create service
+                    service = build("sheets", "v4", credentials=self.get_credentials())
+                    logger.info("Created service for Google Sheets")
+
+                    # Get the IDs in the Google Sheet with the postings
+                    existing_postings.sync(service, SPREADSHEET_POSTINGS_ID)
+                    logger.info(f"Got data from Google Sheets with the postings. Number of existing postings: {len(existing_postings)}.")
+
+                    # Get the IDs in the Google Sheet with the URLs in the postings
+                    existing_urls_in_postings.sync(service, SPREADSHEET_URLS_IN_POSTINGS_ID)
+                    logger.info(f"Got data from Google Sheets with the URLs in the postings. "
+                                f"Number of existing URLs in postings: {len(existing_urls_in_postings)}.")
+
+            logger.info("Re-try block successful.")
+            self.indexes = (existing_postings, existing_urls_in_postings)
+        return self.indexes
+
+    def get_browser(self):
+        """
+        Function to get the Selenium fallback for the Discourse JSON API, with its driver started (see discourse_browser).
+        Selenium is only imported the first time.
+        """
+        if self.browser is None:
+            from discourse_browser import DiscourseBrowser
+            self.browser = DiscourseBrowser(URL_CESNETD_JOB_CATEGORY, URL_JOBS_TAGS, USERNAME, PASSWORD, session_store, retry_policy)
+        if self.browser.driver is None:
+            self.browser.start()
+        return self.browser
+
+    def login(self):
+        """
+        Function to log in to CESNET-D (unless a stage already did): through the Discourse JSON API or,
+        if it fails, with Selenium. Raises the last error if Selenium fails too.
+        """
+        if self.session is not None or (self.browser is not None and self.browser.logged_in):
+            return
+
+        if USE_DISCOURSE_API:
+            try:
+                # Log in (or reuse the stored session if it's still valid)
+                self.session = retry_policy.call(get_session, USERNAME, PASSWORD, session_store,
+                                                 description="logging in through the API", host=DISCOURSE_HOST)
+                logger.info("Logged in through the API.")
+                return
+            except API_FALLBACK_ERRORS as e:
+                logger.error(f"Error in logging in through the API: {e}. Falling back to Selenium.")
+
+        # Re-try block (the last error is raised if all the attempts fail)
+        browser = self.get_browser()
+        for attempt in retry_policy.attempts("logging in with Selenium", DISCOURSE_HOST):
+            with attempt:
+                browser.open()
+
+    def close_browser(self):
+        """
+        Function to quit the driver of the Selenium fallback (if it was started).
+        """
+        if self.browser is not None:
+            self.browser.quit()
+
+    def get_new_urls(self):
+        """
+        Function to get the URLs of the new postings found by the discover stage of this run.
+        """
+        new_urls = self.journal.get("discover", "new_urls")
+        if new_urls is None:
+            raise RuntimeError(f"Run {self.journal.run_id} didn't find the new postings yet. Run the discover stage first.")
+        return new_urls
+
+    def get_n_urls_in_postings(self):
+        """
+        Function to get the number of URLs in postings in the Google Sheet when the run started (recorded by the discover stage).
+        """
+        n_urls_in_postings = self.journal.get("run", "n_urls_in_postings")
+        if n_urls_in_postings is None:
+            raise RuntimeError(f"Run {self.journal.run_id} didn't find the new postings yet. Run the discover stage first.")
+        return n_urls_in_postings
+
+    def get_n_postings(self):
+        """
+        Function to get the number of rows in the Google Sheet with the postings when the run started (recorded by the discover stage).
+        """
+        n_postings = self.journal.get("run", "n_postings")
+        if n_postings is None:
+            raise RuntimeError(f"Run {self.journal.run_id} didn't find the new postings yet. Run the discover stage first.")
+        return n_postings
+
+    def get_posting(self, url):
+        """
+        Function to get the data of a posting recorded by the fetch-topics stage of this run (None if it isn't recorded).
+        """
+        return self.journal.get("topic", url)
+
+    def iterate_postings(self):
+        """
+        Function to get the data of the new postings recorded by the fetch-topics stage of this run, in order.
+
+        Outputs: generator of lists with the data of each posting (see scrape_posting)
+        """
+        for url in self.get_new_urls():
+            data_posting = self.get_posting(url)
+            if data_posting is None:
+                raise RuntimeError(f"Run {self.journal.run_id} didn't scrape the posting {url} yet. Run the fetch-topics stage first.")
+            yield data_posting
+
+    def upload(self, file_name, content, folder_id):
+        """
+        Function to upload a file to Google Drive in the background (see drive_uploader.DriveUploader), unless this run already uploaded it.
+        Uploaded files are recorded in the journal.
+        A file that is already in the folder (e.g., from a run that didn't finish) is skipped if it has the same content and updated otherwise.
+        """
+        if self.journal.get("drive", f"{folder_id}/{file_name}") is not None:
+            return
+
+        if self.uploader is None:
+            from drive_uploader import DriveUploader
+            # Each file has its own retries
+            self.uploader = DriveUploader(self.get_credentials(), retry_policy=retry_policy,
+                                          on_uploaded=lambda result: self.journal.set("drive", f"{result['folder_id']}/{result['name']}", result["id"]))
+        self.uploader.submit(file_name, content, folder_id)
+
+    def close_uploads(self):
+        """
+        Function to wait for the uploads to Google Drive.
+
+        Outputs: list of dicts (one per file) like the ones returned by DriveUploader.upload (empty if there were no uploads)
+        """
+        if self.uploader is None:
+            return []
+        upload_results = self.uploader.close()
+        self.uploader = None
+        logger.info(f"Wrote new data (if available) to Google Drive. Failed uploads: {sum(result['error'] is not None for result in upload_results)}.")
+        return upload_results
+
+    def close(self):
+        """
+        Function to release everything the stages used (uploads still pending are waited for).
+        """
+        self.close_uploads()
+        self.close_browser()
+        if self.indexes is not None:
+            for index in self.indexes:
+                index.close()
+        self.journal.close()
+
+##################################### Define the stages #####################################
+def discover(run):
+    """
+    Function for the discover stage: finds the new postings (the ones that aren't in the Google Sheet yet) and records them in the journal.
+    If the run already found them (resumed run), it keeps those (new postings that showed up in the meantime are picked up by the next run).
+
+    Outputs: list of URLs of the new postings
+    """
+    new_urls = run.journal.get("discover", "new_urls")
+    if new_urls is not None:
+        logger.info(f"Run already found the new postings. Number of new postings: {len(new_urls)}.")
+        return new_urls
+
+    # Get the postings that I already scraped
+    existing_postings, existing_urls_in_postings = run.get_indexes()
+
+    # The IDs of the URLs in postings depend on the number of URLs in postings when the run started
+    n_urls_in_postings = run.journal.get_or_set("run", "n_urls_in_postings", len(existing_urls_in_postings))
+    logger.info(f"Number of existing URLs in postings for this run: {n_urls_in_postings}.")
+
+    # The new postings are written after the rows that the sheet had when the run started
+    n_postings = run.journal.get_or_set("run", "n_postings", len(existing_postings))
+    logger.info(f"Number of existing postings for this run: {n_postings}.")
+
+    # The Discourse Group has both a job category and a jobs tag. Although there's an overlap,
+    # some posts are in the category, but not in the tag, and vice versa
+    # I was planning to scrape the job category and the jobs tag postings separately, but it doesn't make sense
+    # So, in general, all references to job category postings should also be understood to include jobs tags postings
+
+    # IDs of the postings already scraped, to stop listing postings early (None for a full rescan)
+    known_ids = None if run.full_rescan else existing_postings
+    logger.info(f"Full rescan: {run.full_rescan}.")
+
+    # URLs of the job postings (None until one of the ways of listing them works)
+    urls = None
+
+    if USE_DISCOURSE_API:
+        logger.info("Starting to get all the job category postings through the Discourse JSON API.")
+
+        # Re-try block (falls back to Selenium if all the attempts fail)
+        logger.info("Re-try block in getting all the job category postings through the API about to start.")
 
         try:
-            # Go to the URL of the posting
-            driver.get(url)
-            logger.info(f"Driver went to URL: {url}.")
-
-            # Sleep some time
-            sleep(uniform(SLEEP_MIN_TIME, SLEEP_MAX_TIME))
-            logger.info("Driver slept for a bit.")
-
-            # Get the post
-            post = driver.find_element(By.CLASS_NAME, 'cooked')
-            logger.info("Driver got the posting.")
-
-            # Get the URLs in the post
-            # Using extract_urls() too to focus only on the URLs that I care about
-            urls_in_post = [url for link in post.find_elements(By.TAG_NAME, 'a') if link.get_attribute('href') is not None and "http" in link.get_attribute('href') for url in extract_urls(link.get_attribute('href')) if url is not None]
-            logger.info("Driver got the URLs in the posting.")
-            logger.info(f"len urls_in_post (just hyperlinks in the post): {len(urls_in_post)}")
-            logger.info(f"urls_in_post (just hyperlinks in the post): {urls_in_post}")
-
-            # Get the text of the posting
-            text_post = post.text
-            logger.info("Driver got the text of the posting.")
-
-            # Extract the URLs from the text of the posting and add them to urls_in_post
-            urls_in_post += extract_urls(text_post)
-            logger.info("URLs extracted from the text of the posting.")
-            logger.info(f"len urls_in_post (adding URLs from the text): {len(urls_in_post)}")
-            logger.info(f"urls_in_post (adding URLs from the text): {urls_in_post}")
-
-            # Remove duplicates from urls_in_post
-            urls_in_post = list(set(urls_in_post))
-            logger.info("Removed duplicates from urls_in_post.")
-            logger.info(f"len urls_in_post after removing duplicates: {len(urls_in_post)}")
-            
-            # Check if there seems to be salary info
-            salary_flag = check_salary(text_post)
-            logger.info(f"salary_flag: {salary_flag}.")
+            for attempt in retry_policy.attempts("the job category postings through the API", DISCOURSE_HOST):
+                with attempt:
+                    # Log in (or reuse the stored session if it's still valid)
+                    run.session = get_session(USERNAME, PASSWORD, session_store)
+                    logger.info("Logged in through the API.")
 
-            # Append salary flag to the list of data for the posting
-            data_given_posting.append(salary_flag)
-            logger.info("Salary flag appended to the list of data for the posting.")
+                    # Get the URLs of the job postings
+                    urls = get_job_posting_urls_with_api(run.session, known_ids)
+                    logger.info("Got the URLs of the job postings through the API.")
 
-            # Append the URLs in the posting to the list of data for the posting
-            data_given_posting.append(urls_in_post)
-            logger.info("URLs in the posting appended to the list of data for the posting.")
+            logger.info("Re-try block successful.")
 
-            # Append the text of the posting to the list of data for the posting
-            data_given_posting.append(text_post)
-            logger.info("Text of the posting appended to the list of data for the posting.")
-            
-            # Break the loop if the re-try block was successful
-            logger.info("Re-try block successful. About to break the re-try loop.")
-            break
+        except API_FALLBACK_ERRORS as e:
+            logger.error(f"Error in getting all the job category postings through the API: {e}. Falling back to Selenium.")
+            run.session = None
 
-        except Exception as e:
-            logger.error(f"Error in scraping individual job category postings: {e}.")
+    if urls is None:
+        logger.info("Starting to scrape all the job category postings with Selenium.")
 
-            # Check if we have retries left
-            if attempt < RETRIES - 1:
-                logger.info("Sleeping before retrying.")
-                sleep(uniform(SLEEP_MIN_TIME, SLEEP_MAX_TIME))
-            else:
-                logger.info("No more retries left. Couldn't scrape {url}. Error: {e}.")
-
-                # Append FAILURE to the data of the posting
-                data_given_posting.append("FAILURE")
-                data_given_posting.append("FAILURE")
-                data_given_posting.append("FAILURE")
-                logger.info("FAILURE appended to the data of the posting.")
-
-    # Append the data of the posting to the list of data for all the postings for the job category
-    data_all_postings_job_category.append(data_given_posting)
-    logger.info("Data of the posting appended to the list of data for all the postings for the job category.")
-
-# Quit the driver
-driver.quit()
-logger.info("Driver quit.")
-
-##################################### Scrape URLs in postings #####################################
-
-# Create variable to store the data of all the URLs found in the postings
-data_all_urls_in_postings = []
-logger.info("Variable created to store the data of all the URLs found in the postings.")
-
-# Iterate over data_all_postings_job_category
-for data_posting in data_all_postings_job_category:
-    logger.info("Starting to iterate over data_all_postings_job_category to scrape URLs in postings.")
-
-    # Get the URLs in the posting
-    urls_in_posting = data_posting[4]
-
-    # If there are URLs in the posting
-    if len(urls_in_posting) > 0:
-
-        # Iterate over the URLs in the posting
-        for url in urls_in_posting:
-            logger.info(f"About to try to scrape this URL in the posting: {url}.")
-
-            # Create a list to store the data of the URL
-            data_given_url = []
-
-            # Store the ID for the URL
-            data_given_url.append(n_urls_in_postings + len(data_all_urls_in_postings) + 1)
-
-            # Store the unique URL id
-            data_given_url.append(data_posting[0])
-
-            # Store the URL of the posting 
-            data_given_url.append(data_posting[1])
-            
-            # Store the URL
-            data_given_url.append(url)
-
-            # Store the current timestamp
-            data_given_url.append(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-
-            logger.info("Data for the URL initialized.")
-
-            # Re-try block
-            logger.info("Re-try block in scraping URLs in postings about to start.")
-
-            # Iterate over the number of retries
-            for attempt in range(RETRIES):
-                logger.info(f"Attempt number: {attempt + 1}.")
-
-                try:
-                    # Scrape the URL 
-                    source_code_url = get_selenium_response(url)
-                    logger.info("Scraped the URL.")
-
-                    # Extract the text from the source code
-                    text_url = extract_text(source_code_url)
-                    logger.info("Extracted the text from the source code.")
-            
-                    # Check if there seems to be salary info
-                    salary_flag = check_salary(text_url)
-                    logger.info(f"salary_flag: {salary_flag}.")
-        
-                    # Append salary flag to the list
-                    data_given_url.append(salary_flag)
-                    logger.info("Salary flag appended to the list.")
-        
-                    # Store the source code for the URL
-                    data_given_url.append(source_code_url)
-                    logger.info("Source code for the URL stored.")
-                    
-                    # Store the text for the URL
-                    data_given_url.append(text_url)
-                    logger.info("Text for the URL stored.")
-                    
-                    # Break the loop if the re-try block was successful
-                    logger.info("Re-try block successful. About to break the re-try loop.")
-                    break
-            
-                except Exception as e:
-                    logger.error(f"Error in scraping URL {url} in posting: {e}.")
-
-                    # Check if we have retries left
-                    if attempt < RETRIES - 1:
-                        logger.info("Sleeping before retrying.")
-                        sleep(uniform(SLEEP_MIN_TIME, SLEEP_MAX_TIME))
-                    else:
-                        logger.info(f"No more retries left. Couldn't scrape {url}. Error: {e}.")
-
-                        # Append FAILURE to the data of the URL
-                        data_given_url.append("FAILURE")
-                        data_given_url.append("FAILURE")
-                        data_given_url.append("FAILURE")
-                        logger.info("FAILURE appended to the data of the URL.")
-
-            # Append the data for the URL in the list of data for all the URLs found in the postings
-            data_all_urls_in_postings.append(data_given_url)
-
-####################################### WRITE NEW DATA TO GOOGLE SHEETS #######################################
-
-# Data for the postings
-
-# Retry block in case of failure
-logger.info("Re-try block for data for postings (Google Sheets) about to start.")
-
-# Iterate over the number of retries
-for attempt in range(RETRIES):
+        # Re-try block (the last error is raised if all the attempts fail)
+        logger.info("Re-try block in scraping all the job category postings about to start.")
 
-    try:
-        logger.info(f"Re-try block for data for postings (Google Sheets). Attempt {attempt + 1}.")
-
-        # Range to write the data
-        range_sheet="A"+str(n_postings+1)+":D10000000"
-        logger.info("Prepared range to write the data for the postings.")
-
-        # Body of the request
-        # id, url, ts
-        body={"values": [element[0:4] for element in data_all_postings_job_category]} 
-        logger.info("Prepared body of the request for the postings.")
-
-        # Execute the request
-        result = service.spreadsheets().values().update(
-            spreadsheetId=spreadsheet_postings_id,
-            range=range_sheet,
-            valueInputOption="USER_ENTERED",
-            body=body
-            ).execute()
-        logger.info("Wrote new data to Google Sheets for the postings.")
-
-        # Break the loop if successful
-        logger.info("Re-try block for data for postings successful. About to break the loop.")
-        break
-    
-    except Exception as e:
-        logger.info(f"Re-try block for data for postings. Attempt {attempt + 1} failed. Error: {e}")
+        browser = run.get_browser()
+        for attempt in retry_policy.attempts("the job category postings with Selenium", DISCOURSE_HOST):
+            with attempt:
+                urls = browser.get_job_posting_urls(known_ids)
 
-        if attempt < RETRIES - 1:
-            logger.info("Re-try block for data for postings. Sleeping before retry.")
-            sleep(5)
+        logger.info("Re-try block successful.")
+
+    # Keep only the postings that I don't have yet
+    # TODO: think: can the same job be posted several times with different URL ids?
+    new_urls = []
+    for url in urls:
+        if get_url_id(url) in existing_postings:
+            logger.info(f"Posting {get_url_id(url)} already scraped. URL: {url} Skipping.")
         else:
-            logger.info("Re-try block for data for postings. All retries exhausted.")
-            raise
+            new_urls.append(url)
+    run.journal.set("discover", "new_urls", new_urls)
+    logger.info(f"Number of new postings to scrape: {len(new_urls)}.")
 
-logger.info("Wrote new data to Google Sheets for the postings.")
+    return new_urls
 
-# Data for the URLs in the postings
+def fetch_topics(run, on_posting=None):
+    """
+    Function for the fetch-topics stage: scrapes the new postings that the run didn't scrape yet (see scrape_posting)
+    and records them in the journal. It logs in to CESNET-D only if there's something to scrape.
 
-# Retry block in case of failure
-logger.info("Re-try block for data for URLs in postings (Google Sheets) about to start.")
+    Inputs:
+    - run: ScrapeRun
+    - on_posting: function called with the data of each new posting as soon as it's ready, in the same order as the new postings
+      (the ones that the run already scraped come from the journal), e.g., to start scraping its URLs; None to only record them
 
-# Iterate over the number of retries
-for attempt in range(RETRIES):
+    Outputs: None
+    """
+    new_urls = run.get_new_urls()
+
+    # Postings already scraped by this run (if resumed)
+    pending_urls = [url for url in new_urls if run.journal.get("topic", url) is None]
+    pending_urls_set = set(pending_urls)
+    logger.info(f"Number of new postings: {len(new_urls)}. Already scraped by this run: {len(new_urls) - len(pending_urls)}.")
+
+    if len(pending_urls) > 0:
+        run.login()
+    metrics.set_info(new_postings=len(new_urls), pending_postings=len(pending_urls), used_discourse_api=run.session is not None)
+
+    # Index of the postings scraped before, to tag the near-duplicates
+    duplicate_index = DuplicateIndex()
+    if SKIP_DUPLICATE_OUTBOUND and len(duplicate_index) == 0:
+        logger.warning("The near-duplicate index is empty (first run, or the state wasn't restored). "
+                       "Near-duplicates of postings scraped by earlier runs won't be found, so their URLs will be scraped again.")
+
+    def scrape_and_record_posting(url, fetch_post):
+        """
+        Function to scrape a posting (see scrape_posting) and record it in the journal.
+        """
+        data_given_posting = scrape_posting(url, fetch_post, duplicate_index)
+        run.journal.set("topic", url, data_given_posting)
+        return data_given_posting
 
     try:
-        logger.info(f"Re-try block for data for URLs postings (Google Sheets). Attempt {attempt + 1}.")
-
-        # Range to write the data
-        range_sheet="A"+str(n_urls_in_postings+1)+":F10000000" 
-        logger.info("Prepared range to write the data for the URLs in postings.")
-
-        # Body of the request
-        # id, id, url, url, ts
-        body={"values": [element[:6] for element in data_all_urls_in_postings]} 
-        logger.info("Prepared body of the request for the URLs in postings.")
-
-        # Execute the request
-        result = service.spreadsheets().values().update(
-            spreadsheetId=spreadsheet_urls_in_postings_id,
-            range=range_sheet,
-            valueInputOption="USER_ENTERED",
-            body=body
-            ).execute()
-        logger.info("Wrote new data to Google Sheets for the URLs in postings.")
-
-        # Break the loop if successful
-        logger.info("Re-try block for data for URLs in postings successful. About to break the loop.")
-        break
-    
-    except Exception as e:
-        logger.info(f"Re-try block for data for URLs in postings. Attempt {attempt + 1} failed. Error: {e}")
-
-        if attempt < RETRIES - 1:
-            logger.info("Re-try block for data for URLs in postings. Sleeping before retry.")
-            sleep(5)
+        # Scrape the postings
+        if len(pending_urls) == 0:
+            data_pending_postings = iter([])
+        elif run.session is not None:
+            # Several sessions (sharing the login cookies) in parallel, with a global rate limit (see discourse_api)
+            # At most PIPELINE_QUEUE_SIZE postings are fetched ahead of the ones handed over, so a slow consumer slows down the fetching
+            logger.info(f"Starting to scrape the new postings with {TOPIC_WORKERS} sessions in parallel.")
+            data_pending_postings = imap_with_session_pool(run.session,
+                                                           lambda worker_session, url: scrape_and_record_posting(url, partial(get_post, worker_session)),
+                                                           pending_urls,
+                                                           TOPIC_WORKERS,
+                                                           max_pending=PIPELINE_QUEUE_SIZE)
         else:
-            logger.info("Re-try block for data for URLs in postings. All retries exhausted.")
-            raise
+            # One page at a time with the driver
+            logger.info("Starting to scrape the new postings with the driver.")
+            data_pending_postings = (scrape_and_record_posting(url, run.browser.get_post) for url in pending_urls)
+
+        # Hand over the postings in order (the ones already scraped by this run come from the journal)
+        for url in new_urls:
+            if url in pending_urls_set:
+                data_given_posting = next(data_pending_postings)
+            elif on_posting is not None:
+                data_given_posting = run.get_posting(url)
+            else:
+                continue
+            if on_posting is not None:
+                on_posting(data_given_posting)
 
-logger.info("Wrote new data to Google Sheets for the URLs in postings.") 
+    finally:
+        # The next stages don't need the driver
+        run.close_browser()
+        duplicate_index.close()
 
-####################################### WRITE NEW DATA TO GOOGLE DRIVE #######################################
+    logger.info("Scraped the new postings.")
 
-# Note: if there's already a file with the same name in the folder, this code will add another with the same name
+def fetch_outbound(run, postings=None, upload=None):
+    """
+    Function for the fetch-outbound stage: scrapes the URLs in the new postings that the run didn't scrape yet
+    (HTTP first, browser only if needed; see OutboundFetcher), extracts their text, checks the salary and records them in the journal.
 
-# Data for the postings
+    Inputs:
+    - run: ScrapeRun
+    - postings: iterable with the data of the new postings, in order (None: the ones recorded in the journal by the fetch-topics stage)
+    - upload: function (file name, content, folder ID) that the text and source code files are handed to as soon as they're ready
+      (e.g., ScrapeRun.upload); None to leave the uploads to the publish stage
 
-# Folder ID
-# https://drive.google.com/drive/u/4/folders/1zW3WhBG-bX4gYWfRR8d_vOoOmMGiC8mE
-folder_id = "1zW3WhBG-bX4gYWfRR8d_vOoOmMGiC8mE" 
+    Outputs: None
+    """
+    from outbound_fetcher import OutboundFetcher
+    from url_cache import URLCache
+
+    n_urls_in_postings = run.get_n_urls_in_postings()
+    if postings is None:
+        postings = run.iterate_postings()
+
+    # Number of URLs in the new postings
+    n_urls = 0
+
+    def iterate_postings():
+        """
+        Function to hand over the postings as they come, uploading the text of each one.
+        """
+        for data_posting in postings:
+            if upload is not None:
+                upload(f"{data_posting[0]}_text.txt", data_posting[-1], FOLDER_ID_POSTINGS)
+            yield data_posting
+
+    def iterate_pending_urls():
+        """
+        Function to yield (data of the URL, URL) for each URL in the postings that this run didn't scrape yet.
+        """
+        nonlocal n_urls
+        for data_given_url in iterate_urls_in_postings(iterate_postings(), n_urls_in_postings):
+            n_urls += 1
+            if run.journal.get("outbound", data_given_url[0]) is None:
+                yield data_given_url, data_given_url[3]
+
+    def process_url_in_posting(data_given_url, source_code_url):
+        """
+        Function to process the source code of a URL as soon as it arrives: extract the text, check the salary,
+        record the URL in the journal and hand the files to upload.
+        The source code and text are released afterwards, so the memory is bounded by the size of the queues, not by the number of URLs.
+        """
+        url = data_given_url[3]
 
-# Retry block in case of failure
-for attempt in range(RETRIES):
+        try:
+            # Check if the URL could be scraped
+            if isinstance(source_code_url, Exception):
+                raise source_code_url
+
+            # Extract the text from the source code (within the byte and time caps, see text_extraction)
+            # Documents (PDF, DOCX) come with their text (see OutboundFetcher.get_document); their source code is a description
+            if isinstance(source_code_url, dict):
+                document = source_code_url
+                text_url, extraction = document["text"], document["extraction"]
+                source_code_url = f"{document['kind'].upper()} document ({document['content_type']}, {document['bytes']} bytes)"
+            else:
+                with metrics.span("extract_text"):
+                    text_url, extraction = extract_text(source_code_url)
+            metrics.add_bytes("extract_text", extraction["bytes_parsed"])
+            if extraction["truncated"] is not None:
+                metrics.count(f"text_truncated_{extraction['truncated']}", host=get_host(url))
+                logger.warning(f"Text of {url} truncated ({extraction['truncated']}): parsed {extraction['bytes_parsed']} "
+                               f"of {extraction['bytes']} bytes.")
+            logger.info(f"Extracted the text from the source code ({extraction['skipped_tags']} boilerplate tags dropped).")
+
+            # Check if there seems to be salary info
+            with metrics.span("check_salary"):
+                salary_flag = check_salary(text_url)
+            logger.info(f"salary_flag: {salary_flag}.")
 
+            # Append salary flag, source code and text to the data of the URL
+            data_given_url += [salary_flag, source_code_url, text_url]
+            logger.info("Salary flag, source code and text for the URL stored.")
+
+        except Exception as e:
+            logger.info(f"Couldn't scrape {url}. Error: {e}.")
+
+            # Append FAILURE to the data of the URL
+            data_given_url.append("FAILURE")
+            data_given_url.append("FAILURE")
+            data_given_url.append("FAILURE")
+            logger.info("FAILURE appended to the data of the URL.")
+
+        # Record the URL in the journal
+        run.journal.set("outbound", data_given_url[0], data_given_url)
+
+        # Upload the source code and text
+        if upload is not None:
+            upload(f"{data_given_url[0]}_source_code.txt", data_given_url[-2], FOLDER_ID_URLS_IN_POSTINGS)
+            upload(f"{data_given_url[0]}_text.txt", data_given_url[-1], FOLDER_ID_URLS_IN_POSTINGS)
+
+    # Scrape the URLs in postings as the postings come (HTTP first, browser only if needed; the fetcher takes care of the retries)
+    # Pages from previous runs come from the local cache (revalidated if stale)
+    # (the cache also keeps the pages fetched before a crash, so a resumed run doesn't request them again)
+    # Pages that need a browser share one driver with the lean profile (the fetcher's default; see browser_profile)
+    url_cache = URLCache()
     try:
-        logger.info(f"Re-try block for data for the postings (Google Drive). Attempt {attempt + 1}.")
-
-        # Authenticate using the service account (for Google Drive, not Sheets)
-        service = build('drive', 'v3', credentials=credentials)
-        logger.info("Created service for Google Drive.")
-                    
-        # Iterate over each of the job posts (list)
-        for element in data_all_postings_job_category:
-            logger.info("Iterating over each of the postings.")
-            # Get the text of the job post
-            text = element[-1]
-            logger.info("Got the text of the post.")
-            # Upload the text to Google Drive
-            upload_file(element[0], "text", text, folder_id, service, logger)
-        logger.info("Wrote new data for the postings (if available) to Google Drive.")
-
-        # Break the loop if successful
-        logger.info("Re-try block for data for the postings successful. About to break the loop.")
-        break
+        OutboundFetcher(retry_policy=retry_policy, cache=url_cache).fetch_stream(iterate_pending_urls(), process_url_in_posting)
+    finally:
+        url_cache.close()
+    logger.info("Scraped the URLs in postings.")
+    metrics.set_info(new_urls_in_postings=n_urls)
 
-    except Exception as e:
-        logger.info(f"Re-try block for data for the postings. Attempt {attempt + 1} failed. Error: {e}.")
+def iterate_files(run, n_urls_in_postings):
+    """
+    Function to get the files of the run for Google Drive: the text of the postings and the source code and text of the URLs in postings
+    (one at a time from the journal, so the memory stays bounded).
 
-        if attempt < RETRIES - 1:
-            logger.info("Re-try block for data for the postings. Sleeping before retry.")
-            sleep(5)
-        else:
-            logger.info("Re-try block for data for the postings. All retries exhausted.")
-            raise
+    Outputs: generator of tuples (file name, content, folder ID)
 
-logger.info("Wrote new data for the postings (if available) to Google Drive.")
+    Dependencies: iterate_urls_in_postings
+    """
+    for data_posting in run.iterate_postings():
+        yield f"{data_posting[0]}_text.txt", data_posting[-1], FOLDER_ID_POSTINGS
 
-# Data for the URLs in postings
+    for data_given_url in iterate_urls_in_postings(run.iterate_postings(), n_urls_in_postings):
+        data_scraped_url = run.journal.get("outbound", data_given_url[0])
+        if data_scraped_url is None:
+            raise RuntimeError(f"Run {run.journal.run_id} didn't scrape the URL {data_given_url[3]} yet. Run the fetch-outbound stage first.")
+        yield f"{data_scraped_url[0]}_source_code.txt", data_scraped_url[-2], FOLDER_ID_URLS_IN_POSTINGS
+        yield f"{data_scraped_url[0]}_text.txt", data_scraped_url[-1], FOLDER_ID_URLS_IN_POSTINGS
 
-# Folder ID
-# https://drive.google.com/drive/u/4/folders/1pyhL4yqRnvGX3MkpsZAuQnlhqddvYXb7
-folder_id = "1pyhL4yqRnvGX3MkpsZAuQnlhqddvYXb7" 
+def publish(run):
+    """
+    Function for the publish stage: uploads the text and source code files that the run didn't upload yet to Google Drive
+    (and the ones that earlier runs couldn't upload), writes the run to the local dataset, appends the rows that it didn't write yet
+    to the Google Sheets and marks the run as finished. Everything comes from the journal, so it can be run on its own.
 
-# Retry block in case of failure
-for attempt in range(RETRIES):
+    Files that can't be uploaded are logged and recorded in the journal, and the run still finishes (so the next run discovers
+    new postings): the next publish retries them, up to MAX_UPLOAD_ATTEMPTS publishes per file.
 
-    try:
-        logger.info(f"Re-try block for data for the URLs in postings (Google Drive). Attempt {attempt + 1}.")
-
-        # Authenticate using the service account (for Google Drive, not Sheets)
-        service = build('drive', 'v3', credentials=credentials)
-        logger.info("Created service for Google Drive.")
-                    
-        # Iterate over each of the job posts (list)
-        for element in data_all_urls_in_postings:
-            logger.info("Iterating over each of the URLs in postings.")
-            # Get the source code of the job post
-            source_code = element[-2]
-            logger.info("Got the source code of the post.")
-            # Get the text of the job post
-            text = element[-1]
-            logger.info("Got the text of the post.")
-            # Upload the source code to Google Drive
-            upload_file(element[0], "source_code", source_code, folder_id, service, logger)
-            # Upload the text to Google Drive
-            upload_file(element[0], "text", text, folder_id, service, logger)
-        logger.info("Wrote new data for the URLs in postings (if available) to Google Drive.")
-
-        # Break the loop if successful
-        logger.info("Re-try block for data for the URLs in postings successful. About to break the loop.")
-        break
+    Outputs: None
 
-    except Exception as e:
-        logger.info(f"Re-try block for data for the URLs in postings. Attempt {attempt + 1} failed. Error: {e}.")
+    Dependencies: iterate_files, iterate_urls_in_postings, from sheets_writer import write_rows
+    """
+    from sheets_writer import write_rows
+
+    n_urls_in_postings = run.get_n_urls_in_postings()
+
+    # Retry the files that earlier publishes couldn't upload
+    earlier_failed_uploads = {(failed["folder_id"], failed["name"]): failed for failed in run.journal.get_failed_uploads()}
+    if len(earlier_failed_uploads) > 0:
+        logger.info(f"Retrying {len(earlier_failed_uploads)} files that couldn't be uploaded to Google Drive before.")
+    for failed in earlier_failed_uploads.values():
+        run.upload(failed["name"], failed["content"], failed["folder_id"])
+
+    # Upload the text of the postings and the source code and text of the URLs in postings
+    for file_name, content, folder_id in iterate_files(run, n_urls_in_postings):
+        run.upload(file_name, content, folder_id)
+
+    # Wait for the uploads to Google Drive
+    upload_results = run.close_uploads()
+    run.journal.remove_failed_uploads([(result["folder_id"], result["name"]) for result in upload_results if result["error"] is None])
+
+    # Record the files that couldn't be uploaded (with their content, from the journal), so that the next publish retries them
+    errors = {(result["folder_id"], result["name"]): result["error"] for result in upload_results if result["error"] is not None}
+    if len(errors) > 0:
+        failed_uploads = {(folder_id, file_name): (folder_id, file_name, failed["content"], errors[(folder_id, file_name)])
+                          for (folder_id, file_name), failed in earlier_failed_uploads.items() if (folder_id, file_name) in errors}
+        failed_uploads.update({(folder_id, file_name): (folder_id, file_name, content, errors[(folder_id, file_name)])
+                               for file_name, content, folder_id in iterate_files(run, n_urls_in_postings) if (folder_id, file_name) in errors})
+        run.journal.add_failed_uploads(list(failed_uploads.values()))
+        metrics.count("drive_failed", len(failed_uploads))
+        logger.error(f"Couldn't upload {len(failed_uploads)} files to Google Drive. The next publish retries them.")
+
+        # Give up on the files that failed too many times
+        given_up = [failed for failed in run.journal.get_failed_uploads() if failed["attempts"] >= MAX_UPLOAD_ATTEMPTS]
+        for failed in given_up:
+            logger.error(f"Giving up on uploading {failed['name']} to Google Drive after {failed['attempts']} attempts. Error: {failed['error']}.")
+        run.journal.remove_failed_uploads([(failed["folder_id"], failed["name"]) for failed in given_up])
+
+    # Lists with the data of all the postings and all the URLs in postings (only the columns for Google Sheets)
+    data_all_postings_job_category = [data_posting[0:4] for data_posting in run.iterate_postings()]
+    data_all_urls_in_postings = [run.journal.get("outbound", data_given_url[0])[:6]
+                                 for data_given_url in iterate_urls_in_postings(run.iterate_postings(), n_urls_in_postings)]
+
+    # Write the rows, text and source code of the run to the local dataset (one part per table; see dataset_store)
+    # The part is replaced if the run is published again
+    dataset = DatasetStore()
+    part = f"run-{run.journal.run_id:06d}"
+    with metrics.span("dataset_write"):
+        dataset.write_part("postings", run.run_date, part, run.iterate_postings())
+        dataset.write_part("urls_in_postings", run.run_date, part,
+                           (run.journal.get("outbound", data_given_url[0]) for data_given_url in iterate_urls_in_postings(run.iterate_postings(), n_urls_in_postings)))
+    logger.info(f"Wrote new data to the local dataset (run date {run.run_date}).")
+
+    # The new rows are written after the rows that each sheet had when the run started, in chunks (each chunk has its own retries)
+    # Each row has a fixed position, so rows already written by this run (if resumed) are skipped and the rest go where they belong
+
+    # Data for the postings
+    # id, url, ts, salary flag
+    # The order of the rows doesn't matter (the ID is in column A), so several chunks are written at the same time
+    write_rows(run.get_credentials(), SPREADSHEET_POSTINGS_ID, "A:D", run.get_n_postings() + 1, data_all_postings_job_category,
+               written=run.journal.get_all("sheet_postings"), ordered=False, retry_policy=retry_policy,
+               on_chunk_written=lambda chunk: run.journal.set_many("sheet_postings", [(row[0], None) for row in chunk]))
+    logger.info("Wrote new data to Google Sheets for the postings.")
+
+    # Data for the URLs in the postings
+    # id, id, url, url, ts, salary flag
+    # The IDs of the URLs are the row numbers, so the chunks are written in order and the first one that fails stops the writing
+    write_rows(run.get_credentials(), SPREADSHEET_URLS_IN_POSTINGS_ID, "A:F", n_urls_in_postings + 1, data_all_urls_in_postings,
+               written=run.journal.get_all("sheet_urls_in_postings"), ordered=True, retry_policy=retry_policy,
+               on_chunk_written=lambda chunk: run.journal.set_many("sheet_urls_in_postings", [(row[0], None) for row in chunk]))
+    logger.info("Wrote new data to Google Sheets for the URLs in postings.")
+
+    # Mark the run as finished in the journal
+    run.journal.finish()
+
+def run_full(run):
+    """
+    Function for the full pipeline. After discover, the stages run at the same time, connected by a bounded queue:
+    1. fetch-topics: the postings are scraped (in parallel with the API) and put in posting_queue, in the same order as the new postings
+    2. fetch-outbound: the URLs in each posting are fetched as soon as the posting is ready (see OutboundFetcher.fetch_stream)
+    3. Google Drive: the text and source code files are uploaded as soon as they're ready (see DriveUploader)
+    Then publish writes the Google Sheets (the files are already uploaded, except the ones that failed, which it retries
+    and records in the journal for the next publish if they fail again).
+    """
+    discover(run)
 
-        if attempt < RETRIES - 1:
-            logger.info("Re-try block for data for the URLs in postings. Sleeping before retry.")
-            sleep(5)
-        else:
-            logger.info("Re-try block for data for the URLs in postings. All retries exhausted.")
-            raise
+    # Queue between the postings and the URLs in postings
+    posting_queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    # Errors in the postings stage (raised at the end)
+    pipeline_errors = []
+
+    def produce_postings():
+        """
+        Function for the postings stage (runs in its own thread): puts the data of each posting in posting_queue and None at the end.
+        """
+        try:
+            fetch_topics(run, on_posting=posting_queue.put)
+        except Exception as e:
+            logger.error(f"Error in the postings stage: {e}.")
+            pipeline_errors.append(e)
+        finally:
+            posting_queue.put(None)
+
+    # Start the postings stage
+    posting_thread = Thread(target=produce_postings, daemon=True)
+    posting_thread.start()
+
+    # Scrape the URLs in postings as the postings come
+    fetch_outbound(run, iter(posting_queue.get, None), upload=run.upload)
+    posting_thread.join()
+    logger.info("Scraped the postings and the URLs in postings.")
+
+    # Wait for the uploads to Google Drive
+    run.close_uploads()
+
+    # Stop if the postings stage failed (the journal keeps what was done)
+    if len(pipeline_errors) > 0:
+        raise pipeline_errors[0]
+
+    publish(run)
+
+# Stages that can be run from the command line: name -> (function, help)
+STAGES = {
+    "discover": (discover, "find the new postings (not in the Google Sheet yet)"),
+    "fetch-topics": (fetch_topics, "scrape the new postings"),
+    "fetch-outbound": (fetch_outbound, "scrape the URLs in the new postings"),
+    "publish": (publish, "upload the files to Google Drive, write the local dataset, append the rows to the Google Sheets and finish the run"),
+    "full": (run_full, "run the whole pipeline (default)"),
+}
+
+def main(argv=None):
+    """
+    Function to run a stage (or the full pipeline) from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Scrape CESNET-D's job postings.")
+    parser.add_argument("--full-rescan", action="store_true", default=FULL_RESCAN,
+                        help="list all the postings instead of stopping at the ones already scraped (discover)")
+    subparsers = parser.add_subparsers(dest="stage", metavar="stage")
+    for name, (_, help) in STAGES.items():
+        subparsers.add_parser(name, help=help)
+    args = parser.parse_args(argv)
+    stage = args.stage or "full"
+
+    # Configure the logging settings
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Logging configured. Current timestamp: {TS}")
+
+    # Write the report of the run (timings, counters, bytes per stage and host) when the script ends, even if it fails
+    atexit.register(metrics.write_report, REPORT_PATH)
+    metrics.set_info(stage=stage)
+
+    run = ScrapeRun(full_rescan=args.full_rescan)
+    try:
+        STAGES[stage][0](run)
+    finally:
+        run.close()
 
-logger.info("Wrote new data for the URLs in postings (if available) to Google Drive.")
+    logger.info(f"Stage {stage} finished.")
 
-logger.info("Script finished.")
+if __name__ == "__main__":
+    main()
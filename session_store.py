@@ -0,0 +1,130 @@
+# Encrypted local store of the Discourse login cookies
+# After a successful login, the cookies are saved so that later runs (and the retries of a run) reuse the session
+# instead of logging in again. The file is encrypted with Fernet (AES + HMAC), with a key from SESSION_STORE_KEY
+# or, if it isn't set, derived from CESNET-D's password (so no new secret is needed).
+
+##################################### Importing libraries #####################################
+import base64
+import json
+import logging
+import os
+import threading
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from settings import STATE_DIR
+
+##################################### Setting parameters #####################################
+
+# Path of the encrypted cookies
+SESSION_PATH = os.path.join(STATE_DIR, 'discourse_session.bin')
+
+# Size of the random salt for deriving the key from a password (stored at the start of the file)
+SALT_SIZE = 16
+
+# Number of iterations of PBKDF2 for deriving the key from a password
+KDF_ITERATIONS = 390000
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes and functions #####################################
+def derive_key(secret, salt):
+    """
+    Function to derive a Fernet key from a secret (e.g., a password) and a salt with PBKDF2-HMAC-SHA256.
+    """
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=KDF_ITERATIONS)
+    return base64.urlsafe_b64encode(kdf.derive(secret.encode('utf-8')))
+
+def cookies_from_requests(cookie_jar):
+    """
+    Function to convert the cookies of a requests session to the format of the store (same keys as Selenium's cookies).
+    """
+    cookies = []
+    for cookie in cookie_jar:
+        stored_cookie = {"name": cookie.name, "value": cookie.value, "domain": cookie.domain, "path": cookie.path, "secure": cookie.secure}
+        if cookie.expires is not None:
+            stored_cookie["expiry"] = int(cookie.expires)
+        cookies.append(stored_cookie)
+    return cookies
+
+def cookies_from_selenium(driver_cookies):
+    """
+    Function to convert the cookies of a Selenium driver (driver.get_cookies()) to the format of the store.
+    """
+    return [{key: cookie[key] for key in ["name", "value", "domain", "path", "secure", "expiry"] if key in cookie}
+            for cookie in driver_cookies]
+
+class SessionStore:
+    """
+    Class for the encrypted file with the login cookies. Thread-safe.
+    load() returns None if there's no file, the key is missing or the file can't be decrypted (e.g., the password changed).
+
+    Usage: store = SessionStore(password=PASSWORD); cookies = store.load(); ...; store.save(cookies)
+    """
+
+    def __init__(self, path=SESSION_PATH, key=None, password=None):
+        self.path = path
+        self.key = key if key is not None else os.getenv('SESSION_STORE_KEY')
+        self.password = password
+        self.lock = threading.Lock()
+
+    def get_fernet(self, salt):
+        """
+        Function to get the cipher for a file with the given salt (None if there's no key or password).
+        """
+        if self.key:
+            return Fernet(self.key)
+        if self.password:
+            return Fernet(derive_key(self.password, salt))
+        return None
+
+    def load(self):
+        """
+        Function to read the cookies.
+
+        Outputs: list of cookies (dicts with name, value, domain, path, secure and, optionally, expiry), or None
+        """
+        with self.lock:
+            if not os.path.exists(self.path):
+                return None
+            with open(self.path, 'rb') as file:
+                data = file.read()
+        fernet = self.get_fernet(data[:SALT_SIZE])
+        if fernet is None:
+            logger.info("Inside SessionStore.load: no key to decrypt the session.")
+            return None
+        try:
+            cookies = json.loads(fernet.decrypt(data[SALT_SIZE:]))
+        except (InvalidToken, ValueError) as e:
+            logger.info(f"Inside SessionStore.load: couldn't decrypt the session. Error: {e!r}.")
+            return None
+        logger.info(f"Inside SessionStore.load: loaded {len(cookies)} cookies.")
+        return cookies
+
+    def save(self, cookies):
+        """
+        Function to encrypt and write the cookies (atomically, so a crash doesn't leave a broken file).
+        """
+        salt = os.urandom(SALT_SIZE)
+        fernet = self.get_fernet(salt)
+        if fernet is None:
+            logger.info("Inside SessionStore.save: no key to encrypt the session. Not saving it.")
+            return
+        data = salt + fernet.encrypt(json.dumps(cookies).encode('utf-8'))
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, 'wb') as file:
+                file.write(data)
+            os.chmod(temporary_path, 0o600)
+            os.replace(temporary_path, self.path)
+        logger.info(f"Inside SessionStore.save: saved {len(cookies)} cookies.")
+
+    def clear(self):
+        """
+        Function to delete the stored session (e.g., when it expired).
+        """
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        logger.info("Inside SessionStore.clear: deleted the session.")
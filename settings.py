@@ -0,0 +1,9 @@
+# Settings shared by several modules
+
+##################################### Importing libraries #####################################
+import os
+
+##################################### Setting parameters #####################################
+
+# Directory for the files that the script keeps between runs (cached in GitHub Actions)
+STATE_DIR = os.getenv('CESNETD_STATE_DIR', '.cesnetd')
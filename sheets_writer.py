@@ -0,0 +1,164 @@
+# Functions to write new rows to Google Sheets
+# The rows are written after the rows that the sheet had when the run started, in chunks that stay under the request size limits.
+# Each chunk goes to an explicit range (values().update, like the original script), so it can be retried on its own without
+# duplicating rows, and a resumed run writes the missing rows exactly where they belong.
+
+##################################### Importing libraries #####################################
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.discovery import build
+from metrics import metrics
+from retry_policy import RetryPolicy
+
+##################################### Setting parameters #####################################
+
+# Maximum size of a chunk (Google recommends keeping requests under 2 MB) and maximum number of rows per chunk
+MAX_CHUNK_BYTES = 1024 * 1024
+MAX_CHUNK_ROWS = 1000
+
+# Number of chunks written at the same time (when the order of the rows doesn't matter)
+SHEETS_WRITE_WORKERS = 4
+
+# Host of the Google Sheets API (for the circuit breaker of the retry policy)
+SHEETS_HOST = "sheets.googleapis.com"
+
+logger = logging.getLogger(__name__)
+
+##################################### Define functions #####################################
+def chunk_rows(rows, max_bytes=MAX_CHUNK_BYTES, max_rows=MAX_CHUNK_ROWS):
+    """
+    Function to split rows into chunks of at most max_rows rows and (roughly) max_bytes bytes of JSON.
+    A single row bigger than max_bytes gets its own chunk.
+
+    Inputs:
+    - rows: list of rows (lists of values)
+    - max_bytes: maximum size of a chunk
+    - max_rows: maximum number of rows of a chunk
+
+    Outputs: list of chunks (lists of rows)
+
+    Dependencies: json
+    """
+    chunks = []
+    chunk = []
+    chunk_bytes = 0
+    for row in rows:
+        row_bytes = len(json.dumps(row, default=str).encode('utf-8'))
+        if len(chunk) > 0 and (chunk_bytes + row_bytes > max_bytes or len(chunk) >= max_rows):
+            chunks.append(chunk)
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(row)
+        chunk_bytes += row_bytes
+    if len(chunk) > 0:
+        chunks.append(chunk)
+    return chunks
+
+def get_row_range(range_columns, first_row, n_rows):
+    """
+    Function to get the range of n_rows rows starting at first_row (e.g., "A:D", 11, 5 -> "A11:D15").
+    """
+    first_column, last_column = range_columns.split(":")
+    return f"{first_column}{first_row}:{last_column}{first_row + n_rows - 1}"
+
+def get_pending_chunks(rows, first_row, written=(), max_bytes=MAX_CHUNK_BYTES, max_rows=MAX_CHUNK_ROWS):
+    """
+    Function to split the rows that aren't written yet into chunks of consecutive rows (see chunk_rows).
+    Row i of rows goes to row first_row + i of the sheet, so a chunk never spans a row that is already written.
+
+    Inputs:
+    - rows: list of rows (lists of values; the first value is the ID)
+    - first_row: row of the sheet of the first row (1-based)
+    - written: IDs (as strings) of the rows already written, which are skipped
+
+    Outputs: list of tuples (row of the sheet of the first row of the chunk, chunk)
+
+    Dependencies: chunk_rows
+    """
+    chunks = []
+    segment_start = None
+    for i, row in enumerate(rows + [None]):
+        pending = row is not None and str(row[0]) not in written
+        if pending and segment_start is None:
+            segment_start = i
+        elif not pending and segment_start is not None:
+            offset = segment_start
+            for chunk in chunk_rows(rows[segment_start:i], max_bytes, max_rows):
+                chunks.append((first_row + offset, chunk))
+                offset += len(chunk)
+            segment_start = None
+    return chunks
+
+def write_rows(credentials, spreadsheet_id, range_columns, first_row, rows, written=(), ordered=True, workers=SHEETS_WRITE_WORKERS,
+               retry_policy=None, on_chunk_written=None, max_bytes=MAX_CHUNK_BYTES, max_rows=MAX_CHUNK_ROWS):
+    """
+    Function to write new rows at a known position of a Google Sheet (after the rows it had when the run started), in chunks.
+    Each chunk is written with values().update to its explicit range, so retrying a chunk (e.g., after a timeout
+    that did go through) writes the same cells again instead of adding the rows twice.
+
+    Inputs:
+    - credentials: credentials of the service account
+    - spreadsheet_id: ID of the Google Sheet
+    - range_columns: columns of the table (e.g., "A:D")
+    - first_row: row of the sheet of the first row (1-based; the number of rows of the sheet before the run, plus one)
+    - rows: list of all the rows of the run (lists of values; the first value is the ID), in order
+    - written: IDs (as strings) of the rows already written (e.g., by the same run before it was resumed)
+    - ordered: if True, the chunks are written one after the other and the first chunk that fails stops the writing
+      (the rows after it stay unwritten, so the sheet never has rows after a gap);
+      if False, several chunks are written at the same time and all of them are tried
+    - workers: number of chunks at the same time if ordered is False
+    - retry_policy: retry_policy.RetryPolicy for each chunk (a default one if None)
+    - on_chunk_written: function called with each chunk (list of rows) once it's written (e.g., to record it in the run journal)
+    - max_bytes, max_rows: maximum size and number of rows of a chunk (see chunk_rows)
+
+    Outputs: None. Raises an error if any chunk couldn't be written after all the retries.
+
+    Dependencies: get_pending_chunks, get_row_range, from googleapiclient.discovery import build, from retry_policy import RetryPolicy
+    """
+    retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+
+    # Split the rows that aren't written yet into chunks
+    chunks = get_pending_chunks(rows, first_row, written, max_bytes, max_rows)
+    logger.info(f"Inside write_rows: {sum(len(chunk) for _, chunk in chunks)} rows to write in {len(chunks)} chunks "
+                f"for spreadsheet {spreadsheet_id}, from row {first_row}.")
+
+    # The Google API client isn't thread-safe, so each thread builds its own service
+    thread_data = threading.local()
+
+    def write(chunk_start, chunk):
+        if not hasattr(thread_data, "service"):
+            thread_data.service = build("sheets", "v4", credentials=credentials, cache_discovery=False)
+
+        request = thread_data.service.spreadsheets().values().update(
+            spreadsheetId=spreadsheet_id,
+            range=get_row_range(range_columns, chunk_start, len(chunk)),
+            valueInputOption="USER_ENTERED",
+            body={"values": chunk}
+            )
+        with metrics.span("sheets_write"):
+            retry_policy.call(request.execute, description=f"a chunk of {len(chunk)} rows", host=SHEETS_HOST)
+        metrics.count("sheets_rows_written", len(chunk))
+        logger.info(f"Inside write_rows: wrote a chunk of {len(chunk)} rows from row {chunk_start}.")
+
+        # Outside the re-try block, so that an error here doesn't make the chunk be written again
+        if on_chunk_written is not None:
+            on_chunk_written(chunk)
+
+    # Write the chunks
+    if ordered:
+        for n_chunk, (chunk_start, chunk) in enumerate(chunks):
+            try:
+                write(chunk_start, chunk)
+            except Exception as e:
+                raise RuntimeError(f"Couldn't write chunk {n_chunk + 1} of {len(chunks)} (from row {chunk_start}) to spreadsheet "
+                                   f"{spreadsheet_id}. The chunks after it weren't written. Error: {e}") from e
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(write, chunk_start, chunk) for chunk_start, chunk in chunks]
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if len(errors) > 0:
+            raise RuntimeError(f"Couldn't write {len(errors)} of {len(chunks)} chunks to spreadsheet {spreadsheet_id}. Last error: {errors[-1]}")
+
+    logger.info(f"Inside write_rows: wrote the new rows to spreadsheet {spreadsheet_id}.")
@@ -0,0 +1,14 @@
+# Configuration of the tests
+# The modules of the script are at the root of the repo (not a package), so the root is added to the import path
+
+##################################### Importing libraries #####################################
+import os
+import sys
+
+##################################### Setting parameters #####################################
+
+# Root of the repo
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
@@ -0,0 +1,74 @@
+# Tests for the politeness scheduler of the outbound fetches (host_scheduler.TokenBucket and HostScheduler)
+
+##################################### Importing libraries #####################################
+import asyncio
+from time import monotonic
+from host_scheduler import HostScheduler, TokenBucket
+
+##################################### Define tests #####################################
+def test_token_bucket_spaces_requests_by_the_delay():
+    async def acquire_three():
+        bucket = TokenBucket(0.05)
+        start = monotonic()
+        times = []
+        for _ in range(3):
+            await bucket.acquire()
+            times.append(monotonic() - start)
+        return times
+
+    times = asyncio.run(acquire_three())
+    assert times[0] < 0.03
+    assert times[1] >= 0.045
+    assert times[2] >= 0.095
+
+def test_token_bucket_burst():
+    async def acquire_burst():
+        bucket = TokenBucket(1, burst=3)
+        return [await bucket.acquire() for _ in range(3)]
+
+    assert asyncio.run(acquire_burst()) == [0, 0, 0]
+
+def test_token_bucket_without_delay():
+    assert asyncio.run(TokenBucket(0).acquire()) == 0
+
+def test_scheduler_round_robin_across_hosts():
+    scheduler = HostScheduler(max_per_host=10, read_robots=False)
+    for url in ["https://a.example.com/1", "https://a.example.com/2", "https://a.example.com/3",
+                "https://b.example.com/1", "https://c.example.com/1"]:
+        scheduler.add(url, url)
+    assert scheduler.n_queued == 5
+
+    popped = [scheduler.pop()[1] for _ in range(5)]
+    assert popped == ["https://a.example.com/1", "https://b.example.com/1", "https://c.example.com/1",
+                      "https://a.example.com/2", "https://a.example.com/3"]
+    assert scheduler.n_queued == 0
+    assert scheduler.pop() is None
+
+def test_scheduler_limits_items_in_progress_per_host():
+    scheduler = HostScheduler(max_per_host=1, read_robots=False)
+    for url in ["https://a.example.com/1", "https://a.example.com/2", "https://b.example.com/1"]:
+        scheduler.add(url, url)
+
+    assert scheduler.pop() == ("a.example.com", "https://a.example.com/1")
+    assert scheduler.pop() == ("b.example.com", "https://b.example.com/1")
+    assert not scheduler.has_ready()
+    assert scheduler.pop() is None
+
+    scheduler.release("a.example.com")
+    assert scheduler.has_ready()
+    assert scheduler.pop() == ("a.example.com", "https://a.example.com/2")
+
+def test_scheduler_crawl_delay_is_per_host():
+    async def acquire_all():
+        scheduler = HostScheduler(max_per_host=10, crawl_delay=0.2, read_robots=False)
+        start = monotonic()
+        await scheduler.acquire("https://a.example.com/1")
+        await scheduler.acquire("https://b.example.com/1")
+        different_hosts = monotonic() - start
+        await scheduler.acquire("https://a.example.com/2")
+        same_host = monotonic() - start
+        return different_hosts, same_host
+
+    different_hosts, same_host = asyncio.run(acquire_all())
+    assert different_hosts < 0.1
+    assert same_host >= 0.15
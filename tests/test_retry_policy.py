@@ -0,0 +1,109 @@
+# Tests for the error classification of the retry policy (retry_policy.is_permanent and is_host_failure)
+
+##################################### Importing libraries #####################################
+import socket
+import pytest
+import requests
+from retry_policy import CircuitOpenError, PermanentError, RetryPolicy, get_retry_after, is_host_failure, is_permanent
+
+##################################### Define functions #####################################
+def http_error(status_code, message="", headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return requests.HTTPError(message, response=response)
+
+def dns_error():
+    try:
+        try:
+            raise socket.gaierror(-2, "Name or service not known")
+        except socket.gaierror as e:
+            raise requests.ConnectionError("Max retries exceeded") from e
+    except requests.ConnectionError as e:
+        return e
+
+##################################### Define tests #####################################
+@pytest.mark.parametrize("status_code", [400, 404, 410, 451, 501, 418])
+def test_dead_urls_are_permanent(status_code):
+    assert is_permanent(http_error(status_code))
+
+@pytest.mark.parametrize("status_code", [408, 429, 500, 502, 503, 504])
+def test_server_errors_and_rate_limits_are_transient(status_code):
+    assert not is_permanent(http_error(status_code))
+
+def test_google_403_is_transient_only_for_rate_limits():
+    assert not is_permanent(http_error(403, "User Rate Limit Exceeded: rateLimitExceeded"))
+    assert is_permanent(http_error(403, "The caller does not have permission"))
+
+def test_permanent_errors_without_status_code():
+    assert is_permanent(PermanentError("checked"))
+    assert is_permanent(CircuitOpenError("open"))
+    assert is_permanent(dns_error())
+    assert is_permanent(requests.exceptions.MissingSchema("no scheme"))
+    assert is_permanent(Exception("unknown error: net::ERR_NAME_NOT_RESOLVED"))
+
+def test_unknown_errors_are_retried():
+    assert not is_permanent(requests.ConnectionError("Connection reset by peer"))
+    assert not is_permanent(ValueError("something else"))
+
+def test_host_failures_are_connection_errors_timeouts_and_server_errors():
+    assert is_host_failure(http_error(503))
+    assert is_host_failure(http_error(429))
+    assert is_host_failure(requests.ConnectionError("Connection refused"))
+    assert is_host_failure(requests.Timeout("Read timed out"))
+    assert is_host_failure(socket.timeout("timed out"))
+    assert is_host_failure(Exception("unknown error: net::ERR_CONNECTION_REFUSED"))
+
+def test_other_errors_are_not_host_failures():
+    assert not is_host_failure(http_error(404))
+    assert not is_host_failure(http_error(403))
+    assert not is_host_failure(PermanentError("Unsupported Content-Type image/png"))
+    assert not is_host_failure(CircuitOpenError("open"))
+    assert not is_host_failure(KeyError("bug"))
+    assert not is_host_failure(ValueError("bug"))
+
+def test_retry_after_in_seconds_and_as_date():
+    assert get_retry_after(http_error(503, headers={"Retry-After": "7"})) == 7.0
+    assert get_retry_after(http_error(503, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert get_retry_after(http_error(503)) is None
+
+def test_call_retries_transient_errors_and_not_permanent_ones():
+    policy = RetryPolicy(retries=3, base_delay=0.001, max_delay=0.001)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise http_error(503)
+        return "ok"
+
+    assert policy.call(flaky, description="flaky") == "ok"
+    assert len(calls) == 3
+
+    calls.clear()
+
+    def dead():
+        calls.append(1)
+        raise http_error(404)
+
+    with pytest.raises(requests.HTTPError):
+        policy.call(dead, description="dead")
+    assert len(calls) == 1
+
+def test_circuit_opens_after_host_failures_only():
+    policy = RetryPolicy(retries=1, failure_threshold=2, reset_timeout=60)
+
+    def not_found():
+        raise http_error(404)
+
+    def down():
+        raise requests.ConnectionError("Connection refused")
+
+    for _ in range(3):
+        with pytest.raises(requests.HTTPError):
+            policy.call(not_found, description="not found", host="example.com")
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            policy.call(down, description="down", host="example.com")
+    with pytest.raises(CircuitOpenError):
+        policy.call(down, description="down", host="example.com")
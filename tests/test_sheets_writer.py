@@ -0,0 +1,124 @@
+# Tests for the chunked writes to Google Sheets (sheets_writer), with a fake Sheets service
+
+##################################### Importing libraries #####################################
+import threading
+import pytest
+import sheets_writer
+from retry_policy import RetryPolicy
+from sheets_writer import chunk_rows, get_pending_chunks, get_row_range, write_rows
+
+##################################### Define classes and functions #####################################
+class FakeSheetsService:
+    """
+    Class for a fake Sheets service: records the ranges written (in order) and fails the ranges in failing_ranges.
+    """
+
+    def __init__(self, failing_ranges=()):
+        self.failing_ranges = set(failing_ranges)
+        self.lock = threading.Lock()
+        self.writes = []
+        self.cells = {}
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def update(self, spreadsheetId, range, valueInputOption, body):
+        return FakeRequest(self, range, body["values"])
+
+class FakeRequest:
+    """
+    Class for a request of the fake Sheets service.
+    """
+
+    def __init__(self, service, range_sheet, values):
+        self.service = service
+        self.range_sheet = range_sheet
+        self.values = values
+
+    def execute(self):
+        with self.service.lock:
+            self.service.writes.append(self.range_sheet)
+            if self.range_sheet in self.service.failing_ranges:
+                raise ValueError(f"Can't write {self.range_sheet}")
+            first_row = int(self.range_sheet.split(":")[0][1:])
+            for i, row in enumerate(self.values):
+                self.service.cells[first_row + i] = row
+        return {"updatedRange": self.range_sheet}
+
+@pytest.fixture
+def fake_service(monkeypatch):
+    service = FakeSheetsService()
+    monkeypatch.setattr(sheets_writer, "build", lambda *args, **kwargs: service)
+    return service
+
+def make_rows(n_rows):
+    return [[i, f"https://example.com/{i}"] for i in range(1, n_rows + 1)]
+
+##################################### Define tests #####################################
+def test_chunk_rows_by_number_of_rows():
+    assert [len(chunk) for chunk in chunk_rows(make_rows(7), max_rows=3)] == [3, 3, 1]
+
+def test_chunk_rows_by_size():
+    rows = [["x" * 100] for _ in range(5)]
+    chunks = chunk_rows(rows, max_bytes=250)
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [row for chunk in chunks for row in chunk] == rows
+
+def test_chunk_rows_gives_a_big_row_its_own_chunk():
+    rows = [["a"], ["x" * 1000], ["b"]]
+    assert chunk_rows(rows, max_bytes=100) == [[["a"]], [["x" * 1000]], [["b"]]]
+
+def test_get_row_range():
+    assert get_row_range("A:F", 11, 5) == "A11:F15"
+    assert get_row_range("A:D", 2, 1) == "A2:D2"
+
+def test_get_pending_chunks_skips_written_rows_and_keeps_positions():
+    chunks = get_pending_chunks(make_rows(7), 11, written={"2", "5"}, max_rows=2)
+    assert [(start, [row[0] for row in chunk]) for start, chunk in chunks] == [(11, [1]), (13, [3, 4]), (16, [6, 7])]
+
+def test_write_rows_writes_each_row_at_its_position(fake_service):
+    rows = make_rows(5)
+    written = []
+    write_rows(None, "sheet", "A:B", 11, rows, written={"3"}, max_rows=2, on_chunk_written=written.extend)
+    assert fake_service.writes == ["A11:B12", "A14:B15"]
+    assert fake_service.cells == {11: rows[0], 12: rows[1], 14: rows[3], 15: rows[4]}
+    assert written == [rows[0], rows[1], rows[3], rows[4]]
+
+def test_write_rows_ordered_stops_at_the_first_failure(monkeypatch):
+    service = FakeSheetsService(failing_ranges={"A3:B4"})
+    monkeypatch.setattr(sheets_writer, "build", lambda *args, **kwargs: service)
+    written = []
+    with pytest.raises(RuntimeError, match="chunk 2 of 3"):
+        write_rows(None, "sheet", "A:B", 1, make_rows(6), max_rows=2, retry_policy=RetryPolicy(retries=1),
+                   on_chunk_written=written.extend)
+    assert service.writes == ["A1:B2", "A3:B4"]
+    assert [row[0] for row in written] == [1, 2]
+
+def test_write_rows_unordered_tries_every_chunk(monkeypatch):
+    service = FakeSheetsService(failing_ranges={"A3:B4"})
+    monkeypatch.setattr(sheets_writer, "build", lambda *args, **kwargs: service)
+    written = []
+    with pytest.raises(RuntimeError, match="1 of 3 chunks"):
+        write_rows(None, "sheet", "A:B", 1, make_rows(6), ordered=False, max_rows=2, retry_policy=RetryPolicy(retries=1),
+                   on_chunk_written=written.extend)
+    assert sorted(service.writes) == ["A1:B2", "A3:B4", "A5:B6"]
+    assert sorted(row[0] for row in written) == [1, 2, 5, 6]
+
+def test_write_rows_retries_a_chunk_at_the_same_range(monkeypatch):
+    service = FakeSheetsService(failing_ranges={"A1:B2"})
+    original_execute = FakeRequest.execute
+
+    def execute_once_failing(request):
+        try:
+            return original_execute(request)
+        finally:
+            service.failing_ranges.clear()
+
+    monkeypatch.setattr(FakeRequest, "execute", execute_once_failing)
+    monkeypatch.setattr(sheets_writer, "build", lambda *args, **kwargs: service)
+    write_rows(None, "sheet", "A:B", 1, make_rows(2), retry_policy=RetryPolicy(retries=2, base_delay=0.01))
+    assert service.writes == ["A1:B2", "A1:B2"]
+    assert len(service.cells) == 2
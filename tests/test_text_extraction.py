@@ -0,0 +1,42 @@
+# Tests for the text extraction of the outbound pages and its caps (text_extraction.extract_text)
+
+##################################### Importing libraries #####################################
+from text_extraction import extract_text
+
+##################################### Define tests #####################################
+def test_extract_text_drops_boilerplate():
+    html = ("<html><head><style>p {color: red}</style><script>var x = 1;</script></head><body>"
+            "<nav><a href='/'>Home</a></nav><h1>Assistant Professor</h1>"
+            "<p>\n  Salary: $70,000 </p><footer>Copyright</footer></body></html>")
+    text, info = extract_text(html)
+    assert text == "Assistant Professor Salary: $70,000"
+    assert info["truncated"] is None
+    assert info["skipped_tags"] == 4
+    assert info["bytes_parsed"] == info["bytes"] == len(html.encode("utf-8"))
+
+def test_extract_text_byte_cap():
+    html = "<p>" + "word " * 10000 + "</p><p>END</p>"
+    text, info = extract_text(html, max_bytes=1000)
+    assert info["truncated"] == "bytes"
+    assert info["bytes_parsed"] <= 1000
+    assert "END" not in text
+    assert text.startswith("word word")
+
+def test_extract_text_byte_cap_counts_utf8_bytes():
+    html = "<p>" + "é" * 5000 + "</p>"
+    _, info = extract_text(html, max_bytes=1000)
+    assert info["truncated"] == "bytes"
+    assert info["bytes_parsed"] <= 1000
+
+def test_extract_text_time_cap():
+    html = "<p>" + "word " * 100000 + "</p><p>END</p>"
+    text, info = extract_text(html, max_seconds=0)
+    assert info["truncated"] == "time"
+    assert 0 < info["bytes_parsed"] < info["bytes"]
+    assert "END" not in text
+
+def test_extract_text_skips_binary_sources():
+    text, info = extract_text("%PDF-1.4\n1 0 obj\n<< /Type /Catalog >>\nendobj\n")
+    assert text == ""
+    assert info["truncated"] == "binary"
+    assert info["bytes_parsed"] == 0
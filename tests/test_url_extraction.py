@@ -0,0 +1,58 @@
+# Tests for the canonicalization and deduplication of the URLs in the postings (url_extraction, url_cache.normalize_url)
+
+##################################### Importing libraries #####################################
+from url_cache import normalize_url
+from url_extraction import canonicalize_url, dedupe_urls, extract_urls_from_html, get_dedupe_key
+
+##################################### Setting parameters #####################################
+
+FORUM_URL = "https://cesnet.discourse.group/"
+
+##################################### Define tests #####################################
+def test_canonicalize_url_lowercases_and_drops_default_port_and_fragment():
+    assert canonicalize_url("HTTPS://Jobs.Example.com:443/Careers/Job?id=1#apply") == "https://jobs.example.com/Careers/Job?id=1"
+
+def test_canonicalize_url_keeps_other_ports_and_adds_empty_path():
+    assert canonicalize_url("http://example.com:8080") == "http://example.com:8080/"
+
+def test_canonicalize_url_drops_tracking_parameters_only():
+    url = "https://example.com/job?utm_source=x&id=7&fbclid=abc&page=2&UTM_medium=y"
+    assert canonicalize_url(url) == "https://example.com/job?id=7&page=2"
+
+def test_canonicalize_url_unwraps_redirectors():
+    url = "https://www.google.com/url?q=https%3A%2F%2Fjobs.example.com%2Fposition%3Fid%3D3%26utm_source%3Dgoogle&sa=D"
+    assert canonicalize_url(url) == "https://jobs.example.com/position?id=3"
+    url = "https://cesnet.discourse.group/clicks/track?url=https%3A%2F%2Fexample.edu%2Fjob"
+    assert canonicalize_url(url) == "https://example.edu/job"
+
+def test_canonicalize_url_rejects_other_schemes():
+    assert canonicalize_url("mailto:someone@example.com") is None
+    assert canonicalize_url("ftp://example.com/file") is None
+    assert canonicalize_url("https://") is None
+
+def test_dedupe_key_matches_variants_of_the_same_page():
+    key = get_dedupe_key("https://example.com/a%20b/?x=1")
+    assert get_dedupe_key("http://example.com/a b?x=1") == key
+    assert get_dedupe_key("https://example.com/a%20b?x=1") == key
+    assert get_dedupe_key("https://example.com/a%20b?x=2") != key
+
+def test_dedupe_urls_keeps_first_occurrence_and_prefers_https():
+    urls = ["http://example.com/job", "https://example.com/job/", "https://other.example.com/", "https://example.com/job#apply"]
+    assert dedupe_urls(urls) == ["https://example.com/job/", "https://other.example.com/"]
+
+def test_extract_urls_from_html_drops_forum_navigation_and_keeps_uploads():
+    html = ('<p>See <a href="/t/other-topic/12">this</a>, <a href="/u/someone">@someone</a>, <a href="/c/jobs/5">jobs</a>, '
+            '<a href="/tag/faculty">#faculty</a> and <a href="#heading">below</a>.</p>'
+            '<p><a href="/uploads/short-url/abc.pdf">Position description</a></p>'
+            '<p>Apply at https://jobs.example.edu/123?utm_campaign=x. Or <a href="https://jobs.example.edu/123">here</a>.</p>')
+    assert extract_urls_from_html(html, FORUM_URL) == ["https://cesnet.discourse.group/uploads/short-url/abc.pdf",
+                                                      "https://jobs.example.edu/123"]
+
+def test_extract_urls_from_html_strips_trailing_punctuation():
+    html = "<p>Details (https://en.wikipedia.org/wiki/Counseling_(disambiguation)) and https://example.com/job.</p>"
+    assert extract_urls_from_html(html, FORUM_URL) == ["https://en.wikipedia.org/wiki/Counseling_(disambiguation)",
+                                                      "https://example.com/job"]
+
+def test_normalize_url_for_the_cache():
+    assert normalize_url(" HTTP://Example.COM:80?b=2#top ") == "http://example.com/?b=2"
+    assert normalize_url("https://example.com:8443/a") == "https://example.com:8443/a"
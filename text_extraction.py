@@ -0,0 +1,235 @@
+# Text extraction for the outbound pages, with caps
+# The source code is parsed incrementally (html.parser, no tree is built) in chunks, and the content of boilerplate tags
+# (scripts, styles, navigation, footers, etc.) is dropped as it's parsed. Each page has a byte cap and a time cap:
+# once one is hit, the text extracted so far is kept and the rest of the page is skipped. Sources that aren't HTML
+# (e.g., PDFs served as text/html) are skipped altogether. What was cut is returned with the text, so it can be reported.
+# PDF and DOCX documents (see outbound_fetcher) have their own extractors, with the same caps: PDFs page by page with pypdf,
+# DOCX files by streaming the XML of the body out of the ZIP archive.
+# Note: this replaces shared_scripts' text_extractor for the outbound pages, and the text has a different format: the pieces
+# of text are stripped and joined with single spaces (no line breaks), and the text of navigation menus, footers, iframes
+# and SVGs isn't included. The text files uploaded to Google Drive (and the salary flag, which is checked on this text) can
+# differ from the ones of earlier runs for the same page.
+
+##################################### Importing libraries #####################################
+import os
+import re
+import time
+import zipfile
+from html.parser import HTMLParser
+from xml.etree.ElementTree import XMLPullParser
+
+##################################### Setting parameters #####################################
+
+# Maximum number of bytes (UTF-8) of source code parsed per page
+MAX_DOCUMENT_BYTES = int(os.getenv('MAX_DOCUMENT_BYTES', str(2 * 1024 * 1024)))
+
+# Maximum time (in seconds) spent parsing each page
+MAX_EXTRACTION_SECONDS = float(os.getenv('MAX_EXTRACTION_SECONDS', '5'))
+
+# Number of characters fed to the parser at a time (the caps are checked after each chunk)
+CHUNK_SIZE = 64 * 1024
+
+# Tags whose content isn't part of the text
+BOILERPLATE_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "footer", "iframe", "object"}
+
+# Beginning of the source code checked to tell whether it's binary (control characters or a known signature)
+SNIFF_SIZE = 1024
+BINARY_SIGNATURES = ("%PDF-", "PK\x03\x04", "\xd0\xcf\x11\xe0")
+CONTROL_CHARACTERS = re.compile(r"[\x00-\x08\x0e-\x1a]")
+
+# Maximum number of pages of a PDF whose text is extracted
+MAX_PDF_PAGES = 100
+
+# Part of a DOCX file with the body of the document, and the XML namespace of its elements
+DOCX_BODY = "word/document.xml"
+DOCX_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+##################################### Define classes and functions #####################################
+class TextParser(HTMLParser):
+    """
+    Class to collect the text of an HTML document as it's fed, skipping the content of BOILERPLATE_TAGS.
+    The pieces of text are stripped and joined with spaces, like BeautifulSoup's get_text(" ", strip=True).
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.pieces = []
+        self.skipping = []
+        self.n_skipped_tags = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in BOILERPLATE_TAGS:
+            self.skipping.append(tag)
+            self.n_skipped_tags += 1
+
+    def handle_endtag(self, tag):
+        # Close the skipped tag (and any skipped tags left open inside it)
+        if tag in self.skipping:
+            while self.skipping.pop() != tag:
+                pass
+
+    def handle_data(self, data):
+        if len(self.skipping) == 0:
+            data = data.strip()
+            if data:
+                self.pieces.append(data)
+
+    def get_text(self):
+        return " ".join(self.pieces)
+
+def looks_binary(source_code):
+    """
+    Function to check whether a source code is actually a binary file (e.g., a PDF decoded as text).
+    """
+    start = source_code[:SNIFF_SIZE]
+    return start.lstrip().startswith(BINARY_SIGNATURES) or len(CONTROL_CHARACTERS.findall(start)) > len(start) // 100
+
+def extract_text(source_code, max_bytes=MAX_DOCUMENT_BYTES, max_seconds=MAX_EXTRACTION_SECONDS):
+    """
+    Function to extract the text of a page within the byte and time caps.
+
+    Inputs:
+    - source_code: source code of the page
+    - max_bytes: maximum number of bytes of source code parsed
+    - max_seconds: maximum time parsing
+
+    Outputs: tuple (text, extraction info); the extraction info is a dict with
+    - bytes: size of the source code (bytes)
+    - bytes_parsed: bytes of source code parsed
+    - truncated: None if the whole page was parsed, "bytes" or "time" if a cap was hit, "binary" if it wasn't parsed
+    - skipped_tags: number of boilerplate tags dropped
+
+    Dependencies: TextParser, looks_binary
+    """
+    n_bytes = len(source_code.encode('utf-8'))
+    info = {"bytes": n_bytes, "bytes_parsed": 0, "truncated": None, "skipped_tags": 0}
+    if looks_binary(source_code):
+        info["truncated"] = "binary"
+        return "", info
+
+    parser = TextParser()
+    deadline = time.perf_counter() + max_seconds
+    for start in range(0, len(source_code), CHUNK_SIZE):
+        chunk = source_code[start:start + CHUNK_SIZE]
+        chunk_bytes = len(chunk.encode('utf-8'))
+
+        # Byte cap: parse the part of the chunk that fits (a character cut in half at the end is dropped)
+        if info["bytes_parsed"] + chunk_bytes > max_bytes:
+            chunk = chunk.encode('utf-8')[:max(0, max_bytes - info["bytes_parsed"])].decode('utf-8', errors='ignore')
+            chunk_bytes = len(chunk.encode('utf-8'))
+            info["truncated"] = "bytes"
+        parser.feed(chunk)
+        info["bytes_parsed"] += chunk_bytes
+
+        if info["truncated"] is not None:
+            break
+        if time.perf_counter() > deadline and start + CHUNK_SIZE < len(source_code):
+            info["truncated"] = "time"
+            break
+
+    # Flush the text left in the parser (only if the whole page was parsed; otherwise it may be half a tag)
+    if info["truncated"] is None:
+        parser.close()
+    info["skipped_tags"] = parser.n_skipped_tags
+    return parser.get_text(), info
+
+def extract_pdf_text(file, max_seconds=MAX_EXTRACTION_SECONDS, max_pages=MAX_PDF_PAGES):
+    """
+    Function to extract the text of a PDF, page by page, within the time and page caps.
+
+    Inputs:
+    - file: binary file object with the PDF (seekable)
+    - max_seconds: maximum time extracting
+    - max_pages: maximum number of pages
+
+    Outputs: tuple (text, extraction info like the one of extract_text, plus the number of pages)
+
+    Dependencies: from pypdf import PdfReader
+    """
+    from pypdf import PdfReader
+    file.seek(0, os.SEEK_END)
+    info = {"bytes": file.tell(), "bytes_parsed": file.tell(), "truncated": None, "skipped_tags": 0, "pages": 0}
+    file.seek(0)
+
+    reader = PdfReader(file)
+    if reader.is_encrypted:
+        # Most "protected" job descriptions only restrict printing or copying and open with an empty password
+        reader.decrypt("")
+    deadline = time.perf_counter() + max_seconds
+    pages = []
+    for n_page, page in enumerate(reader.pages):
+        if n_page >= max_pages:
+            info["truncated"] = "pages"
+            break
+        if time.perf_counter() > deadline:
+            info["truncated"] = "time"
+            break
+        pages.append((page.extract_text() or "").strip())
+        info["pages"] += 1
+    return "\n".join(page for page in pages if page), info
+
+def extract_docx_text(file, max_bytes=MAX_DOCUMENT_BYTES, max_seconds=MAX_EXTRACTION_SECONDS):
+    """
+    Function to extract the text of a DOCX file (one line per paragraph), within the byte and time caps.
+    The XML of the body is streamed out of the archive, so the byte cap applies to the uncompressed XML.
+
+    Inputs:
+    - file: binary file object with the DOCX file (seekable)
+    - max_bytes: maximum number of bytes of XML parsed
+    - max_seconds: maximum time extracting
+
+    Outputs: tuple (text, extraction info like the one of extract_text)
+
+    Dependencies: zipfile, from xml.etree.ElementTree import XMLPullParser
+    """
+    with zipfile.ZipFile(file) as archive:
+        info = {"bytes": archive.getinfo(DOCX_BODY).file_size, "bytes_parsed": 0, "truncated": None, "skipped_tags": 0}
+        parser = XMLPullParser(events=("end",))
+        paragraphs = []
+        pieces = []
+        deadline = time.perf_counter() + max_seconds
+        with archive.open(DOCX_BODY) as body:
+            while True:
+                chunk = body.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if info["bytes_parsed"] + len(chunk) > max_bytes:
+                    chunk = chunk[:max(0, max_bytes - info["bytes_parsed"])]
+                    info["truncated"] = "bytes"
+                parser.feed(chunk)
+                info["bytes_parsed"] += len(chunk)
+
+                # Text runs, tabs and line breaks; a paragraph ends a line
+                for _, element in parser.read_events():
+                    if element.tag == f"{DOCX_NAMESPACE}t":
+                        pieces.append(element.text or "")
+                    elif element.tag == f"{DOCX_NAMESPACE}tab":
+                        pieces.append("\t")
+                    elif element.tag in (f"{DOCX_NAMESPACE}br", f"{DOCX_NAMESPACE}cr"):
+                        pieces.append("\n")
+                    elif element.tag == f"{DOCX_NAMESPACE}p":
+                        paragraphs.append("".join(pieces).strip())
+                        pieces = []
+                        element.clear()
+
+                if info["truncated"] is not None:
+                    break
+                if time.perf_counter() > deadline:
+                    info["truncated"] = "time"
+                    break
+    paragraphs.append("".join(pieces).strip())
+    return "\n".join(paragraph for paragraph in paragraphs if paragraph), info
+
+def extract_document_text(file, kind, max_bytes=MAX_DOCUMENT_BYTES, max_seconds=MAX_EXTRACTION_SECONDS):
+    """
+    Function to extract the text of a document with the extractor of its kind ("pdf" or "docx").
+
+    Outputs: tuple (text, extraction info)
+
+    Dependencies: extract_pdf_text, extract_docx_text
+    """
+    if kind == "pdf":
+        return extract_pdf_text(file, max_seconds)
+    if kind == "docx":
+        return extract_docx_text(file, max_bytes, max_seconds)
+    raise ValueError(f"Unknown kind of document {kind}.")
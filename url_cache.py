@@ -0,0 +1,136 @@
+# Local on-disk cache for the outbound URLs
+# Many postings link to the same job portals and HR pages, so the pages are kept between runs (SQLite + zlib)
+# and revalidated with conditional requests (ETag / Last-Modified) once they're older than the TTL
+
+##################################### Importing libraries #####################################
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit, urlunsplit
+from settings import STATE_DIR
+
+##################################### Setting parameters #####################################
+
+# Path of the cache database
+CACHE_PATH = os.path.join(STATE_DIR, 'url_cache.sqlite')
+
+# Time (in seconds) during which a cached page is used without asking the server
+CACHE_TTL = 12 * 60 * 60
+
+# Maximum age (in seconds) of a cached page; older pages are evicted
+CACHE_MAX_AGE = 30 * 24 * 60 * 60
+
+# Maximum size (in bytes, compressed) of the cache; the least recently used pages are evicted first
+CACHE_MAX_BYTES = 300 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes and functions #####################################
+def normalize_url(url):
+    """
+    Function to normalize a URL to use it as a cache key:
+    lowercase scheme and host, no default port, no fragment, "/" for an empty path.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port is not None and not (scheme == "http" and parts.port == 80) and not (scheme == "https" and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+class URLCache:
+    """
+    Class for the on-disk cache of outbound pages. Thread-safe (one connection guarded by a lock).
+
+    Each entry has the source code (compressed), the ETag and Last-Modified headers (if any),
+    when it was fetched or last revalidated, and when it was last used.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_age=CACHE_MAX_AGE, max_bytes=CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        # Open (or create) the database
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS pages (
+                                   url TEXT PRIMARY KEY,
+                                   body BLOB NOT NULL,
+                                   size INTEGER NOT NULL,
+                                   etag TEXT,
+                                   last_modified TEXT,
+                                   fetched_at REAL NOT NULL,
+                                   accessed_at REAL NOT NULL)""")
+        self.connection.commit()
+        logger.info(f"Inside URLCache: opened the cache at {path}.")
+
+    def get(self, url):
+        """
+        Function to get a cached page.
+
+        Outputs: dict with body, etag, last_modified and fresh (True if younger than the TTL), or None if not cached
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT body, etag, last_modified, fetched_at FROM pages WHERE url = ?",
+                                          (normalize_url(url),)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), normalize_url(url)))
+            self.connection.commit()
+        body, etag, last_modified, fetched_at = row
+        return {"body": zlib.decompress(body).decode("utf-8"),
+                "etag": etag,
+                "last_modified": last_modified,
+                "fresh": time.time() - fetched_at < self.ttl}
+
+    def put(self, url, body, etag=None, last_modified=None):
+        """
+        Function to store a page in the cache (replacing the previous version, if any).
+        """
+        compressed = zlib.compress(body.encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (normalize_url(url), compressed, len(compressed), etag, last_modified, now, now))
+            self.connection.commit()
+
+    def touch(self, url):
+        """
+        Function to mark a cached page as fresh again (after the server answered 304 Not Modified).
+        """
+        with self.lock:
+            self.connection.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), normalize_url(url)))
+            self.connection.commit()
+
+    def evict(self):
+        """
+        Function to remove the pages older than max_age, and then the least recently used ones until the cache fits in max_bytes.
+        """
+        with self.lock:
+            # Old pages
+            deleted = self.connection.execute("DELETE FROM pages WHERE fetched_at < ?", (time.time() - self.max_age,)).rowcount
+
+            # Least recently used pages
+            total_size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            if total_size > self.max_bytes:
+                for url, size in self.connection.execute("SELECT url, size FROM pages ORDER BY accessed_at").fetchall():
+                    self.connection.execute("DELETE FROM pages WHERE url = ?", (url,))
+                    deleted += 1
+                    total_size -= size
+                    if total_size <= self.max_bytes:
+                        break
+
+            self.connection.commit()
+        logger.info(f"Inside URLCache.evict: evicted {deleted} pages.")
+
+    def close(self):
+        """
+        Function to close the database.
+        """
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,213 @@
+# Extraction and canonicalization of the URLs in the postings
+# The hyperlinks and the URLs written in the text of a post are collected in one pass over its HTML, and each one is
+# canonicalized (redirector links unwrapped, lowercase scheme and host, no default port, no fragment, no tracking
+# parameters) so that variants of the same page are fetched and stored once. Only the outbound URLs are kept: links to
+# the forum's navigation pages (other topics, mentions, categories, hashtags) and links to a heading of the post ("#...")
+# are dropped. Attachments uploaded to the forum ("/uploads/...", e.g., a PDF with the position description) are kept.
+
+##################################### Importing libraries #####################################
+import re
+from html.parser import HTMLParser
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urljoin, urlsplit, urlunsplit
+
+##################################### Setting parameters #####################################
+
+# URLs written in the text
+URL_PATTERN = re.compile(r"https?://[^\s<>\"']+", re.IGNORECASE)
+
+# Characters that end a sentence rather than a URL written in the text (e.g., "see https://example.com/job.")
+TRAILING_PUNCTUATION = ".,;:!?*"
+CLOSING_BRACKETS = {")": "(", "]": "[", "}": "{"}
+
+# Query parameters used for tracking (dropped), by name and by prefix
+TRACKING_PARAMETERS = {"fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "mc_cid", "mc_eid", "_hsenc", "_hsmi",
+                       "mkt_tok", "igshid", "ref_src", "trk", "trackingid", "refid"}
+TRACKING_PREFIXES = ("utm_",)
+
+# Redirector links: host (or suffix of the host, starting with "."), path and query parameter with the target URL
+# ("/clicks/track" is Discourse's click tracking, on any host)
+REDIRECTORS = [
+    ("www.google.com", "/url", ("q", "url")),
+    ("google.com", "/url", ("q", "url")),
+    ("l.facebook.com", "/l.php", ("u",)),
+    ("lm.facebook.com", "/l.php", ("u",)),
+    ("www.linkedin.com", "/redir/redirect", ("url",)),
+    ("www.youtube.com", "/redirect", ("q",)),
+    ("out.reddit.com", "/", ("url",)),
+    (".safelinks.protection.outlook.com", "/", ("url",)),
+    (None, "/clicks/track", ("url",)),
+]
+
+# Maximum number of redirectors unwrapped for a URL (a redirector can point to another one)
+MAX_UNWRAP = 3
+
+# Default ports (dropped)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Paths of the forum's navigation pages (topics, users, categories, tags), whose links aren't outbound URLs
+FORUM_NAVIGATION_PATHS = ("/t/", "/u/", "/c/", "/tag/", "/tags/")
+
+# Characters left as they are in the path of a canonical URL (the rest, e.g., spaces in a decoded redirector target, are escaped)
+PATH_SAFE_CHARACTERS = "/%:@!$&'()*+,;=~"
+
+##################################### Define classes and functions #####################################
+def strip_trailing_punctuation(url):
+    """
+    Function to remove the punctuation that follows a URL written in the text
+    (closing brackets only if they don't close a bracket opened in the URL, e.g., Wikipedia links).
+    """
+    while url:
+        last = url[-1]
+        if last in TRAILING_PUNCTUATION:
+            url = url[:-1]
+        elif last in CLOSING_BRACKETS and url.count(last) > url.count(CLOSING_BRACKETS[last]):
+            url = url[:-1]
+        else:
+            break
+    return url
+
+def unwrap_redirector(parts):
+    """
+    Function to get the target URL of a redirector link.
+
+    Inputs:
+    - parts: urllib.parse.SplitResult of the URL (lowercase host)
+
+    Outputs: target URL, or None if it isn't a redirector link
+    """
+    host = parts.hostname or ""
+    for redirector_host, path, parameters in REDIRECTORS:
+        if redirector_host is not None and host != redirector_host and not (redirector_host.startswith(".") and host.endswith(redirector_host)):
+            continue
+        if (parts.path or "/") != path:
+            continue
+        query = dict(parse_qsl(parts.query))
+        for parameter in parameters:
+            target = query.get(parameter, "")
+            if target.lower().startswith(("http://", "https://")):
+                return target
+    return None
+
+def canonicalize_url(url):
+    """
+    Function to get the canonical form of a URL: redirectors unwrapped, lowercase scheme and host, no default port,
+    "/" for an empty path (escaped where needed), no fragment and no tracking parameters (the other parameters keep their order).
+
+    Outputs: canonical URL, or None if it isn't an HTTP(S) URL
+    """
+    for _ in range(MAX_UNWRAP + 1):
+        try:
+            parts = urlsplit(url.strip())
+            port = parts.port
+        except ValueError:
+            return None
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not parts.hostname:
+            return None
+        target = unwrap_redirector(parts)
+        if target is None:
+            break
+        url = target
+
+    host = parts.hostname.lower()
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+
+    # Drop the tracking parameters (the query is only re-encoded if there's something to drop)
+    parameters = parse_qsl(parts.query, keep_blank_values=True)
+    kept_parameters = [(name, value) for name, value in parameters
+                       if name.lower() not in TRACKING_PARAMETERS and not name.lower().startswith(TRACKING_PREFIXES)]
+    query = parts.query if len(kept_parameters) == len(parameters) else urlencode(kept_parameters)
+
+    path = quote(parts.path, safe=PATH_SAFE_CHARACTERS) or "/"
+    return urlunsplit((scheme, host, path, query, ""))
+
+def get_dedupe_key(url):
+    """
+    Function to get the key under which variants of the same canonical URL are deduplicated:
+    http and https, with and without a trailing slash, and with the path or query encoded in different ways
+    (e.g., a redirector target that was re-encoded and the same URL written in the text) are the same page.
+    """
+    parts = urlsplit(url)
+    query = urlencode(parse_qsl(parts.query, keep_blank_values=True))
+    return urlunsplit(("", parts.netloc, unquote(parts.path).rstrip("/"), query, ""))
+
+def is_forum_navigation(url, forum_host):
+    """
+    Function to check whether a canonical URL is one of the forum's navigation pages (see FORUM_NAVIGATION_PATHS).
+
+    Inputs:
+    - url: canonical URL
+    - forum_host: host of the forum (with the port, if it isn't the default one)
+    """
+    parts = urlsplit(url)
+    path = parts.path.lower()
+    return parts.netloc == forum_host and any(path.startswith(prefix) or path == prefix.rstrip("/") for prefix in FORUM_NAVIGATION_PATHS)
+
+def dedupe_urls(urls, forum_host=None):
+    """
+    Function to canonicalize a list of URLs and remove the duplicates, keeping the first occurrence of each page
+    (the https variant if there are both).
+
+    Inputs:
+    - urls: list of URLs
+    - forum_host: host of the forum (with the port, if it isn't the default one); links to its navigation pages are dropped
+      after the redirectors are unwrapped (see is_forum_navigation)
+
+    Outputs: list of canonical URLs, in the order in which they first appear
+    """
+    unique_urls = {}
+    for url in urls:
+        url = canonicalize_url(url)
+        if url is None or (forum_host is not None and is_forum_navigation(url, forum_host)):
+            continue
+        key = get_dedupe_key(url)
+        if key not in unique_urls or (url.startswith("https:") and not unique_urls[key].startswith("https:")):
+            unique_urls[key] = url
+    return list(unique_urls.values())
+
+def find_urls(text):
+    """
+    Function to find the URLs written in a text (without the punctuation that follows them).
+    """
+    return [strip_trailing_punctuation(url) for url in URL_PATTERN.findall(text)]
+
+class URLParser(HTMLParser):
+    """
+    Class to collect, in one pass over an HTML document, the hyperlinks (resolved against base_url)
+    and the URLs written in the text. Links to a part of the same page ("#...") are skipped.
+    """
+
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.urls = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href and not href.strip().startswith("#"):
+                self.urls.append(urljoin(self.base_url, href.strip()))
+
+    def handle_data(self, data):
+        if "://" in data:
+            self.urls += find_urls(data)
+
+def extract_urls_from_html(html, base_url):
+    """
+    Function to get the outbound URLs in the HTML of a post: hyperlinks and URLs in the text, canonicalized and without
+    duplicates. The links to the navigation pages of the forum at base_url (other topics, mentions, categories, hashtags)
+    are dropped; its uploads (attachments) are kept.
+
+    Inputs:
+    - html: HTML of the post (e.g., the cooked HTML from Discourse)
+    - base_url: URL of the forum (or of the post), against which relative links are resolved
+
+    Outputs: list of canonical URLs (HTTP(S) only), in the order in which they first appear
+
+    Dependencies: URLParser, canonicalize_url, dedupe_urls
+    """
+    parser = URLParser(base_url)
+    parser.feed(html)
+    parser.close()
+    return dedupe_urls(parser.urls, forum_host=urlsplit(canonicalize_url(base_url)).netloc)
@@ -0,0 +1,106 @@
+# Functions to wait for pages to be ready in Selenium
+# Instead of sleeping a fixed random time after every navigation or scroll, wait for an explicit condition
+# (an element is present, the list of topics grew, the network is idle), with a timeout for each step.
+# Politeness (spacing out page loads) is a separate policy: see NavigationPolicy.
+
+##################################### Importing libraries #####################################
+import logging
+from time import monotonic, sleep
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from rate_limiter import RateLimiter
+
+##################################### Setting parameters #####################################
+
+# Maximum time (in seconds) to wait for a page or an element
+WAIT_TIMEOUT = 20
+
+# Maximum time (in seconds) to wait for more content after scrolling (if nothing loads, it's the end of the list)
+SCROLL_WAIT_TIMEOUT = 5
+
+# Time (in seconds) without new network requests to consider the network idle
+NETWORK_IDLE_TIME = 0.5
+
+# How often (in seconds) to check the conditions
+POLL_FREQUENCY = 0.1
+
+logger = logging.getLogger(__name__)
+
+##################################### Define classes and functions #####################################
+class NavigationPolicy:
+    """
+    Class for the politeness policy of a driver: at most one page load every min_interval seconds.
+
+    Usage: policy = NavigationPolicy(1); policy.get(driver, url)
+    """
+
+    def __init__(self, min_interval):
+        self.rate_limiter = RateLimiter(min_interval)
+
+    def get(self, driver, url):
+        """
+        Function to go to a URL, waiting first if the last page load was too recent.
+        """
+        self.rate_limiter.wait()
+        driver.get(url)
+
+def wait_for_element(driver, by, value, timeout=WAIT_TIMEOUT):
+    """
+    Function to wait until an element is present and return it.
+    Raises selenium.common.exceptions.TimeoutException if it isn't present after timeout seconds.
+
+    Inputs:
+    - driver: Selenium driver
+    - by, value: locator of the element (e.g., By.CLASS_NAME, 'cooked')
+    - timeout: maximum time to wait
+
+    Outputs: the element
+    """
+    return WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(EC.presence_of_element_located((by, value)))
+
+def wait_for_clickable(driver, by, value, timeout=WAIT_TIMEOUT):
+    """
+    Function to wait until an element is visible and enabled and return it.
+    Raises selenium.common.exceptions.TimeoutException if it isn't clickable after timeout seconds.
+    """
+    return WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(EC.element_to_be_clickable((by, value)))
+
+def wait_for_count_increase(driver, by, value, previous_count, timeout=SCROLL_WAIT_TIMEOUT):
+    """
+    Function to wait until there are more elements matching a locator than before (e.g., rows of a topic list after scrolling).
+
+    Inputs:
+    - driver: Selenium driver
+    - by, value: locator of the elements (e.g., By.CSS_SELECTOR, 'tr.topic-list-item')
+    - previous_count: number of elements before
+    - timeout: maximum time to wait
+
+    Outputs: new number of elements, or previous_count if it didn't grow within timeout
+    """
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(
+            lambda driver: len(driver.find_elements(by, value)) > previous_count and len(driver.find_elements(by, value)))
+    except TimeoutException:
+        return previous_count
+
+def wait_for_network_idle(driver, idle_time=NETWORK_IDLE_TIME, timeout=WAIT_TIMEOUT):
+    """
+    Function to wait until the page stops loading resources (no new entries in the Resource Timing API for idle_time seconds).
+    Returns without error after timeout seconds even if the page is still busy (e.g., pages that poll the server).
+
+    Outputs: True if the network became idle, False if the timeout was reached
+    """
+    deadline = monotonic() + timeout
+    last_count = -1
+    last_change = monotonic()
+    while monotonic() < deadline:
+        count = driver.execute_script("return performance.getEntriesByType('resource').length")
+        if count != last_count:
+            last_count = count
+            last_change = monotonic()
+        elif monotonic() - last_change >= idle_time:
+            return True
+        sleep(POLL_FREQUENCY)
+    logger.info("Inside wait_for_network_idle: timeout reached.")
+    return False